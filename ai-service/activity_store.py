@@ -0,0 +1,424 @@
+"""
+Activity Store
+Bulk activity ingestion into per-user, per-day, per-type totals with windowed rollups.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from append_log import AppendLog
+from lazy_imports import lazy_module
+from population_snapshot import EPOCH_ORDINAL
+from trend_store import WINDOWS, day_number
+
+pd = lazy_module('pandas')
+
+DEFAULT_ACTIVITY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'activities')
+LOG_NAME = 'activities.log'
+
+# Activity types of the backend's Progress.activities; anything else counts as 'other'
+ACTIVITY_TYPES = ('transport', 'meal', 'purchase', 'energy_usage', 'recycling', 'other')
+TYPE_INDEX = {name: i for i, name in enumerate(ACTIVITY_TYPES)}
+OTHER = TYPE_INDEX['other']
+
+# Fixed-width log record: one (user, day, type) cell of summed activity emissions
+MAX_USER_ID_BYTES = 64
+RECORD = np.dtype([
+    ('user', f'S{MAX_USER_ID_BYTES}'),
+    ('day', '<i4'),
+    ('type', '<i4'),
+    ('count', '<i4'),
+    ('total', '<f8')
+])
+
+# Each window is compared with the window before it
+DEFAULT_RETAIN_DAYS = 2 * max(WINDOWS)
+
+# Users kept in memory, least recently used are dropped
+DEFAULT_MAX_USERS = 100000
+
+
+def parse_days(timestamps: Sequence[str]) -> np.ndarray:
+    """
+    Day numbers of ISO timestamps ("2024-03-01T08:15:00Z" or "2024-03-01"), parsed in one pass.
+    
+    Like `day_number`, the day is the timestamp's own calendar date.
+    
+    Raises:
+        ValueError: If a timestamp is not a string starting with a valid ISO date
+    """
+    # Casting would turn numbers into strings too (123 into the year 0123)
+    if not set(map(type, timestamps)) <= {str}:
+        raise ValueError("Invalid activity timestamp: timestamps must be strings")
+    # Casting to a 10-character dtype truncates every timestamp to its date
+    dates = np.asarray(timestamps, dtype='U10')
+    try:
+        days = dates.astype('datetime64[D]')
+    except ValueError as e:
+        raise ValueError(f"Invalid activity timestamp: {e}") from None
+    if np.isnat(days).any():
+        raise ValueError("Invalid activity timestamp: empty")
+    return days.astype(np.int64) + EPOCH_ORDINAL
+
+
+def aggregate_cells(user_ids: Sequence[str], types: Sequence[str], impacts: Sequence[float],
+                    timestamps: Sequence[str]) -> np.ndarray:
+    """
+    Sum activity events into one RECORD row per (user, day, type).
+    
+    Users and types are factorized in C, then users, days and types are
+    combined into a single integer key, so the events are grouped with one
+    sort however many users they span.
+    
+    Raises:
+        ValueError: On columns of different lengths, invalid timestamps or
+            impacts, or user ids longer than MAX_USER_ID_BYTES
+    """
+    count = len(user_ids)
+    if not (len(types) == len(impacts) == len(timestamps) == count):
+        raise ValueError("userIds, types, carbonImpacts and timestamps must have the same length")
+    if count == 0:
+        return np.empty(0, dtype=RECORD)
+    
+    user_codes, users = pd.factorize(np.asarray(user_ids, dtype=object))
+    type_codes, type_names = pd.factorize(np.asarray(types, dtype=object))
+    type_codes = np.array([TYPE_INDEX.get(t, OTHER) for t in type_names], dtype=np.int64)[type_codes]
+    try:
+        impacts = np.asarray(impacts, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("carbonImpacts must be numbers") from None
+    if not np.isfinite(impacts).all():
+        raise ValueError("carbonImpacts must be finite")
+    days = parse_days(timestamps)
+    
+    first_day = int(days.min())
+    span = int(days.max()) - first_day + 1
+    keys = (user_codes.astype(np.int64) * span + (days - first_day)) * len(ACTIVITY_TYPES) + type_codes
+    cells, inverse = np.unique(keys, return_inverse=True)
+    
+    names = np.array([str(u).encode() for u in users])
+    if names.dtype.itemsize > MAX_USER_ID_BYTES:
+        raise ValueError(f"User id longer than {MAX_USER_ID_BYTES} bytes")
+    rows = np.empty(len(cells), dtype=RECORD)
+    user_day, rows['type'] = np.divmod(cells, len(ACTIVITY_TYPES))
+    user, rows['day'] = np.divmod(user_day, span)
+    rows['day'] += first_day
+    rows['user'] = names[user]
+    rows['count'] = np.bincount(inverse, minlength=len(cells))
+    rows['total'] = np.bincount(inverse, weights=impacts, minlength=len(cells))
+    return rows
+
+
+class UserActivity:
+    """
+    One user's retained activity as ascending day numbers and per-type
+    (day x ACTIVITY_TYPES) total and count matrices.
+    """
+    
+    __slots__ = ('days', 'totals', 'counts')
+    
+    def __init__(self):
+        self.days = np.empty(0, dtype=np.int32)
+        self.totals = np.empty((0, len(ACTIVITY_TYPES)), dtype=np.float64)
+        self.counts = np.empty((0, len(ACTIVITY_TYPES)), dtype=np.int32)
+    
+    def merge(self, days: np.ndarray, totals: np.ndarray, counts: np.ndarray, retain_days: int) -> None:
+        """
+        Add ascending, distinct days of per-type totals and counts, then drop
+        days older than the retention.
+        """
+        if not len(self.days) or days[0] > self.days[-1]:
+            # New days after all stored ones: the usual case
+            days = np.concatenate((self.days, days))
+            totals = np.concatenate((self.totals, totals))
+            counts = np.concatenate((self.counts, counts))
+        else:
+            merged, inverse = np.unique(np.concatenate((self.days, days)), return_inverse=True)
+            existing = len(self.days)
+            new_totals = np.zeros((len(merged), len(ACTIVITY_TYPES)), dtype=np.float64)
+            new_counts = np.zeros((len(merged), len(ACTIVITY_TYPES)), dtype=np.int32)
+            new_totals[inverse[:existing]] = self.totals
+            new_counts[inverse[:existing]] = self.counts
+            new_totals[inverse[existing:]] += totals
+            new_counts[inverse[existing:]] += counts
+            days, totals, counts = merged, new_totals, new_counts
+        
+        start = np.searchsorted(days, days[-1] - retain_days, side='right')
+        self.days = days[start:].astype(np.int32)
+        self.totals = totals[start:]
+        self.counts = counts[start:]
+    
+    def copy(self) -> 'UserActivity':
+        """A snapshot; `merge` replaces the arrays rather than writing into them."""
+        activity = UserActivity()
+        activity.days, activity.totals, activity.counts = self.days, self.totals, self.counts
+        return activity
+    
+    @property
+    def last_day(self) -> Optional[int]:
+        return int(self.days[-1]) if len(self.days) else None
+    
+    def rollup(self, window: int = 7, as_of: Optional[int] = None) -> Dict:
+        """
+        Per-type totals for the `window` days ending at `as_of` (default: the
+        latest day with activity), compared with the window before it.
+        """
+        end = as_of if as_of is not None else (self.last_day or 0)
+        current = (self.days > end - window) & (self.days <= end)
+        previous = (self.days > end - 2 * window) & (self.days <= end - window)
+        return _rollup(window, end, self.totals[current].sum(axis=0).tolist(),
+                       self.counts[current].sum(axis=0).tolist(), self.totals[previous].sum(axis=0).tolist())
+    
+    def daily(self, count: Optional[int] = None) -> Dict[str, List]:
+        """Per-type totals for the newest `count` days with activity (all if None), newest first."""
+        start = 0 if count is None else max(len(self.days) - count, 0)
+        totals = self.totals[start:][::-1]
+        return {
+            'dates': [date.fromordinal(day).isoformat() for day in self.days[start:][::-1].tolist()],
+            **{name: totals[:, i].tolist() for i, name in enumerate(ACTIVITY_TYPES)}
+        }
+
+
+def rollup_events(events: Iterable, window: int = 7, as_of: Optional[int] = None) -> Optional[Dict]:
+    """
+    `UserActivity.rollup` of a few (type, carbon impact, timestamp) events,
+    e.g. one request's activities, in plain Python (cheaper than NumPy for a
+    handful). Events with an unparsable timestamp are skipped.
+    
+    Returns:
+        The rollup, or None if no event has a valid timestamp
+    """
+    parsed = []
+    days = {}
+    for kind, impact, timestamp in events:
+        # Events of a day share its date: parse each date once
+        key = str(timestamp)[:10]
+        day = days.get(key)
+        if day is None:
+            try:
+                day = days[key] = day_number(key)
+            except ValueError:
+                continue
+        parsed.append((day, TYPE_INDEX.get(kind, OTHER), impact))
+    if not parsed:
+        return None
+    
+    end = as_of if as_of is not None else max(day for day, _, _ in parsed)
+    totals = [0.0] * len(ACTIVITY_TYPES)
+    counts = [0] * len(ACTIVITY_TYPES)
+    previous_totals = [0.0] * len(ACTIVITY_TYPES)
+    for day, kind, impact in parsed:
+        if end - window < day <= end:
+            totals[kind] += impact
+            counts[kind] += 1
+        elif end - 2 * window < day <= end - window:
+            previous_totals[kind] += impact
+    return _rollup(window, end, totals, counts, previous_totals)
+
+
+def _rollup(window: int, end: int, totals: List[float], counts: List[int], previous_totals: List[float]) -> Dict:
+    """Rollup dict from per-type sums over a window and the window before it."""
+    total = sum(totals)
+    types = {}
+    for i, name in enumerate(ACTIVITY_TYPES):
+        if not counts[i] and not previous_totals[i]:
+            continue
+        previous_total = previous_totals[i]
+        types[name] = {
+            'total': totals[i],
+            'count': counts[i],
+            'share': totals[i] / total * 100 if total > 0 else None,
+            'previousTotal': previous_total,
+            'changePercent': (previous_total - totals[i]) / previous_total * 100 if previous_total > 0 else None
+        }
+    return {
+        'window': window,
+        'endDate': date.fromordinal(end).isoformat() if end else None,
+        'total': total,
+        'count': sum(counts),
+        'previousTotal': sum(previous_totals),
+        'types': types
+    }
+
+
+class ActivityStore:
+    """
+    Append-only per-user activity totals.
+    
+    Ingested events are summed per (user, day, type) before anything is
+    written, and only those cells are appended to
+    `<directory>/activities.log`; later cells add to earlier ones. As with
+    HistoryStore, each process keeps the last `retain_days` of up to
+    `max_users` users (least recently used are dropped) in memory and
+    catches up on the (memory-mapped) log before each lookup, so activity
+    ingested by any worker is visible to all.
+    
+    The log is compacted to one summed cell per user, day and type within
+    the last `retain_days` of that user (see AppendLog). Cells add up, so a
+    process that finds the log compacted rebuilds its users from it.
+    
+    Without a directory the activity is kept in memory only.
+    """
+    
+    def __init__(self, directory: Optional[str] = DEFAULT_ACTIVITY_DIR, retain_days: Optional[int] = None,
+                 max_users: Optional[int] = None):
+        if retain_days is None:
+            retain_days = int(os.getenv('ACTIVITY_RETAIN_DAYS', DEFAULT_RETAIN_DAYS))
+        if max_users is None:
+            max_users = int(os.getenv('ACTIVITY_MAX_USERS', DEFAULT_MAX_USERS))
+        self.retain_days = max(1, retain_days)
+        self.max_users = max_users
+        self.path = os.path.join(directory, LOG_NAME) if directory else None
+        self._users: Dict[str, UserActivity] = OrderedDict()
+        self._events = 0
+        self._lock = threading.Lock()
+        self._log = None
+        if self.path is not None:
+            self._log = AppendLog(self.path, RECORD, compact=partial(retained_cells, days=self.retain_days))
+            with self._lock:
+                self._catch_up()
+    
+    @classmethod
+    def from_env(cls) -> 'ActivityStore':
+        """Store in ACTIVITY_STORE_DIR (default data/activities; empty keeps activity in memory only)."""
+        return cls(os.getenv('ACTIVITY_STORE_DIR', DEFAULT_ACTIVITY_DIR) or None)
+    
+    def ingest(self, user_ids: Sequence[str], types: Sequence[str], impacts: Sequence[float],
+               timestamps: Sequence[str]) -> Dict:
+        """
+        Ingest activity events given as columns, one entry per event.
+        
+        Events are additive: ingesting an event twice counts it twice.
+        
+        Args:
+            user_ids: User id of each event
+            types: Activity type of each event (see ACTIVITY_TYPES)
+            impacts: Carbon impact (kg CO2) of each event
+            timestamps: ISO timestamp of each event
+        
+        Returns:
+            Dict with the number of events, users and (user, day, type) cells written
+        
+        Raises:
+            ValueError: If the columns are invalid (see `aggregate_cells`)
+        """
+        cells = aggregate_cells(user_ids, types, impacts, timestamps)
+        with self._lock:
+            if self._log is None:
+                self._apply(cells)
+            else:
+                self._log.append(cells)
+                self._catch_up()
+            self._events += len(user_ids)
+        return {
+            'events': len(user_ids),
+            'users': len(np.unique(cells['user'])),
+            'cells': len(cells)
+        }
+    
+    def activity(self, user_id: str) -> Optional[UserActivity]:
+        """A snapshot of a user's retained activity (see `UserActivity.rollup` and `daily`), or None."""
+        with self._lock:
+            self._catch_up()
+            activity = self._users.get(user_id)
+            if activity is None:
+                return None
+            self._users.move_to_end(user_id)
+            return activity.copy()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'maxUsers': self.max_users,
+                'eventsIngested': self._events,
+                'logRows': self._log.rows if self._log is not None else 0,
+                'logBytes': self._log.offset if self._log is not None else 0,
+                'compactions': self._log.compactions if self._log is not None else 0,
+                'retainDays': self.retain_days,
+                'path': self.path
+            }
+    
+    def __contains__(self, user_id: str) -> bool:
+        return self.activity(user_id) is not None
+    
+    def __len__(self) -> int:
+        return len(self._users)
+    
+    def _catch_up(self) -> None:
+        """Apply cells appended to the log since this process last read it."""
+        if self._log is None:
+            return
+        rows, reset = self._log.read()
+        if reset:
+            # The compacted log holds the cells already added: start over from it
+            self._users.clear()
+        if rows is not None:
+            self._apply(rows)
+    
+    def _apply(self, rows: np.ndarray) -> None:
+        """Add cells to the per-user activity, one merge per user."""
+        for user, days, totals, counts in day_rows(rows):
+            user_id = user.decode()
+            activity = self._users.get(user_id)
+            if activity is None:
+                activity = self._users[user_id] = UserActivity()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            activity.merge(days, totals, counts, self.retain_days)
+
+
+def day_rows(cells: np.ndarray):
+    """
+    Group cells into per-user day rows in one vectorized pass.
+    
+    Yields:
+        (user, ascending distinct days, per-type totals, per-type counts) per user
+    """
+    if not len(cells):
+        return
+    cells = cells[np.lexsort((cells['day'], cells['user']))]
+    users = cells['user']
+    days = cells['day']
+    new_day = np.concatenate(([True], (users[1:] != users[:-1]) | (days[1:] != days[:-1])))
+    row = np.cumsum(new_day) - 1
+    rows = int(row[-1]) + 1
+    index = row * len(ACTIVITY_TYPES) + cells['type']
+    size = rows * len(ACTIVITY_TYPES)
+    totals = np.bincount(index, weights=cells['total'], minlength=size).reshape(rows, -1)
+    counts = np.bincount(index, weights=cells['count'], minlength=size).astype(np.int32).reshape(rows, -1)
+    
+    starts = np.flatnonzero(new_day)
+    row_users = users[starts]
+    row_days = days[starts]
+    user_starts = np.flatnonzero(np.concatenate(([True], row_users[1:] != row_users[:-1]))).tolist()
+    for begin, end in zip(user_starts, user_starts[1:] + [rows]):
+        yield row_users[begin], row_days[begin:end], totals[begin:end], counts[begin:end]
+
+
+def retained_cells(cells: np.ndarray, days: int) -> np.ndarray:
+    """One summed cell per (user, day, type) within the newest `days` days of each user: what a compacted log keeps."""
+    if not len(cells):
+        return cells
+    cells = cells[np.lexsort((cells['type'], cells['day'], cells['user']))]
+    users = cells['user']
+    new_cell = np.concatenate(([True], (users[1:] != users[:-1]) | (cells['day'][1:] != cells['day'][:-1])
+                               | (cells['type'][1:] != cells['type'][:-1])))
+    starts = np.flatnonzero(new_cell)
+    summed = cells[starts]
+    summed['count'] = np.add.reduceat(cells['count'], starts)
+    summed['total'] = np.add.reduceat(cells['total'], starts)
+    
+    users = summed['user']
+    first = np.concatenate(([True], users[1:] != users[:-1]))
+    last = np.concatenate((first[1:], [True]))
+    newest = summed['day'][last][np.cumsum(first) - 1]
+    return summed[summed['day'] > newest - days]
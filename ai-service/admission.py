@@ -0,0 +1,416 @@
+"""
+Admission Control
+Priority classes, bounded per-class queues and deadline-aware load shedding in front of the CPU pool.
+"""
+
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+import orjson
+
+from metrics import (ADMISSION_ADMITTED, ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED,
+                     current_timing)
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+# Highest priority first
+CLASSES = (INTERACTIVE, BATCH)
+
+# Admitted (unanswered) requests per class and worker; more are rejected with 429
+DEFAULT_LIMITS = {INTERACTIVE: 256, BATCH: 16}
+
+# CPU slots batch work may not take, so interactive calls never wait behind a whole batch
+DEFAULT_RESERVED_SLOTS = 1
+
+# Time budget per class in ms (0 = none); the backend gives up on dashboard calls after 10 s
+DEFAULT_DEADLINES_MS = {INTERACTIVE: 10000, BATCH: 0}
+
+# Routes served as batch traffic unless the request says otherwise
+BATCH_ROUTES = frozenset({
+    ('POST', '/calculate/batch'),
+    ('POST', '/calculate/stream'),
+    ('POST', '/insights/batch'),
+    ('POST', '/projection/batch'),
+    ('POST', '/predict-impact/sweep'),
+    ('POST', '/activities'),
+    ('POST', '/population/snapshot'),
+    ('POST', '/jobs/calculate'),
+    ('POST', '/jobs/insights')
+})
+
+# Routes that are never queued or shed (probes, metrics and operations)
+EXEMPT_PREFIXES = ('/health', '/ready', '/metrics', '/admission', '/profiler', '/docs', '/redoc', '/openapi.json')
+
+# Request headers: priority class, and the client's remaining time budget in ms
+PRIORITY_HEADER = b'x-priority'
+DEADLINE_HEADER = b'x-request-deadline-ms'
+
+# Weight of the newest CPU call in each class's average call duration
+SERVICE_SMOOTHING = 0.1
+
+MIN_RETRY_AFTER = 1
+
+
+class Overloaded(Exception):
+    """A request was shed; answer it with `status_code` and Retry-After `retry_after` seconds."""
+    
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """Priority class and deadline (a `time.monotonic()` value) of one admitted request."""
+    
+    __slots__ = ('priority', 'deadline', 'shed')
+    
+    def __init__(self, priority: str, deadline: Optional[float]):
+        self.priority = priority
+        self.deadline = deadline
+        self.shed: Optional[Overloaded] = None
+
+
+_current: contextvars.ContextVar[Optional[Ticket]] = contextvars.ContextVar('admission_ticket', default=None)
+
+
+def detach_deadline() -> None:
+    """
+    Drop the deadline of the current context's ticket, keeping its priority.
+    
+    For work shared by several requests (a coalesced batch), which must not
+    be dropped because the request that happened to start it ran out of time.
+    """
+    ticket = _current.get()
+    if ticket is not None and ticket.deadline is not None:
+        _current.set(Ticket(ticket.priority, None))
+
+
+class _Waiter:
+    __slots__ = ('future', 'ticket')
+    
+    def __init__(self, future: asyncio.Future, ticket: Optional[Ticket]):
+        self.future = future
+        self.ticket = ticket
+
+
+class AdmissionController:
+    """
+    Priority scheduler in front of one worker's CPU pool.
+    
+    Requests are classified as interactive or batch by route, or by an
+    `X-Priority` header. Each class admits a bounded number of concurrent
+    requests; beyond that new ones get 429 at once. Every `run_cpu` call of
+    an admitted request then takes one of `slots` CPU slots (one per pool
+    thread), so the pool itself never queues: free slots go to the highest
+    priority class first, FIFO within a class. Running calls are not
+    preempted, so batch work is kept out of `reserved` of the slots.
+    
+    A request whose deadline (its class budget, or `X-Request-Deadline-Ms`
+    if sooner) can no longer be met is dropped with 503 instead of doing
+    work its client will not wait for: on arrival and before each CPU call
+    if the estimated wait is too long, and while waiting once too little
+    time is left for an average call. Retry-After is the estimated time for
+    the queued work to drain.
+    """
+    
+    def __init__(self, slots: int, limits: Optional[Dict[str, int]] = None,
+                 deadlines_ms: Optional[Dict[str, float]] = None, reserved: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.getenv('ADMISSION_CONTROL', 'on').lower() not in ('off', '0', 'false')
+        if limits is None:
+            limits = {c: int(os.getenv(f'ADMISSION_{c.upper()}_LIMIT', DEFAULT_LIMITS[c])) for c in CLASSES}
+        if deadlines_ms is None:
+            deadlines_ms = {c: float(os.getenv(f'ADMISSION_{c.upper()}_DEADLINE_MS', DEFAULT_DEADLINES_MS[c]))
+                            for c in CLASSES}
+        if reserved is None:
+            reserved = int(os.getenv('ADMISSION_RESERVED_SLOTS', DEFAULT_RESERVED_SLOTS))
+        self.enabled = enabled
+        self.slots = max(1, slots)
+        # Slots each class may use at once; batch always keeps at least one
+        self.class_slots = {INTERACTIVE: self.slots, BATCH: max(1, self.slots - max(0, reserved))}
+        self.limits = {c: max(1, limits[c]) for c in CLASSES}
+        self.deadlines = {c: deadlines_ms[c] / 1000 if deadlines_ms[c] > 0 else None for c in CLASSES}
+        self._queues: Dict[str, Deque[_Waiter]] = {c: deque() for c in CLASSES}
+        self._in_flight = {c: 0 for c in CLASSES}
+        self._running = {c: 0 for c in CLASSES}
+        self._service = {c: 0.0 for c in CLASSES}
+        self._busy = 0
+        self._admitted = {c: 0 for c in CLASSES}
+        self._shed = {c: {'queue_full': 0, 'deadline': 0, 'expired': 0} for c in CLASSES}
+    
+    def classify(self, method: str, path: str, headers: Dict[bytes, bytes]) -> Optional[str]:
+        """Priority class of a request, or None if it is exempt from admission control."""
+        if path.startswith(EXEMPT_PREFIXES):
+            return None
+        requested = headers.get(PRIORITY_HEADER, b'').decode('latin-1').strip().lower()
+        if requested in CLASSES:
+            return requested
+        return BATCH if (method, path.rstrip('/')) in BATCH_ROUTES else INTERACTIVE
+    
+    def admit(self, method: str, path: str, headers: Dict[bytes, bytes]) -> Optional[Ticket]:
+        """
+        Admit a request, or reject it before any work is done.
+        
+        Returns:
+            The request's ticket, or None if it is exempt
+        
+        Raises:
+            Overloaded: 429 if its class is at its limit, 503 if it cannot
+                start before its deadline
+        """
+        priority = self.classify(method, path, headers)
+        if priority is None or not self.enabled:
+            return None
+        ticket = Ticket(priority, None)
+        if self._in_flight[priority] >= self.limits[priority]:
+            raise self._reject(ticket, 'queue_full', 429,
+                               f"Too many {priority} requests in progress, retry later")
+        
+        now = time.monotonic()
+        budget = self.deadlines[priority]
+        try:
+            requested = float(headers.get(DEADLINE_HEADER, b'0')) / 1000
+        except ValueError:
+            requested = 0.0
+        if requested > 0:
+            budget = requested if budget is None else min(budget, requested)
+        if budget is not None:
+            ticket.deadline = now + budget
+            self._check_deadline(ticket, now)
+        
+        self._in_flight[priority] += 1
+        self._admitted[priority] += 1
+        ADMISSION_ADMITTED.inc((priority,))
+        ADMISSION_IN_FLIGHT.set(self._in_flight[priority], (priority,))
+        return ticket
+    
+    def finish(self, ticket: Ticket) -> None:
+        """Mark an admitted request as answered."""
+        self._in_flight[ticket.priority] -= 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight[ticket.priority], (ticket.priority,))
+    
+    async def acquire(self) -> str:
+        """
+        Wait for a CPU slot for the current request.
+        
+        Work outside a request (start-up, shared batches without a ticket)
+        runs at batch priority without a deadline.
+        
+        Returns:
+            The priority class the slot was taken for (pass it to `release`)
+        
+        Raises:
+            Overloaded: 503 if the request's deadline cannot be met
+        """
+        ticket = _current.get()
+        priority = ticket.priority if ticket is not None else BATCH
+        if not self.enabled:
+            return priority
+        if self._free_slot(priority) and not self._waiting(priority):
+            self._take(priority)
+            return priority
+        
+        if ticket is not None and ticket.deadline is not None:
+            self._check_deadline(ticket, time.monotonic())
+        
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), ticket)
+        self._queues[priority].append(waiter)
+        self._update_depth(priority)
+        timer = None
+        if ticket is not None and ticket.deadline is not None:
+            # Give up once too little time is left for an average call
+            remaining = ticket.deadline - self._service[priority] - time.monotonic()
+            timer = loop.call_later(max(0.0, remaining), self._expire, priority, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                self._remove(priority, waiter)
+            elif waiter.future.exception() is None:
+                # The slot was handed over just as the request went away
+                self._free(priority)
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        return priority
+    
+    def release(self, priority: str, seconds: float) -> None:
+        """Return a CPU slot after a call of `seconds` and hand it to the next waiter."""
+        if not self.enabled:
+            return
+        average = self._service[priority]
+        self._service[priority] = seconds if average == 0 else average + SERVICE_SMOOTHING * (seconds - average)
+        self._free(priority)
+    
+    def estimated_wait(self, priority: str) -> float:
+        """Seconds until a new CPU call of `priority` would start, from average call durations."""
+        ahead = CLASSES[:CLASSES.index(priority) + 1]
+        work = sum(len(self._queues[c]) * self._service[c] for c in ahead)
+        if not self._free_slot(priority):
+            # Running calls are half done on average
+            work += sum(self._running[c] * self._service[c] for c in CLASSES) / 2
+        return work / self.class_slots[priority]
+    
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'slots': self.slots,
+            'busy': self._busy,
+            'classes': {
+                c: {
+                    'limit': self.limits[c],
+                    'slots': self.class_slots[c],
+                    'deadlineMs': self.deadlines[c] * 1000 if self.deadlines[c] is not None else None,
+                    'inFlight': self._in_flight[c],
+                    'queued': len(self._queues[c]),
+                    'running': self._running[c],
+                    'averageCallMs': round(self._service[c] * 1000, 3),
+                    'estimatedWaitMs': round(self.estimated_wait(c) * 1000, 3),
+                    'admitted': self._admitted[c],
+                    'shed': dict(self._shed[c])
+                }
+                for c in CLASSES
+            }
+        }
+    
+    def _check_deadline(self, ticket: Ticket, now: float) -> None:
+        wait = self.estimated_wait(ticket.priority)
+        if now + wait + self._service[ticket.priority] > ticket.deadline:
+            raise self._reject(ticket, 'deadline', 503,
+                               f"Server overloaded, {ticket.priority} request cannot finish before its deadline")
+    
+    def _waiting(self, priority: str) -> bool:
+        return any(self._queues[c] for c in CLASSES[:CLASSES.index(priority) + 1])
+    
+    def _free_slot(self, priority: str) -> bool:
+        return self._busy < self.slots and self._running[priority] < self.class_slots[priority]
+    
+    def _take(self, priority: str) -> None:
+        self._busy += 1
+        self._running[priority] += 1
+    
+    def _free(self, priority: str) -> None:
+        self._busy -= 1
+        self._running[priority] -= 1
+        self._dispatch()
+    
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        for priority in CLASSES:
+            queue = self._queues[priority]
+            while queue and self._free_slot(priority):
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                ticket = waiter.ticket
+                if ticket is not None and ticket.deadline is not None and \
+                        now + self._service[priority] > ticket.deadline:
+                    waiter.future.set_exception(self._expired(ticket))
+                    continue
+                self._take(priority)
+                waiter.future.set_result(None)
+            self._update_depth(priority)
+    
+    def _expire(self, priority: str, waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            self._remove(priority, waiter)
+            waiter.future.set_exception(self._expired(waiter.ticket))
+    
+    def _expired(self, ticket: Ticket) -> Overloaded:
+        return self._reject(ticket, 'expired', 503,
+                            f"Server overloaded, {ticket.priority} request timed out waiting for the CPU")
+    
+    def _remove(self, priority: str, waiter: _Waiter) -> None:
+        try:
+            self._queues[priority].remove(waiter)
+        except ValueError:
+            pass
+        self._update_depth(priority)
+    
+    def _update_depth(self, priority: str) -> None:
+        ADMISSION_QUEUE_DEPTH.set(len(self._queues[priority]), (priority,))
+    
+    def _reject(self, ticket: Ticket, reason: str, status_code: int, message: str) -> Overloaded:
+        self._shed[ticket.priority][reason] += 1
+        ADMISSION_SHED.inc((ticket.priority, reason))
+        # Time for all queued work to drain: what the lowest class waits for
+        drain = self.estimated_wait(CLASSES[-1])
+        error = Overloaded(message, status_code, max(MIN_RETRY_AFTER, math.ceil(drain)))
+        ticket.shed = error
+        return error
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting requests before routing.
+    
+    Rejected requests are answered at once, before their body is read. A
+    request dropped later (its deadline passed while it waited for the CPU)
+    is answered with the same 503 in place of whatever error its endpoint
+    made of it, unless the response had already started.
+    """
+    
+    def __init__(self, app, controller: Callable[[], AdmissionController]):
+        self.app = app
+        self.controller = controller
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        controller = self.controller()
+        try:
+            ticket = controller.admit(scope['method'], scope['path'], dict(scope['headers']))
+        except Overloaded as e:
+            await _send_overloaded(send, e)
+            return
+        if ticket is None:
+            await self.app(scope, receive, send)
+            return
+        
+        started = replaced = False
+        
+        async def send_or_replace(message):
+            nonlocal started, replaced
+            if replaced:
+                return
+            if message['type'] == 'http.response.start':
+                if ticket.shed is not None and message['status'] >= 500:
+                    replaced = True
+                    await _send_overloaded(send, ticket.shed)
+                    return
+                started = True
+            await send(message)
+        
+        token = _current.set(ticket)
+        try:
+            await self.app(scope, receive, send_or_replace)
+        except Overloaded as e:
+            if started or replaced:
+                raise
+            await _send_overloaded(send, e)
+        finally:
+            _current.reset(token)
+            controller.finish(ticket)
+
+
+async def _send_overloaded(send, error: Overloaded) -> None:
+    timing = current_timing()
+    if timing is not None and timing.route is None:
+        timing.route = 'admission'
+    await send({
+        'type': 'http.response.start',
+        'status': error.status_code,
+        'headers': [(b'content-type', b'application/json'), (b'retry-after', str(error.retry_after).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': orjson.dumps({'detail': str(error)})})
@@ -0,0 +1,141 @@
+"""
+Append Log
+Fixed-width record log shared by all workers, compacted as it grows.
+"""
+
+import fcntl
+import os
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+# Logs smaller than this are not compacted
+DEFAULT_COMPACT_MIN_BYTES = 1 << 20
+
+
+class AppendLog:
+    """
+    A file of fixed-width NumPy records that processes append to and read from.
+    
+    Appends and compactions hold an exclusive flock on `<path>.lock`. A
+    compaction replaces the log with the records `compact` keeps (e.g. the
+    latest row of each key within the retention), written to a temporary
+    file and renamed over the log, so a reader sees either the old log or the
+    new one. A reader that finds a new file reads it from the start and is
+    told to rebuild, as the rows it read before are part of it.
+    
+    The log is compacted when it is opened and whenever it has grown to twice
+    its size after the last compaction (and at least `min_compact_bytes`),
+    which keeps rewriting linear in the rows appended.
+    """
+    
+    def __init__(self, path: str, dtype: np.dtype, compact: Callable[[np.ndarray], np.ndarray],
+                 min_compact_bytes: Optional[int] = None):
+        if min_compact_bytes is None:
+            min_compact_bytes = int(os.getenv('LOG_COMPACT_MIN_BYTES', DEFAULT_COMPACT_MIN_BYTES))
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.compact_rows = compact
+        self.min_compact_bytes = min_compact_bytes
+        self.compactions = 0
+        self.offset = 0
+        self._inode = None
+        self._base = 0
+        self._fd = None
+        self._fd_inode = None
+        self._lock_fd = None
+        self._pid = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            size = 0
+        if size >= self.min_compact_bytes:
+            with self._locked():
+                self._compact()
+    
+    @property
+    def rows(self) -> int:
+        """Rows read from the current file."""
+        return self.offset // self.dtype.itemsize
+    
+    def append(self, rows: np.ndarray) -> None:
+        """Append rows, compacting the log if it has doubled since the last compaction."""
+        with self._locked():
+            # Reopen if a compaction by another process replaced the file
+            inode = os.stat(self.path).st_ino if os.path.exists(self.path) else None
+            if self._fd is None or inode != self._fd_inode:
+                if self._fd is not None:
+                    os.close(self._fd)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._fd_inode = os.fstat(self._fd).st_ino
+            os.write(self._fd, rows.tobytes())
+            if os.fstat(self._fd).st_size >= 2 * max(self._base, self.min_compact_bytes):
+                self._compact()
+    
+    def read(self) -> Tuple[Optional[np.ndarray], bool]:
+        """
+        Rows appended since the last read.
+        
+        Returns:
+            (rows or None, reset); reset is True when the log was replaced
+            by a compaction since the last read: the rows are then the whole
+            new log and state built from earlier reads is part of them
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None, False
+        if stat.st_ino == self._inode and stat.st_size - self.offset < self.dtype.itemsize:
+            return None, False
+        
+        # The size and inode of the opened file decide, in case it was replaced after the stat
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            reset = stat.st_ino != self._inode
+            if reset:
+                self._inode = stat.st_ino
+                self._base = stat.st_size
+                self.offset = 0
+            count = (stat.st_size - self.offset) // self.dtype.itemsize
+            if count <= 0:
+                return None, reset
+            rows = np.array(np.memmap(f, dtype=self.dtype, mode='r', offset=self.offset, shape=(count,)))
+        self.offset += count * self.dtype.itemsize
+        return rows, reset
+    
+    @contextmanager
+    def _locked(self):
+        # One descriptor per process: flock on a descriptor inherited across fork would not exclude
+        if self._pid != os.getpid():
+            self._lock_fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd = None
+            self._pid = os.getpid()
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+    
+    def _compact(self) -> None:
+        """Replace the log with the rows `compact_rows` keeps; the lock must be held."""
+        try:
+            with open(self.path, 'rb') as f:
+                count = os.fstat(f.fileno()).st_size // self.dtype.itemsize
+                rows = np.fromfile(f, dtype=self.dtype, count=count)
+        except FileNotFoundError:
+            return
+        kept = self.compact_rows(rows)
+        self._base = len(kept) * self.dtype.itemsize
+        if len(kept) == len(rows):
+            return
+        
+        temp = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(kept.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        self.compactions += 1
@@ -0,0 +1,8 @@
+"""
+AI Service Benchmarks
+Synthetic workloads, microbenchmarks and in-process load tests for the ai-service hot paths.
+
+Usage:
+    python -m benchmarks run --users 1000 --days 30 -o results.json
+    python -m benchmarks compare baseline.json results.json --threshold 10
+"""
@@ -0,0 +1,214 @@
+"""
+Benchmark CLI
+Runs the benchmark suite and compares result files between commits.
+
+Usage:
+    python -m benchmarks run --users 1000 --days 30 -o results.json
+    python -m benchmarks run --skip-load --users 10000
+    python -m benchmarks run --skip-micro --skip-load --startup-runs 10
+    python -m benchmarks compare baseline.json results.json --threshold 10
+    python -m benchmarks allocations --users 1000
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks import load, micro, startup
+
+SECTIONS = ('micro', 'load', 'startup')
+
+# Metrics where a higher value is better; every other compared metric is a latency
+THROUGHPUT_METRICS = ('itemsPerSec',)
+LATENCY_METRICS = ('p50Ms', 'p99Ms')
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args) -> int:
+    config = {
+        'users': args.users,
+        'days': args.days,
+        'batchSize': args.batch_size,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'startupRuns': args.startup_runs,
+        'seed': args.seed
+    }
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'config': config
+    }
+    
+    if not args.skip_micro:
+        print("Running microbenchmarks...", file=sys.stderr)
+        results['micro'] = micro.run(args.users, args.days, args.batch_size, args.seed)
+    
+    if not args.skip_load:
+        print("Running in-process load test...", file=sys.stderr)
+        from main import app
+        results['load'] = load.run(app, args.users, args.days, args.batch_size, requests=args.requests,
+                                   concurrency=args.concurrency, seed=args.seed)
+    
+    if not args.skip_startup:
+        print("Running startup benchmark...", file=sys.stderr)
+        results['startup'] = startup.run(args.startup_runs, args.days, args.batch_size, args.seed)
+    
+    text = json.dumps(results, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Results written to {args.output}", file=sys.stderr)
+    print(_format_table(results), file=sys.stderr)
+    return 0
+
+
+def _format_table(results: Dict) -> str:
+    lines = [f"{'benchmark':<48}{'items/s':>14}{'p50 ms':>12}{'p99 ms':>12}"]
+    for section in SECTIONS:
+        for name, stats in results.get(section, {}).items():
+            items = f"{stats['itemsPerSec']:,.1f}" if 'itemsPerSec' in stats else '-'
+            lines.append(f"{section + ':' + name:<48}{items:>14}"
+                         f"{stats['p50Ms']:>12.4f}{stats['p99Ms']:>12.4f}")
+    return '\n'.join(lines)
+
+
+def regressions(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """
+    Compare two result files benchmark by benchmark.
+    
+    A benchmark regresses when its throughput drops, or a latency percentile
+    rises, by more than `threshold` percent. Benchmarks missing from either
+    file are ignored.
+    
+    Args:
+        baseline: Parsed results of the reference commit
+        current: Parsed results to check
+        threshold: Allowed change in percent
+    
+    Returns:
+        List of dicts with benchmark, metric, baseline, current and changePercent
+        for every comparison, each flagged with `regression`
+    """
+    rows = []
+    for section in SECTIONS:
+        before_section = baseline.get(section, {})
+        for name, after in current.get(section, {}).items():
+            before = before_section.get(name)
+            if before is None:
+                continue
+            for metric in THROUGHPUT_METRICS + LATENCY_METRICS:
+                if not before.get(metric):
+                    continue
+                change = (after[metric] - before[metric]) / before[metric] * 100
+                worse = -change if metric in THROUGHPUT_METRICS else change
+                rows.append({
+                    'benchmark': f'{section}:{name}',
+                    'metric': metric,
+                    'baseline': before[metric],
+                    'current': after[metric],
+                    'changePercent': round(change, 1),
+                    'regression': worse > threshold
+                })
+    return rows
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    
+    rows = regressions(baseline, current, args.threshold)
+    print(f"{'benchmark':<48}{'metric':<13}{'baseline':>12}{'current':>12}{'change':>9}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['benchmark']:<48}{row['metric']:<13}{row['baseline']:>12,.4g}"
+              f"{row['current']:>12,.4g}{row['changePercent']:>+8.1f}%{flag}")
+    
+    failed = [row for row in rows if row['regression']]
+    if failed:
+        print(f"\n{len(failed)} regression(s) beyond {args.threshold}%", file=sys.stderr)
+        return 1
+    return 0
+
+
+def allocations(args) -> int:
+    from benchmarks import allocations as alloc
+    
+    results = alloc.run(args.users, args.days, args.seed)
+    print(f"{'path':<24}{'p50 ms':>12}{'p99 ms':>12}{'peak KiB':>12}{'max KiB':>12}")
+    for name, stats in results.items():
+        print(f"{name:<24}{stats['p50Ms']:>12.4f}{stats['p99Ms']:>12.4f}"
+              f"{stats['peakKiBMean']:>12.2f}{stats['peakKiBMax']:>12.2f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(json.dumps(results, indent=2) + '\n')
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="ai-service benchmark suite.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = commands.add_parser('run', help="Run the benchmarks and write JSON results")
+    run_parser.add_argument('-o', '--output', default='-', help="Results file (default: stdout)")
+    run_parser.add_argument('--users', type=int, default=1000, help="Synthetic population size (default: 1000)")
+    run_parser.add_argument('--days', type=int, default=30, help="Progress days per user (default: 30)")
+    run_parser.add_argument('--batch-size', type=int, default=100,
+                            help="Records per batch calculation (default: 100)")
+    run_parser.add_argument('--requests', type=int, default=500,
+                            help="Requests per endpoint in the load test (default: 500)")
+    run_parser.add_argument('--concurrency', type=int, default=16,
+                            help="Concurrent requests in the load test (default: 16)")
+    run_parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    run_parser.add_argument('--skip-micro', action='store_true', help="Skip the microbenchmarks")
+    run_parser.add_argument('--skip-load', action='store_true', help="Skip the endpoint load test")
+    run_parser.add_argument('--skip-startup', action='store_true', help="Skip the startup benchmark")
+    run_parser.add_argument('--startup-runs', type=int, default=5,
+                            help="Fresh interpreters per startup mode (default: 5)")
+    run_parser.set_defaults(func=run)
+    
+    compare_parser = commands.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('baseline', help="Results of the reference commit")
+    compare_parser.add_argument('current', help="Results to check")
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help="Allowed throughput/latency change in percent (default: 10)")
+    compare_parser.set_defaults(func=compare)
+    
+    alloc_parser = commands.add_parser('allocations',
+                                       help="Compare time and peak allocation per request of the request paths")
+    alloc_parser.add_argument('-o', '--output', help="Also write JSON results to this file")
+    alloc_parser.add_argument('--users', type=int, default=1000, help="Synthetic population size (default: 1000)")
+    alloc_parser.add_argument('--days', type=int, default=30, help="Progress days per user (default: 30)")
+    alloc_parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    alloc_parser.set_defaults(func=allocations)
+    
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Allocation Benchmarks
+Compares per-request time and peak memory of the pydantic and slotted request paths.
+"""
+
+import json
+import tracemalloc
+from typing import Callable, Dict, List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from carbon_calculator import CarbonCalculator, format_calculation
+from insights_generator import InsightsGenerator
+from main import CarbonRequest, InsightsRequest
+from request_objects import parse_carbon_request, parse_insights_request
+
+from benchmarks import synthetic
+from benchmarks.micro import measure
+
+
+def _peak_bytes(func: Callable, inputs: List) -> Dict:
+    """Mean and max traced peak allocation of one call, relative to the heap before it."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for x in inputs:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            func(x)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        'peakKiBMean': round(sum(peaks) / len(peaks) / 1024, 2),
+        'peakKiBMax': round(max(peaks) / 1024, 2)
+    }
+
+
+def paths(calculator: CarbonCalculator, insights: InsightsGenerator) -> Dict[str, Callable[[bytes], bytes]]:
+    """
+    Body-to-response functions for each request path under test.
+    
+    The pydantic paths repeat what FastAPI does for a model-typed endpoint
+    (`json.loads`, model validation, `.dict()`, `jsonable_encoder`,
+    `json.dumps`); the slotted paths are what `/calculate` and `/insights`
+    run now.
+    """
+    def calculate_pydantic(body: bytes) -> bytes:
+        data = CarbonRequest.model_validate(json.loads(body))
+        result = calculator.calculate(transportation=data.transportation.dict(), energy=data.energy.dict(),
+                                      diet=data.diet, shopping=data.shopping)
+        return json.dumps(jsonable_encoder({"success": True, **format_calculation(result)})).encode()
+    
+    def calculate_slotted(body: bytes) -> bytes:
+        result = calculator.calculate_lifestyle(parse_carbon_request(body))
+        return orjson.dumps({"success": True, **format_calculation(result)})
+    
+    def insights_pydantic(body: bytes) -> bytes:
+        data = InsightsRequest.model_validate(json.loads(body))
+        result = insights.generate(lifestyle=data.lifestyle.dict(),
+                                   recent_progress=[p.dict() for p in data.recentProgress],
+                                   carbon_footprint=data.carbonFootprint)
+        return json.dumps(jsonable_encoder({"success": True, **result})).encode()
+    
+    def insights_slotted(body: bytes) -> bytes:
+        result = insights.generate_request(parse_insights_request(body))
+        return orjson.dumps({"success": True, **result})
+    
+    return {
+        'calculate:pydantic': calculate_pydantic,
+        'calculate:slotted': calculate_slotted,
+        'insights:pydantic': insights_pydantic,
+        'insights:slotted': insights_slotted
+    }
+
+
+def run(users: int, days: int, seed: int = 0) -> Dict[str, Dict]:
+    """
+    Time and trace allocations of every request path on the same bodies.
+    
+    Timing and tracing are separate passes because tracemalloc slows
+    allocation-heavy code far more than the rest. The calculators run
+    without a result cache so both paths do the full calculation.
+    
+    Args:
+        users: Number of `/calculate` bodies (a tenth as many `/insights` bodies)
+        days: Progress history length per insights body
+        seed: Random seed
+    
+    Returns:
+        Dict mapping "endpoint:path" to its latency summary plus peakKiBMean and peakKiBMax
+    """
+    calculator = CarbonCalculator()
+    insights = InsightsGenerator(rules=calculator.rules)
+    requests = synthetic.insight_requests(max(1, users // 10), days, seed + 2)
+    for request in requests:
+        # Without a user id, so both paths skip the trend store
+        del request['userId']
+    bodies = {
+        'calculate': [json.dumps(p).encode() for p in synthetic.population(users, seed)],
+        'insights': [json.dumps(r).encode() for r in requests]
+    }
+    
+    results = {}
+    for name, func in paths(calculator, insights).items():
+        inputs = bodies[name.split(':')[0]]
+        stats = measure(func, inputs)
+        stats.update(_peak_bytes(func, inputs))
+        results[name] = stats
+    return results
@@ -0,0 +1,142 @@
+"""
+In-Process Load Test
+Drives the FastAPI app through its ASGI interface with concurrent synthetic requests.
+"""
+
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks import synthetic
+from benchmarks.micro import summarize
+from ecostep_client import ASGITransport
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b'') -> Tuple[int, bytes]:
+    """
+    Send one HTTP request straight to an ASGI app, without a socket.
+    
+    Returns:
+        Tuple of status code and response body
+    """
+    status, _, content = await ASGITransport(app).send(method, path, body)
+    return status, content
+
+
+def scenarios(users: int, days: int, batch_size: int, seed: int = 0) -> Dict[str, Tuple]:
+    """
+    Request bodies for each endpoint under test.
+    
+    Returns:
+        Dict mapping benchmark name to (method, path, encoded bodies),
+        optionally followed by (method, path, encoded bodies, clients) of
+        background traffic sent for as long as the benchmark runs
+    """
+    profiles = synthetic.population(users, seed)
+    requests = synthetic.insight_requests(max(1, users // 10), days, seed + 2)
+    digest = synthetic.digest_columns(max(1, users // 10), days, seed + 3)
+    
+    def encode(items) -> List[bytes]:
+        return [json.dumps(item).encode() for item in items]
+    
+    batches = [{'records': profiles[i:i + batch_size]} for i in range(0, len(profiles), batch_size)]
+    sweeps = [
+        {'baseline': profile, 'grid': {'distancePerDay': list(range(0, 100, 10)), 'diet': synthetic.DIETS},
+         'limit': 5}
+        for profile in profiles[:max(1, users // 10)]
+    ]
+    for request in requests:
+        request['recentProgress'] = [
+            {key: day[key] for key in ('date', 'carbonData', 'activities')}
+            for day in request['recentProgress']
+        ]
+    
+    return {
+        'POST /calculate': ('POST', '/calculate', encode(profiles)),
+        'POST /calculate/batch': ('POST', '/calculate/batch', encode(batches)),
+        'POST /predict-impact': ('POST', '/predict-impact',
+                                 encode(synthetic.lifestyle_changes(profiles, seed + 1))),
+        'POST /predict-impact/sweep': ('POST', '/predict-impact/sweep', encode(sweeps)),
+        'POST /insights': ('POST', '/insights', encode(requests)),
+        'POST /insights/batch': ('POST', '/insights/batch', encode([digest])),
+        # Dashboard latency while bulk traffic keeps the CPU pool busy (admission control)
+        'POST /insights + batch load': ('POST', '/insights', encode(requests),
+                                        ('POST', '/calculate/batch', encode(batches), 4)),
+        'GET /health': ('GET', '/health', [b''])
+    }
+
+
+async def _load(app, method: str, path: str, bodies: List[bytes], requests: int,
+                concurrency: int, rng: random.Random, background: Optional[Tuple] = None) -> Dict:
+    latencies = []
+    errors = 0
+    running = True
+    order = [bodies[rng.randrange(len(bodies))] for _ in range(requests)]
+    cursor = iter(order)
+    
+    async def client():
+        nonlocal errors
+        clock = time.perf_counter_ns
+        for body in cursor:
+            t0 = clock()
+            status, _ = await asgi_request(app, method, path, body)
+            latencies.append(clock() - t0)
+            if status >= 400:
+                errors += 1
+    
+    async def background_client(method: str, path: str, bodies: List[bytes]):
+        while running:
+            status, _ = await asgi_request(app, method, path, bodies[rng.randrange(len(bodies))])
+            if status >= 400:
+                await asyncio.sleep(0.01)
+    
+    for body in bodies[:3]:
+        await asgi_request(app, method, path, body)
+    
+    loaders = []
+    if background is not None:
+        loaders = [asyncio.ensure_future(background_client(*background[:3])) for _ in range(background[3])]
+        await asyncio.sleep(0.1)
+    start = time.perf_counter_ns()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    result = summarize(latencies, requests, time.perf_counter_ns() - start)
+    running = False
+    await asyncio.gather(*loaders)
+    result['concurrency'] = concurrency
+    result['errors'] = errors
+    return result
+
+
+def run(app, users: int, days: int, batch_size: int, requests: int = 500,
+        concurrency: int = 16, seed: int = 0, only: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Load-test the HTTP endpoints in-process against the ASGI app.
+    
+    Each endpoint gets `requests` requests from `concurrency` concurrent
+    clients, drawing bodies at random from the synthetic workload. Latency
+    covers the full ASGI round trip: routing, validation, handler and
+    response encoding.
+    
+    Args:
+        app: ASGI application (normally `main.app`)
+        users: Population size used to build request bodies
+        days: Progress history length for insights requests
+        batch_size: Records per `/calculate/batch` request
+        requests: Requests sent per endpoint
+        concurrency: Concurrent in-flight requests
+        seed: Random seed
+        only: Optional list of benchmark names to run
+    
+    Returns:
+        Dict mapping "METHOD /path" to its summary, with concurrency and errors
+    """
+    rng = random.Random(seed)
+    results = {}
+    for name, (method, path, bodies, *background) in scenarios(users, days, batch_size, seed).items():
+        if only and name not in only:
+            continue
+        results[name] = asyncio.run(_load(app, method, path, bodies, requests, concurrency, rng,
+                                          background[0] if background else None))
+    return results
@@ -0,0 +1,224 @@
+"""
+Microbenchmarks
+Times CarbonCalculator and InsightsGenerator methods call by call.
+"""
+
+import gc
+import tempfile
+import time
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from activity_store import ActivityStore
+from calculation_cache import CalculationCache
+from carbon_calculator import CarbonCalculator
+from insights_generator import InsightsGenerator
+from job_queue import JobQueue, chunk_records
+from lazy_imports import lazy_module
+from population_snapshot import COLUMNS as POPULATION_COLUMNS, PopulationSnapshot
+from projection import ProjectionEngine
+
+from benchmarks import synthetic
+
+# The load and startup benchmarks import this module too; they must not pay for pandas
+pd = lazy_module('pandas')
+
+
+def summarize(latencies_ns: List[int], items: int, wall_ns: int) -> Dict:
+    """
+    Throughput and latency percentiles for one benchmark.
+    
+    Args:
+        latencies_ns: Duration of every timed call
+        items: Records processed across all calls (calls for scalar methods)
+        wall_ns: Total elapsed time
+    
+    Returns:
+        Dict with calls, items, opsPerSec, itemsPerSec and mean/p50/p95/p99/max in ms
+    """
+    ms = np.asarray(latencies_ns, dtype=float) / 1e6
+    seconds = wall_ns / 1e9
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'calls': len(latencies_ns),
+        'items': items,
+        'opsPerSec': round(len(latencies_ns) / seconds, 1),
+        'itemsPerSec': round(items / seconds, 1),
+        'meanMs': round(float(ms.mean()), 4),
+        'p50Ms': round(float(p50), 4),
+        'p95Ms': round(float(p95), 4),
+        'p99Ms': round(float(p99), 4),
+        'maxMs': round(float(ms.max()), 4)
+    }
+
+
+def measure(func: Callable, inputs: Iterable, items: Optional[int] = None, warmup: int = 3) -> Dict:
+    """
+    Call `func(x)` for every input, timing each call.
+    
+    `items` is the number of records the timed calls process in total and
+    defaults to one per call. The first `warmup` inputs are run untimed.
+    Garbage collection is disabled while timing so collector pauses do not
+    land on random calls.
+    """
+    inputs = list(inputs)
+    for x in inputs[:warmup]:
+        func(x)
+    
+    latencies = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        clock = time.perf_counter_ns
+        start = clock()
+        for x in inputs:
+            t0 = clock()
+            func(x)
+            latencies.append(clock() - t0)
+        wall = clock() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return summarize(latencies, len(inputs) if items is None else items, wall)
+
+
+def run(users: int, days: int, batch_size: int, seed: int = 0) -> Dict[str, Dict]:
+    """
+    Microbenchmark the calculator and insights methods on synthetic data.
+    
+    Args:
+        users: Population size; scalar methods are called once per user
+        days: Progress history length per user for insights
+        batch_size: Records per `calculate_batch` call
+        seed: Random seed for the synthetic data
+    
+    Returns:
+        Dict mapping benchmark name to its summary
+    """
+    profiles = synthetic.population(users, seed)
+    changes = synthetic.lifestyle_changes(profiles, seed + 1)
+    requests = synthetic.insight_requests(max(1, users // 10), days, seed + 2)
+    digest = synthetic.digest_columns(max(1, users // 10), days, seed + 3)
+    
+    calculator = CarbonCalculator()
+    cached = CarbonCalculator(factors=calculator.factors, rules=calculator.rules,
+                              cache=CalculationCache(max_size=max(users, 1)))
+    insights = InsightsGenerator(rules=calculator.rules)
+    
+    def calculate(profile: Dict):
+        return calculator.calculate(profile['transportation'], profile['energy'],
+                                    profile['diet'], profile['shopping'])
+    
+    def calculate_cached(profile: Dict):
+        return cached.calculate(profile['transportation'], profile['energy'],
+                                profile['diet'], profile['shopping'])
+    
+    def generate(request: Dict):
+        return insights.generate(request['lifestyle'], request['recentProgress'],
+                                 request['carbonFootprint'])
+    
+    breakdowns = synthetic.population_breakdowns(users, days, seed + 4)
+    with tempfile.TemporaryDirectory() as directory:
+        PopulationSnapshot.write(directory, breakdowns['userIds'], breakdowns['dates'], breakdowns)
+        snapshot = PopulationSnapshot.load(f'{directory}/current.json')
+    
+    projections = ProjectionEngine()
+    
+    # Footprint model trained on the digest users, queried for all of them at once
+    from train_footprint_model import train as train_footprint_model
+    
+    model_rows = pd.DataFrame({'user': digest['userIds'], 'total': digest['totals'],
+                               'day': [date.fromisoformat(day).toordinal() for day in digest['dates']]})
+    model = train_footprint_model(model_rows)
+    model_users = list(dict.fromkeys(digest['userIds']))
+    model_window = np.full((len(model_users), 7), np.nan)
+    newest = np.asarray(digest['totals']).reshape(len(model_users), days)[:, :7]
+    model_window[:, :newest.shape[1]] = newest
+    model_weekdays = np.arange(len(model_users)) % 7
+    
+    # Weekly digest texts: one insight per user rendered from a compiled template
+    trend_template = insights.templates.current().get('es').insights['trend_down']
+    trend_percents = [{'percent': [abs(p) for p in np.random.default_rng(seed).normal(0, 20, users).tolist()]}] * 5
+    
+    # Activity events ingested in chunks of a few thousand, as a batch job would send them
+    events = synthetic.activity_events(max(1, users // 10), days, seed=seed + 5)
+    event_chunks = [{name: column[i:i + 5000] for name, column in events.items()}
+                    for i in range(0, len(events['userIds']), 5000)]
+    activity_store = ActivityStore(None)
+    
+    def ingest_activities(columns: Dict):
+        return activity_store.ingest(columns['userIds'], columns['types'], columns['carbonImpacts'],
+                                     columns['timestamps'])
+    
+    def population_means(category: str):
+        snapshot._means.clear()
+        return snapshot.user_means(category, days)
+    
+    batches = [profiles[i:i + batch_size] for i in range(0, len(profiles), batch_size)]
+    for profile in profiles:
+        calculate_cached(profile)
+    
+    # Queue overhead per job chunk: lease it, then checkpoint its (precomputed) output
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = JobQueue(f'{directory}/jobs.sqlite3')
+        job_chunks = chunk_records(profiles, 10)
+        jobs.submit('calculate', job_chunks * 5, len(profiles) * 5)
+        output = b'{"daily":12.3}\n' * 10
+        job_queue_chunk = measure(lambda _: jobs.complete(jobs.claim('bench'), output, 'bench'),
+                                  range(len(job_chunks) * 5 - 3))
+    sweep_profiles = profiles[:max(1, users // 10)]
+    sweep_grid = {'distancePerDay': list(range(0, 100, 5)), 'electricityUsage': list(range(0, 30, 3)),
+                  'diet': synthetic.DIETS}
+    
+    return {
+        'calculate': measure(calculate, profiles),
+        'calculate_cached': measure(calculate_cached, profiles),
+        'calculate_batch': measure(calculator.calculate_batch, batches,
+                                   items=len(profiles), warmup=1),
+        'calculate_uncertainty': measure(lambda profile: calculator.uncertainty_batch([profile]), profiles),
+        'calculate_uncertainty_batch': measure(calculator.uncertainty_batch, batches,
+                                               items=len(profiles), warmup=1),
+        'predict_change_impact': measure(calculator.predict_change_impact, changes),
+        'predict_change_sweep': measure(
+            lambda profile: calculator.predict_change_sweep(profile, grid=sweep_grid, limit=10),
+            sweep_profiles,
+            items=len(sweep_profiles) * int(np.prod([len(v) for v in sweep_grid.values()]))
+        ),
+        'plan_savings': measure(calculator.plan_savings, sweep_profiles),
+        'insights_generate': measure(generate, requests),
+        'insights_generate_batch': measure(
+            lambda columns: insights.generate_batch(
+                columns['userIds'], columns['dates'], columns['totals'],
+                columns['carbonSaved'], columns['challengesCompleted']
+            ),
+            [digest] * 5,
+            items=5 * len(set(digest['userIds'])),
+            warmup=1
+        ),
+        'insight_templates_render_many': measure(trend_template.render_many, trend_percents,
+                                                 items=5 * users, warmup=1),
+        'job_queue_chunk': job_queue_chunk,
+        'activity_store_ingest': measure(ingest_activities, event_chunks, items=len(events['userIds']), warmup=1),
+        'population_user_means': measure(population_means, list(POPULATION_COLUMNS) * 4,
+                                         items=snapshot.rows * len(POPULATION_COLUMNS) * 4, warmup=1),
+        'population_percentiles_rows': measure(
+            lambda category: snapshot.percentiles(category, per_user=False),
+            list(POPULATION_COLUMNS) * 4,
+            items=snapshot.rows * len(POPULATION_COLUMNS) * 4,
+            warmup=1
+        ),
+        'population_compare': measure(lambda user_id: snapshot.compare(user_id, None), snapshot.users),
+        'footprint_model_personalize': measure(
+            lambda users: model.personalize(users, model_window, model_weekdays),
+            [model_users] * 20,
+            items=20 * len(model_users)
+        ),
+        'projection_batch': measure(
+            lambda columns: projections.project(columns['userIds'], columns['dates'], columns['totals']),
+            [digest] * 5,
+            items=5 * len(set(digest['userIds'])),
+            warmup=1
+        )
+    }
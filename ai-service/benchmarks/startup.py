@@ -0,0 +1,108 @@
+"""
+Startup Benchmark
+Times service import and first requests in fresh interpreters, cold and after the startup warm-up.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks import load
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter: argv is the mode ('cold' or 'warm') and the request file
+PROBE = """
+import asyncio, json, sys, time
+mode, path = sys.argv[1], sys.argv[2]
+with open(path) as f:
+    cases = json.load(f)
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from benchmarks.load import asgi_request
+warmup = main.warmup.run()['durationMs'] if mode == 'warm' else 0.0
+
+async def probe():
+    timings = {}
+    for name, method, url, body in cases:
+        runs = []
+        for _ in range(2):
+            begin = time.perf_counter()
+            status, _ = await asgi_request(main.app, method, url, body.encode())
+            runs.append((time.perf_counter() - begin) * 1000)
+            if status >= 400:
+                raise SystemExit(f'{name} returned {status}')
+        timings[name] = runs
+    return timings
+
+print(json.dumps({'importMs': (imported - started) * 1000, 'warmupMs': warmup,
+                  'requests': asyncio.run(probe())}))
+"""
+
+
+def _summary(ms: List[float]) -> Dict:
+    values = np.asarray(ms, dtype=float)
+    p50, p99 = np.percentile(values, [50, 99])
+    return {
+        'runs': len(ms),
+        'meanMs': round(float(values.mean()), 4),
+        'p50Ms': round(float(p50), 4),
+        'p99Ms': round(float(p99), 4),
+        'maxMs': round(float(values.max()), 4)
+    }
+
+
+def _probe(mode: str, cases_path: str) -> Dict:
+    env = {
+        **os.environ,
+        'PYTHONPATH': SERVICE_DIR,
+        'STARTUP_WARMUP': 'off',
+        # Keep the probe's requests out of the on-disk history
+        'HISTORY_STORE_DIR': ''
+    }
+    output = subprocess.run([sys.executable, '-c', PROBE, mode, cases_path], cwd=SERVICE_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs: int = 5, days: int = 30, batch_size: int = 100, seed: int = 0) -> Dict[str, Dict]:
+    """
+    Start the service `runs` times per mode in fresh interpreters.
+    
+    Every run times `import main`, then sends each endpoint of the load test
+    one request (the first request), then a second one. Cold runs skip the
+    startup warm-up, as the first requests of a new pod would see before it
+    finishes; warm runs complete it first and report its duration.
+    
+    Args:
+        runs: Fresh interpreters per mode
+        days: Progress history length for insights requests
+        batch_size: Records per `/calculate/batch` request
+        seed: Random seed
+    
+    Returns:
+        Dict mapping benchmark name (import, warmup, and first/second
+        request per mode and endpoint) to latency statistics in ms
+    """
+    cases = [[name, method, path, bodies[0].decode()]
+             for name, (method, path, bodies) in load.scenarios(batch_size, days, batch_size, seed).items()]
+    samples: Dict[str, List[float]] = {}
+    with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+        json.dump(cases, f)
+        f.flush()
+        for mode in ('cold', 'warm'):
+            for _ in range(runs):
+                result = _probe(mode, f.name)
+                samples.setdefault('import main', []).append(result['importMs'])
+                if mode == 'warm':
+                    samples.setdefault('warmup', []).append(result['warmupMs'])
+                for name, (first, second) in result['requests'].items():
+                    samples.setdefault(f'{mode} first {name}', []).append(first)
+                    samples.setdefault(f'{mode} second {name}', []).append(second)
+    return {name: _summary(ms) for name, ms in samples.items()}
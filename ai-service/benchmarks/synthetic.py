@@ -0,0 +1,179 @@
+"""
+Synthetic Workloads
+Generates reproducible user populations and progress histories for benchmarks.
+"""
+
+import random
+from datetime import date, timedelta
+from typing import Dict, List
+
+TRANSPORT_MODES = ['car', 'public_transport', 'bicycle', 'walking', 'motorcycle', 'electric_car']
+DIETS = ['vegan', 'vegetarian', 'pescatarian', 'omnivore', 'high_meat']
+REGIONS = ['EU', 'UK', 'US', 'CA', 'AU', 'IN', 'JP', None]
+# Activity types the backend logs (a subset of activity_store.ACTIVITY_TYPES)
+ACTIVITY_TYPES = ['transport', 'energy_usage', 'meal', 'purchase']
+
+START_DATE = date(2024, 1, 1)
+
+
+def lifestyle(rng: random.Random) -> Dict:
+    """One random lifestyle record in the `/calculate` request shape."""
+    energy = {
+        'electricityUsage': round(rng.uniform(0, 30), 1),
+        'gasUsage': round(rng.uniform(0, 10), 1),
+        'renewableEnergy': rng.random() < 0.3
+    }
+    region = rng.choice(REGIONS)
+    if region is not None:
+        energy['region'] = region
+    
+    return {
+        'transportation': {
+            'primaryMode': rng.choice(TRANSPORT_MODES),
+            'distancePerDay': round(rng.uniform(0, 80), 1)
+        },
+        'energy': energy,
+        'diet': rng.choice(DIETS),
+        'shopping': {
+            'clothesPerMonth': rng.randint(0, 10),
+            'electronicsPerYear': rng.randint(0, 4)
+        }
+    }
+
+
+def population(size: int, seed: int = 0) -> List[Dict]:
+    """
+    Generate `size` lifestyle records.
+    
+    Args:
+        size: Number of users
+        seed: Random seed; the same seed always yields the same population
+    
+    Returns:
+        List of lifestyle dicts
+    """
+    rng = random.Random(seed)
+    return [lifestyle(rng) for _ in range(size)]
+
+
+def progress_history(days: int, rng: random.Random, base: float = 15.0) -> List[Dict]:
+    """
+    Daily progress records for one user, newest first as the backend sends them.
+    
+    Totals follow a slow drift with daily noise; some days complete challenges.
+    """
+    history = []
+    level = base
+    for offset in range(days):
+        level = max(0.5, level + rng.gauss(-0.02, 0.3))
+        total = round(max(0.0, level + rng.gauss(0, 1.5)), 2)
+        challenges = [
+            {'carbonSaved': round(rng.uniform(0.1, 5.0), 2)}
+            for _ in range(rng.choice((0, 0, 0, 1, 2)))
+        ]
+        history.append({
+            'date': (START_DATE + timedelta(days=offset)).isoformat(),
+            'carbonData': {'total': total},
+            'activities': [
+                {
+                    'type': rng.choice(ACTIVITY_TYPES),
+                    'description': 'synthetic activity',
+                    'carbonImpact': round(rng.uniform(0, 5), 2),
+                    'timestamp': (START_DATE + timedelta(days=offset)).isoformat()
+                }
+                for _ in range(rng.randint(0, 3))
+            ],
+            'challengesCompleted': challenges
+        })
+    history.reverse()
+    return history
+
+
+def insight_requests(size: int, days: int, seed: int = 0) -> List[Dict]:
+    """
+    Generate `size` insight requests in the `/insights` shape.
+    
+    Args:
+        size: Number of users
+        days: Progress history length per user
+        seed: Random seed
+    
+    Returns:
+        List of dicts with lifestyle, recentProgress and carbonFootprint
+    """
+    rng = random.Random(seed)
+    requests = []
+    for user in range(size):
+        profile = lifestyle(rng)
+        requests.append({
+            'userId': f'user-{user}',
+            'lifestyle': profile,
+            'recentProgress': progress_history(days, rng, base=rng.uniform(5, 30)),
+            'carbonFootprint': {'daily': round(rng.uniform(5, 30), 2)}
+        })
+    return requests
+
+
+def digest_columns(size: int, days: int, seed: int = 0) -> Dict[str, List]:
+    """
+    Columnar progress rows for `size` users in the `/insights/batch` shape.
+    
+    Args:
+        size: Number of users
+        days: Progress days per user
+        seed: Random seed
+    
+    Returns:
+        Dict with userIds, dates, totals, carbonSaved and challengesCompleted lists
+    """
+    rng = random.Random(seed)
+    columns = {'userIds': [], 'dates': [], 'totals': [], 'carbonSaved': [], 'challengesCompleted': []}
+    for user in range(size):
+        for day in progress_history(days, rng, base=rng.uniform(5, 30)):
+            challenges = day['challengesCompleted']
+            columns['userIds'].append(f'user-{user}')
+            columns['dates'].append(day['date'])
+            columns['totals'].append(day['carbonData']['total'])
+            columns['carbonSaved'].append(round(sum(c['carbonSaved'] for c in challenges), 2))
+            columns['challengesCompleted'].append(len(challenges))
+    return columns
+
+
+def population_breakdowns(size: int, days: int, seed: int = 0) -> Dict[str, List]:
+    """
+    Columnar daily breakdowns for `size` users over `days` days in the
+    `/population/snapshot` shape.
+    """
+    rng = random.Random(seed)
+    columns = {'userIds': [], 'dates': [], 'transportation': [], 'energy': [], 'diet': [], 'shopping': []}
+    for user in range(size):
+        scales = (rng.uniform(0, 8), rng.uniform(1, 6), rng.uniform(2, 7), rng.uniform(0, 2))
+        for offset in range(days):
+            columns['userIds'].append(f'user-{user}')
+            columns['dates'].append((START_DATE + timedelta(days=offset)).isoformat())
+            for name, scale in zip(('transportation', 'energy', 'diet', 'shopping'), scales):
+                columns[name].append(round(rng.expovariate(1 / scale) if scale else 0.0, 2))
+    return columns
+
+
+def activity_events(size: int, days: int, per_day: int = 5, seed: int = 0) -> Dict[str, List]:
+    """
+    Columnar activity events for `size` users, about `per_day` per user and
+    day over `days` days, in the `/activities` shape and in time order.
+    """
+    rng = random.Random(seed)
+    columns = {'userIds': [], 'types': [], 'carbonImpacts': [], 'timestamps': []}
+    for offset in range(days):
+        day = (START_DATE + timedelta(days=offset)).isoformat()
+        for _ in range(size * per_day):
+            columns['userIds'].append(f'user-{rng.randrange(size)}')
+            columns['types'].append(rng.choice(ACTIVITY_TYPES))
+            columns['carbonImpacts'].append(round(rng.uniform(0, 5), 2))
+            columns['timestamps'].append(f'{day}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00.000Z')
+    return columns
+
+
+def lifestyle_changes(profiles: List[Dict], seed: int = 0) -> List[Dict]:
+    """Pair each profile with a randomly changed one in the `/predict-impact` shape."""
+    rng = random.Random(seed)
+    return [{'current': profile, 'proposed': lifestyle(rng)} for profile in profiles]
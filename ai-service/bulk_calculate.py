@@ -0,0 +1,42 @@
+"""
+Bulk Carbon Calculation CLI
+Reads NDJSON lifestyle records from a file or stdin and writes NDJSON results.
+
+Usage:
+    python bulk_calculate.py records.ndjson -o results.ndjson
+    cat records.ndjson | python bulk_calculate.py > results.ndjson
+"""
+
+import argparse
+import sys
+
+from bulk_stream import DEFAULT_CHUNK_SIZE, iter_results
+from carbon_calculator import CarbonCalculator
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Calculate carbon footprints for NDJSON lifestyle records.")
+    parser.add_argument('input', nargs='?', default='-', help="Input NDJSON file (default: stdin)")
+    parser.add_argument('-o', '--output', default='-', help="Output NDJSON file (default: stdout)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Records per vectorized chunk (default: {DEFAULT_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+    
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    target = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        calculator = CarbonCalculator()
+        for data in iter_results(calculator, source, chunk_size=args.chunk_size):
+            target.write(data)
+        target.flush()
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if target is not sys.stdout.buffer:
+            target.close()
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Bulk Stream Processing
+Pushes newline-delimited JSON lifestyle records through the carbon calculator in fixed-size chunks.
+"""
+
+import asyncio
+import contextvars
+import json
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from carbon_calculator import CarbonCalculator, format_calculation
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Longest accepted input line; guards the buffer against unterminated input
+MAX_LINE_BYTES = 1024 * 1024
+
+
+def parse_record(line) -> Dict:
+    """
+    Parse and structurally validate one NDJSON lifestyle record.
+    
+    Raises:
+        ValueError: If the line is not a JSON object with the calculator fields
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+    
+    for section in ('transportation', 'energy', 'shopping'):
+        if not isinstance(record.get(section), dict):
+            raise ValueError(f"'{section}' must be an object")
+    if not isinstance(record.get('diet'), str):
+        raise ValueError("'diet' must be a string")
+    
+    transportation = record['transportation']
+    energy = record['energy']
+    if not isinstance(transportation.get('primaryMode'), str):
+        raise ValueError("'transportation.primaryMode' must be a string")
+    if not isinstance(energy.get('renewableEnergy'), bool):
+        raise ValueError("'energy.renewableEnergy' must be a boolean")
+    for section, field in (('transportation', 'distancePerDay'), ('energy', 'electricityUsage'),
+                           ('energy', 'gasUsage')):
+        value = record[section].get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"'{section}.{field}' must be a number")
+    # Optional: missing shopping amounts count as 0 and a missing region as the default one
+    for field in ('clothesPerMonth', 'electronicsPerYear'):
+        value = record['shopping'].get(field, 0)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"'shopping.{field}' must be a number")
+    region = energy.get('region')
+    if region is not None and not isinstance(region, str):
+        raise ValueError("'energy.region' must be a string")
+    
+    return record
+
+
+def process_chunk(calculator: CarbonCalculator, chunk: List[Tuple[int, bytes]]) -> bytes:
+    """
+    Calculate one chunk of numbered input lines and encode the results as NDJSON.
+    
+    Output lines are in input order. Each carries the 1-based input `line`
+    number and the record `id` when one was supplied; invalid lines produce
+    an `error` entry instead of failing the whole stream. Should the batch
+    calculation still fail, the chunk's records are calculated one by one
+    so the error stays on the line that caused it.
+    """
+    records = []
+    outcomes = []
+    for line_no, line in chunk:
+        try:
+            record = parse_record(line)
+            outcomes.append((line_no, record, None))
+            records.append(record)
+        except ValueError as e:
+            outcomes.append((line_no, None, str(e)))
+    
+    try:
+        results = iter(calculator.calculate_batch(records))
+    except Exception:
+        results = None
+    out = []
+    for line_no, record, error in outcomes:
+        if error is None:
+            if results is not None:
+                result = next(results)
+            else:
+                try:
+                    result = calculator.calculate_batch([record])[0]
+                except Exception as e:
+                    error = f"calculation failed: {e}"
+        if error is not None:
+            item = {'line': line_no, 'error': error}
+        else:
+            item = {'line': line_no}
+            if 'id' in record:
+                item['id'] = record['id']
+            item.update(format_calculation(result))
+        out.append(json.dumps(item, ensure_ascii=False))
+    
+    return ('\n'.join(out) + '\n').encode('utf-8') if out else b''
+
+
+def iter_results(calculator: CarbonCalculator, lines: Iterable,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Process an iterable of NDJSON lines, yielding encoded result chunks."""
+    chunk = []
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        chunk.append((line_no, line))
+        if len(chunk) >= chunk_size:
+            yield process_chunk(calculator, chunk)
+            chunk = []
+    if chunk:
+        yield process_chunk(calculator, chunk)
+
+
+async def aiter_results(calculator: CarbonCalculator, body: AsyncIterable[bytes],
+                        chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        run: Optional[Callable[..., Awaitable[bytes]]] = None) -> AsyncIterator[bytes]:
+    """
+    Process a streamed NDJSON request body, yielding encoded result chunks.
+    
+    Input is only pulled from `body` when the consumer asks for the next
+    chunk, so a slow reader throttles the producer and memory stays bounded
+    by `chunk_size` lines regardless of input size. Chunks are calculated
+    through `run(func, *args)` (such as `cpu_pool.run_cpu`; the loop's
+    default pool if None) so the event loop keeps serving other requests
+    meanwhile.
+    """
+    if run is None:
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        
+        def run(func, *args):
+            return loop.run_in_executor(None, context.run, func, *args)
+    buffer = b''
+    line_no = 0
+    chunk = []
+    async for data in body:
+        buffer += data
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"Input line {line_no + len(lines) + 1} exceeds {MAX_LINE_BYTES} bytes")
+        
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                chunk.append((line_no, line))
+            if len(chunk) >= chunk_size:
+                yield await run(process_chunk, calculator, chunk)
+                chunk = []
+    
+    if buffer.strip():
+        chunk.append((line_no + 1, buffer))
+    if chunk:
+        yield await run(process_chunk, calculator, chunk)
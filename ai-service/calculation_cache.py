@@ -0,0 +1,125 @@
+"""
+Calculation Cache
+Bounded LRU/TTL cache for carbon footprint results keyed on normalized lifestyle profiles.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+def _number(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def profile_key(version: str, transportation: Dict, energy: Dict, diet: str, shopping: Dict) -> Tuple:
+    """
+    Canonical, hashable key for a lifestyle profile and the factor/rule versions.
+    
+    Only the fields the calculator reads are included, numbers are normalized
+    to floats (25 and 25.0 share an entry) and flags to bools, so requests
+    that produce the same result share a cache entry.
+    """
+    return (
+        version,
+        transportation.get('primaryMode'),
+        _number(transportation.get('distancePerDay')),
+        _number(energy.get('electricityUsage')),
+        _number(energy.get('gasUsage')),
+        None if energy.get('renewableEnergy') is None else bool(energy.get('renewableEnergy')),
+        energy.get('region'),
+        diet,
+        _number(shopping.get('clothesPerMonth')),
+        _number(shopping.get('electronicsPerYear'))
+    )
+
+
+class CalculationCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+    
+    Cached values are shared between callers and must be treated as read-only.
+    The cache is bound to the emission factor table and rule book it was filled
+    from and clears itself when either is swapped, so stale results are never served.
+    """
+    
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        if max_size is None:
+            max_size = int(os.getenv('CALC_CACHE_SIZE', 4096))
+        if ttl is None:
+            ttl = float(os.getenv('CALC_CACHE_TTL', 3600))
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._sources = ()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def bind(self, *sources) -> None:
+        """Clear the cache if any versioned source (factor table, rules) has been swapped."""
+        if not self._same_sources(sources):
+            with self._lock:
+                if not self._same_sources(sources):
+                    if self._sources:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self._sources = sources
+    
+    def _same_sources(self, sources: Tuple) -> bool:
+        return len(sources) == len(self._sources) and all(a is b for a, b in zip(sources, self._sources))
+    
+    def get(self, key: Hashable):
+        """Return the cached value or None, refreshing its LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Counters and configuration for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxSize': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'versions': [source.version for source in self._sources]
+        }
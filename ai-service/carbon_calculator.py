@@ -3,40 +3,99 @@ Carbon Footprint Calculator
 Estimates carbon emissions based on lifestyle data using emission factors.
 """
 
+import time
 import numpy as np
-from typing import Dict, List
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+from calculation_cache import CalculationCache, profile_key
+from emission_factors import EmissionFactorRegistry, EmissionFactorTable
+from metrics import observe_stage
+from request_objects import Lifestyle
+from rule_engine import RuleBook, RuleRegistry
+from savings_plan import (DEFAULT_MAX_EFFORT, LEVERS, category_candidates, combine_fronts, lever_options,
+                          spread)
+from uncertainty import UncertaintyEstimator, default_samples, default_seed
+
+# Context: average person's annual emissions (~4 tons CO2) and what one tree absorbs per year
+GLOBAL_AVERAGE_ANNUAL_KG = 4000
+TREE_ANNUAL_KG = 21
+
+
+def _round_array(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """Element-wise equivalent of the builtin round() for float64 arrays."""
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    rounded = np.rint(scaled) / scale
+    
+    # The scaled product can land on the other side of a .5 tie than the exact
+    # binary value; defer those few elements to round(), which is exact.
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.spacing(scaled)
+    if near_tie.any():
+        idx = np.flatnonzero(near_tie)
+        rounded.flat[idx] = [round(v, ndigits) for v in values.flat[idx].tolist()]
+    return rounded
+
+
+# Breakdown categories, in the order results report them
+CATEGORIES = ('transportation', 'energy', 'diet', 'shopping')
+
+# Parameters that can vary in a scenario sweep: (lifestyle section, encoded column)
+SWEEP_PARAMETERS = {
+    'primaryMode': ('transportation', 'mode'),
+    'distancePerDay': ('transportation', 'distance'),
+    'electricityUsage': ('energy', 'electricity'),
+    'gasUsage': ('energy', 'gas'),
+    'renewableEnergy': ('energy', 'renewable'),
+    'region': ('energy', 'region'),
+    'diet': (None, 'diet'),
+    'clothesPerMonth': ('shopping', 'clothes'),
+    'electronicsPerYear': ('shopping', 'electronics')
+}
+
+# Upper bound on scenarios evaluated by a single sweep
+MAX_SWEEP_SCENARIOS = 100000
+
+
+def format_calculation(result: Dict) -> Dict:
+    """Shape a calculator result into the public `/calculate` response fields."""
+    return {
+        "daily": result["daily"],
+        "weekly": result["daily"] * 7,
+        "monthly": result["daily"] * 30,
+        "breakdown": result["breakdown"],
+        "recommendations": result.get("recommendations", [])
+    }
+
+
+def _lifestyle_values(lifestyle: Lifestyle) -> tuple:
+    """Positional `_calculate` arguments after the factor table and rules."""
+    return (
+        lifestyle.primary_mode, lifestyle.distance, lifestyle.electricity, lifestyle.gas,
+        lifestyle.renewable, lifestyle.region, lifestyle.diet,
+        0 if lifestyle.clothes is None else lifestyle.clothes,
+        0 if lifestyle.electronics is None else lifestyle.electronics
+    )
 
 
 class CarbonCalculator:
     """Calculate carbon footprint from lifestyle data."""
     
-    def __init__(self):
-        # Emission factors (kg CO2 per unit)
-        self.transport_emissions = {
-            'car': 0.192,  # kg CO2 per km
-            'public_transport': 0.089,
-            'bicycle': 0.0,
-            'walking': 0.0,
-            'motorcycle': 0.113,
-            'electric_car': 0.053
-        }
+    def __init__(self, factors: Optional[EmissionFactorRegistry] = None,
+                 cache: Optional[CalculationCache] = None,
+                 rules: Optional[RuleRegistry] = None):
+        # Emission factors (kg CO2 per unit) come from a versioned table file
+        # that can be swapped at runtime; see emission_factors.py
+        self.factors = factors or EmissionFactorRegistry()
         
-        self.diet_emissions = {
-            'vegan': 2.89,  # kg CO2 per day
-            'vegetarian': 3.81,
-            'pescatarian': 4.67,
-            'omnivore': 7.19,
-            'high_meat': 10.24
-        }
+        # Recommendation rules, compiled from data/recommendation_rules.json
+        self.rules = rules or RuleRegistry()
         
-        # Electricity: kg CO2 per kWh (varies by region, using EU average)
-        self.electricity_factor = 0.295
-        # Natural gas: kg CO2 per kWh
-        self.gas_factor = 0.185
+        # Optional memoization of `calculate` results for repeated profiles
+        self.cache = cache
         
-        # Shopping emissions factors
-        self.clothing_factor = 15.0  # kg CO2 per item
-        self.electronics_factor = 100.0  # kg CO2 per item
+        # Monte Carlo bands over the factor table's uncertainties; see uncertainty.py
+        self.uncertainty = UncertaintyEstimator()
     
     def calculate(self, transportation: Dict, energy: Dict, diet: str, shopping: Dict) -> Dict:
         """
@@ -49,44 +108,127 @@ class CarbonCalculator:
             shopping: Dict with shopping habits
         
         Returns:
-            Dict with daily total and breakdown by category
+            Dict with daily total and breakdown by category. Results may be
+            served from the cache and must not be mutated by callers.
+        """
+        table = self.factors.current()
+        rules = self.rules.current()
+        values = (
+            transportation.get('primaryMode', 'car'),
+            transportation.get('distancePerDay', 0),
+            energy.get('electricityUsage', 0),  # kWh per day
+            energy.get('gasUsage', 0),  # kWh per day
+            energy.get('renewableEnergy', False),
+            energy.get('region'),
+            diet,
+            shopping.get('clothesPerMonth', 0),
+            shopping.get('electronicsPerYear', 0)
+        )
+        if self.cache is None:
+            return self._calculate(table, rules, *values)
+        
+        self.cache.bind(table, rules)
+        key = profile_key(f'{table.version}/{rules.version}', transportation, energy, diet, shopping)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._calculate(table, rules, *values)
+            self.cache.put(key, result)
+        return result
+    
+    def calculate_lifestyle(self, lifestyle: Lifestyle) -> Dict:
+        """
+        Calculate the footprint of a validated request object.
+        
+        Same result and cache entries as `calculate` with the equivalent
+        dicts, without building them.
+        """
+        table = self.factors.current()
+        rules = self.rules.current()
+        values = _lifestyle_values(lifestyle)
+        if self.cache is None:
+            return self._calculate(table, rules, *values)
+        
+        self.cache.bind(table, rules)
+        key = lifestyle.cache_key(f'{table.version}/{rules.version}')
+        result = self.cache.get(key)
+        if result is None:
+            result = self._calculate(table, rules, *values)
+            self.cache.put(key, result)
+        return result
+    
+    def lifestyle_key(self, lifestyle: Lifestyle) -> tuple:
         """
+        Canonical key of a request object under the active factor and rule
+        versions; also binds the cache to those versions.
+        """
+        table = self.factors.current()
+        rules = self.rules.current()
+        if self.cache is not None:
+            self.cache.bind(table, rules)
+        return lifestyle.cache_key(f'{table.version}/{rules.version}')
+    
+    def cached_result(self, key: tuple) -> Optional[Dict]:
+        """Cached result for a `lifestyle_key`, if any."""
+        return self.cache.get(key) if self.cache is not None else None
+    
+    def calculate_and_cache(self, keys: List[tuple], lifestyles: List[Lifestyle]) -> List[Dict]:
+        """
+        Calculate request objects that missed the cache and cache the results.
+        
+        One object takes the scalar path and several one vectorized
+        `calculate_lifestyles` pass; either way the results match
+        `calculate_lifestyle`.
+        """
+        if len(lifestyles) == 1:
+            results = [self._calculate(self.factors.current(), self.rules.current(),
+                                       *_lifestyle_values(lifestyles[0]))]
+        else:
+            results = self.calculate_lifestyles(lifestyles)
+        if self.cache is not None:
+            for key, result in zip(keys, results):
+                self.cache.put(key, result)
+        return results
+    
+    def _calculate(self, table: EmissionFactorTable, rules: RuleBook, transport_mode: str, distance: float,
+                   electricity: float, gas: float, renewable: bool, region: Optional[str], diet: str,
+                   clothes_per_month: float, electronics_per_year: float) -> Dict:
+        """Uncached calculation against specific emission factor and rule versions."""
+        started = time.perf_counter()
         breakdown = {}
         
         # Transportation emissions
-        transport_mode = transportation.get('primaryMode', 'car')
-        distance = transportation.get('distancePerDay', 0)
-        transport_emission_factor = self.transport_emissions.get(transport_mode, 0.192)
-        breakdown['transportation'] = distance * transport_emission_factor
+        transport_code = table.transport_codes.get(transport_mode, table.default_transport_code)
+        breakdown['transportation'] = distance * table.transport_factors[transport_code]
         
         # Energy emissions
-        electricity = energy.get('electricityUsage', 0)  # kWh per day
-        gas = energy.get('gasUsage', 0)  # kWh per day
-        renewable = energy.get('renewableEnergy', False)
+        electricity_factor = (
+            table.electricity_factor if region is None
+            else table.electricity_factors[table.region_code(region)]
+        )
         
         # Apply renewable energy discount (70% reduction if using renewable)
-        renewable_factor = 0.3 if renewable else 1.0
+        renewable_factor = table.renewable_factor if renewable else 1.0
         breakdown['energy'] = (
-            electricity * self.electricity_factor * renewable_factor +
-            gas * self.gas_factor
+            electricity * electricity_factor * renewable_factor +
+            gas * table.gas_factor
         )
         
         # Diet emissions
-        breakdown['diet'] = self.diet_emissions.get(diet, 7.19)
+        breakdown['diet'] = table.diet_factors[table.diet_codes.get(diet, table.default_diet_code)]
         
         # Shopping emissions (converted to daily average)
-        clothes_per_month = shopping.get('clothesPerMonth', 0)
-        electronics_per_year = shopping.get('electronicsPerYear', 0)
         breakdown['shopping'] = (
-            (clothes_per_month * self.clothing_factor / 30) +
-            (electronics_per_year * self.electronics_factor / 365)
+            (clothes_per_month * table.clothing_factor / 30) +
+            (electronics_per_year * table.electronics_factor / 365)
         )
         
         # Total daily emissions
         daily_total = sum(breakdown.values())
+        started = observe_stage('calculate', started)
         
         # Generate recommendations based on highest emissions
-        recommendations = self._generate_recommendations(breakdown, transportation, energy, diet)
+        recommendations = self._generate_recommendations(breakdown, rules, transport_mode, renewable, diet)
+        observe_stage('recommendations', started)
         
         return {
             'daily': round(daily_total, 2),
@@ -94,70 +236,220 @@ class CarbonCalculator:
             'recommendations': recommendations
         }
     
-    def _generate_recommendations(self, breakdown: Dict, transportation: Dict, 
-                                  energy: Dict, diet: str) -> List[Dict]:
+    def calculate_batch(self, records: List[Dict]) -> List[Dict]:
+        """
+        Calculate carbon footprints for many lifestyle records in one pass.
+        
+        Modes and diets are encoded as integer codes and every breakdown
+        category is computed with NumPy arrays. The arithmetic mirrors
+        `calculate` operation for operation, so results (including rounding
+        and recommendations) are identical to calling it once per record.
+        
+        Args:
+            records: List of dicts with transportation, energy, diet and shopping
+        
+        Returns:
+            List of results in input order, each shaped like `calculate` output
+        """
+        if not records:
+            return []
+        
+        started = time.perf_counter()
+        table = self.factors.current()
+        columns = self._encode_records(records, table)
+        return self._calculate_columns(
+            table, columns,
+            [r['transportation'].get('primaryMode', 'car') for r in records],
+            [r['energy'].get('renewableEnergy', False) for r in records],
+            [r['diet'] for r in records],
+            started
+        )
+    
+    def calculate_lifestyles(self, lifestyles: List[Lifestyle]) -> List[Dict]:
+        """Batch counterpart of `calculate_lifestyle`; same results as `calculate_batch`."""
+        if not lifestyles:
+            return []
+        
+        started = time.perf_counter()
+        table = self.factors.current()
+        columns = self._encode_lifestyles(lifestyles, table)
+        return self._calculate_columns(
+            table, columns,
+            [item.primary_mode for item in lifestyles],
+            [item.renewable for item in lifestyles],
+            [item.diet for item in lifestyles],
+            started
+        )
+    
+    def uncertainty_lifestyles(self, lifestyles: List[Lifestyle], samples: Optional[int] = None,
+                               seed: Optional[int] = None) -> List[Dict]:
+        """
+        Monte Carlo p5/p50/p95 of the daily total and each category per request object.
+        
+        Emission factors are sampled around their point values with the
+        table's uncertainties; all records are evaluated against the same
+        `samples` draws in one vectorized pass, so equal seeds give equal
+        bands.
+        
+        Args:
+            lifestyles: Parsed lifestyles
+            samples: Monte Carlo samples (default UNCERTAINTY_SAMPLES or 1000)
+            seed: Seed of the factor draws (default UNCERTAINTY_SEED or 0)
+        
+        Returns:
+            One dict with samples, seed, daily and breakdown bands per lifestyle
+        """
+        if not lifestyles:
+            return []
+        table = self.factors.current()
+        columns = self._encode_lifestyles(lifestyles, table)
+        return self._describe_uncertainty(table, columns, samples, seed)
+    
+    def uncertainty_batch(self, records: List[Dict], samples: Optional[int] = None,
+                          seed: Optional[int] = None) -> List[Dict]:
+        """Dict-record counterpart of `uncertainty_lifestyles`."""
+        if not records:
+            return []
+        table = self.factors.current()
+        columns = self._encode_records(records, table)
+        return self._describe_uncertainty(table, columns, samples, seed)
+    
+    def _describe_uncertainty(self, table: EmissionFactorTable, columns: Dict[str, np.ndarray],
+                              samples: Optional[int], seed: Optional[int]) -> List[Dict]:
+        started = time.perf_counter()
+        samples = default_samples() if samples is None else samples
+        seed = default_seed() if seed is None else seed
+        results = self.uncertainty.describe(table, columns, samples, seed)
+        observe_stage('uncertainty', started)
+        return results
+    
+    def _calculate_columns(self, table: EmissionFactorTable, columns: Dict[str, np.ndarray],
+                           modes: List[str], renewables: List[bool], diets: List[str],
+                           started: float) -> List[Dict]:
+        """Breakdowns, totals and recommendations for encoded records."""
+        breakdown = self._breakdown_arrays(columns, table)
+        categories = list(breakdown)
+        
+        # (n_records, 4) matrix in the same category order as `calculate`
+        values = np.column_stack([breakdown[c] for c in categories])
+        daily = breakdown['transportation'] + breakdown['energy'] + breakdown['diet'] + breakdown['shopping']
+        started = observe_stage('calculate', started)
+        
+        recommendations = self._generate_batch_recommendations(self.rules.current(), values, modes, renewables, diets)
+        observe_stage('recommendations', started)
+        
+        daily_list = _round_array(daily, 2).tolist()
+        rounded_list = _round_array(values, 2).tolist()
+        return [
+            {
+                'daily': daily_list[i],
+                'breakdown': dict(zip(categories, rounded_list[i])),
+                'recommendations': recommendations[i]
+            }
+            for i in range(len(daily_list))
+        ]
+    
+    def _encode_lifestyles(self, lifestyles: List[Lifestyle], table: EmissionFactorTable) -> Dict[str, np.ndarray]:
+        """`_encode_records` for parsed request objects."""
+        transport_codes, default_transport = table.transport_codes, table.default_transport_code
+        diet_codes, default_diet = table.diet_codes, table.default_diet_code
+        
+        def column(values: List[Optional[float]]) -> np.ndarray:
+            return np.array([0 if v is None else v for v in values], dtype=np.float64)
+        
+        return {
+            'mode': np.array([transport_codes.get(item.primary_mode, default_transport) for item in lifestyles],
+                             dtype=np.intp),
+            'distance': np.array([item.distance for item in lifestyles], dtype=np.float64),
+            'electricity': np.array([item.electricity for item in lifestyles], dtype=np.float64),
+            'gas': np.array([item.gas for item in lifestyles], dtype=np.float64),
+            'renewable': np.array([item.renewable for item in lifestyles], dtype=bool),
+            'region': np.array([table.region_code(item.region) for item in lifestyles], dtype=np.intp),
+            'diet': np.array([diet_codes.get(item.diet, default_diet) for item in lifestyles], dtype=np.intp),
+            'clothes': column([item.clothes for item in lifestyles]),
+            'electronics': column([item.electronics for item in lifestyles])
+        }
+    
+    def _encode_records(self, records: List[Dict], table: EmissionFactorTable) -> Dict[str, np.ndarray]:
+        """Encode lifestyle records into columnar arrays with integer category codes."""
+        transport = [r['transportation'] for r in records]
+        energy = [r['energy'] for r in records]
+        shopping = [r['shopping'] for r in records]
+        
+        def column(dicts: List[Dict], key: str) -> np.ndarray:
+            return np.array([d.get(key, 0) for d in dicts], dtype=np.float64)
+        
+        transport_codes, default_transport = table.transport_codes, table.default_transport_code
+        diet_codes, default_diet = table.diet_codes, table.default_diet_code
+        return {
+            'mode': np.array([transport_codes.get(t.get('primaryMode', 'car'), default_transport)
+                              for t in transport], dtype=np.intp),
+            'distance': column(transport, 'distancePerDay'),
+            'electricity': column(energy, 'electricityUsage'),
+            'gas': column(energy, 'gasUsage'),
+            'renewable': np.array([bool(e.get('renewableEnergy', False)) for e in energy], dtype=bool),
+            'region': np.array([table.region_code(e.get('region')) for e in energy], dtype=np.intp),
+            'diet': np.array([diet_codes.get(r['diet'], default_diet) for r in records], dtype=np.intp),
+            'clothes': column(shopping, 'clothesPerMonth'),
+            'electronics': column(shopping, 'electronicsPerYear')
+        }
+    
+    def _breakdown_arrays(self, columns: Dict[str, np.ndarray],
+                          table: EmissionFactorTable) -> Dict[str, np.ndarray]:
+        """Unrounded per-category daily emissions for encoded records."""
+        renewable_factor = np.where(columns['renewable'], table.renewable_factor, 1.0)
+        return {
+            'transportation': columns['distance'] * table.transport_factor_array[columns['mode']],
+            'energy': (
+                columns['electricity'] * table.electricity_factor_array[columns['region']] * renewable_factor +
+                columns['gas'] * table.gas_factor
+            ),
+            'diet': table.diet_factor_array[columns['diet']],
+            'shopping': (
+                (columns['clothes'] * table.clothing_factor / 30) +
+                (columns['electronics'] * table.electronics_factor / 365)
+            )
+        }
+    
+    def _generate_recommendations(self, breakdown: Dict, rules: RuleBook, primary_mode: str,
+                                  renewable_energy: bool, diet: str) -> List[Dict]:
         """Generate personalized recommendations based on emissions."""
-        recommendations = []
+        profile = {
+            'primaryMode': primary_mode,
+            'renewableEnergy': renewable_energy,
+            'dietType': diet
+        }
         
-        # Sort categories by emissions (highest first)
+        # Rank categories by emissions (highest first)
         sorted_categories = sorted(breakdown.items(), key=lambda x: x[1], reverse=True)
+        for rank, (category, emissions) in enumerate(sorted_categories):
+            profile[category] = emissions
+            profile[f'{category}_rank'] = rank
+        
+        return rules['calculator'].evaluate_one(profile)
+    
+    def _generate_batch_recommendations(self, rules: RuleBook, values: np.ndarray, primary_modes: List[str],
+                                        renewable_energy: List[bool], diets: List[str]) -> List[List[Dict]]:
+        """
+        Generate recommendations for each row of unrounded category emissions.
+        
+        Categories are ranked like `_generate_recommendations` (ties keep
+        category order) and the rule set is evaluated for all rows at once.
+        """
+        order = np.argsort(-values, axis=1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(values.shape[1]), axis=1)
+        
+        columns = {
+            'primaryMode': primary_modes,
+            'renewableEnergy': renewable_energy,
+            'dietType': diets
+        }
+        for j, category in enumerate(CATEGORIES):
+            columns[category] = values[:, j]
+            columns[f'{category}_rank'] = ranks[:, j]
         
-        for category, emissions in sorted_categories[:3]:  # Top 3 categories
-            if category == 'transportation' and emissions > 2.0:
-                if transportation['primaryMode'] == 'car':
-                    recommendations.append({
-                        'category': 'transportation',
-                        'title': 'Switch to Public Transport',
-                        'description': f'Using public transport could save you {round(emissions * 0.5, 1)}kg CO₂ daily',
-                        'potentialSaving': round(emissions * 0.5, 2),
-                        'difficulty': 'medium'
-                    })
-                elif transportation['primaryMode'] == 'motorcycle':
-                    recommendations.append({
-                        'category': 'transportation',
-                        'title': 'Consider an Electric Vehicle',
-                        'description': f'An electric vehicle could reduce your transport emissions by {round(emissions * 0.6, 1)}kg CO₂',
-                        'potentialSaving': round(emissions * 0.6, 2),
-                        'difficulty': 'hard'
-                    })
-            
-            elif category == 'energy' and emissions > 3.0:
-                if not energy['renewableEnergy']:
-                    recommendations.append({
-                        'category': 'energy',
-                        'title': 'Switch to Renewable Energy',
-                        'description': f'Renewable energy could reduce your emissions by {round(emissions * 0.7, 1)}kg CO₂ daily',
-                        'potentialSaving': round(emissions * 0.7, 2),
-                        'difficulty': 'easy'
-                    })
-                recommendations.append({
-                    'category': 'energy',
-                    'title': 'Improve Energy Efficiency',
-                    'description': 'LED bulbs and better insulation could save 20% on energy emissions',
-                    'potentialSaving': round(emissions * 0.2, 2),
-                    'difficulty': 'easy'
-                })
-            
-            elif category == 'diet' and emissions > 5.0:
-                if diet in ['high_meat', 'omnivore']:
-                    recommendations.append({
-                        'category': 'diet',
-                        'title': 'Reduce Meat Consumption',
-                        'description': f'Eating plant-based 2-3 days per week could save {round(emissions * 0.3, 1)}kg CO₂ daily',
-                        'potentialSaving': round(emissions * 0.3, 2),
-                        'difficulty': 'medium'
-                    })
-            
-            elif category == 'shopping' and emissions > 2.0:
-                recommendations.append({
-                    'category': 'shopping',
-                    'title': 'Buy Second-Hand',
-                    'description': 'Choosing second-hand items can reduce shopping emissions by up to 80%',
-                    'potentialSaving': round(emissions * 0.8, 2),
-                    'difficulty': 'easy'
-                })
-        
-        return recommendations
+        return rules['calculator'].evaluate(columns)
     
     def predict_change_impact(self, lifestyle_change: Dict) -> Dict:
         """
@@ -193,16 +485,261 @@ class CarbonCalculator:
             'savings_percentage': round(savings_percentage, 1)
         }
     
+    def predict_change_sweep(self, baseline: Dict, scenarios: Optional[List[Dict]] = None,
+                             grid: Optional[Dict[str, List]] = None,
+                             limit: Optional[int] = None) -> Dict:
+        """
+        Predict the impact of many lifestyle changes against one baseline.
+        
+        The baseline is calculated once; all scenarios are evaluated in a single
+        vectorized pass and ranked by savings (highest first). Per-scenario
+        numbers match `predict_change_impact` for the same change.
+        
+        Args:
+            baseline: Current lifestyle (transportation, energy, diet, shopping)
+            scenarios: Partial lifestyles merged onto the baseline, e.g.
+                {"transportation": {"primaryMode": "bicycle"}, "diet": "vegan"}
+            grid: Parameter name -> candidate values; every combination is a
+                scenario, e.g. {"distancePerDay": [5, 10], "diet": ["vegan"]}
+            limit: Return only the top N scenarios
+        
+        Returns:
+            Dict with the baseline emissions and ranked scenarios
+        """
+        current = self.calculate(
+            baseline['transportation'], baseline['energy'], baseline['diet'], baseline['shopping']
+        )['daily']
+        
+        table = self.factors.current()
+        changes = []
+        column_parts = []
+        
+        if scenarios:
+            records = [self._merge_lifestyle(baseline, change) for change in scenarios]
+            column_parts.append(self._encode_records(records, table))
+            changes.extend(scenarios)
+        
+        if grid:
+            grid_columns, grid_changes = self._encode_grid(baseline, grid, table)
+            column_parts.append(grid_columns)
+            changes.extend(grid_changes)
+        
+        if len(changes) > MAX_SWEEP_SCENARIOS:
+            raise ValueError(f"Sweep has {len(changes)} scenarios, maximum is {MAX_SWEEP_SCENARIOS}")
+        if not changes:
+            return {'current': current, 'scenarios': []}
+        
+        columns = {
+            name: np.concatenate([part[name] for part in column_parts])
+            for name in column_parts[0]
+        }
+        breakdown = self._breakdown_arrays(columns, table)
+        daily = breakdown['transportation'] + breakdown['energy'] + breakdown['diet'] + breakdown['shopping']
+        
+        # Same arithmetic as predict_change_impact: savings from rounded dailies
+        predicted = _round_array(daily, 2)
+        savings = current - predicted
+        if current > 0:
+            savings_percentage = _round_array(savings / current * 100, 1)
+        else:
+            savings_percentage = np.zeros_like(savings)
+        savings = _round_array(savings, 2)
+        
+        order = np.argsort(-savings, kind='stable')
+        if limit is not None:
+            order = order[:max(limit, 0)]
+        
+        categories = list(breakdown)
+        rounded = _round_array(np.column_stack([breakdown[c] for c in categories])[order], 2).tolist()
+        predicted_list = predicted[order].tolist()
+        savings_list = savings[order].tolist()
+        percentage_list = savings_percentage[order].tolist()
+        
+        ranked = []
+        for rank, idx in enumerate(order.tolist()):
+            ranked.append({
+                'rank': rank + 1,
+                'changes': changes[idx],
+                'predicted': predicted_list[rank],
+                'savings': savings_list[rank],
+                'savings_percentage': percentage_list[rank],
+                'breakdown': dict(zip(categories, rounded[rank]))
+            })
+        
+        return {'current': current, 'scenarios': ranked}
+    
+    def plan_savings(self, baseline: Dict, max_effort: float = DEFAULT_MAX_EFFORT,
+                     levers: Optional[List[str]] = None, limit: Optional[int] = None) -> Dict:
+        """
+        Pareto-optimal plans of combined lifestyle changes by savings versus effort.
+        
+        Every combination of each category's lever options is evaluated in one
+        vectorized pass; categories add up independently, so only each
+        category's Pareto front is combined with the others (see
+        `savings_plan.combine_fronts`). Per-plan numbers match
+        `predict_change_impact` for the same change.
+        
+        Args:
+            baseline: Current lifestyle (transportation, energy, diet, shopping)
+            max_effort: Effort budget of a plan
+            levers: Lifestyle fields that may change (default: all of `LEVERS`)
+            limit: Return at most N plans, spread evenly along the front
+        
+        Returns:
+            Dict with the baseline emissions and plans, lowest effort first
+        
+        Raises:
+            ValueError: On unknown levers, a negative effort budget or a limit below 1
+        """
+        if levers is None:
+            levers = list(LEVERS)
+        unknown = [lever for lever in levers if lever not in LEVERS]
+        if unknown:
+            raise ValueError(f"Unknown levers: {unknown}")
+        if max_effort < 0:
+            raise ValueError("maxEffort must not be negative")
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+        
+        current = self.calculate(
+            baseline['transportation'], baseline['energy'], baseline['diet'], baseline['shopping']
+        )['daily']
+        
+        table = self.factors.current()
+        options = {lever: lever_options(lever, baseline) for lever in LEVERS if lever in levers}
+        candidates = [category_candidates(category, baseline, options) for category in CATEGORIES]
+        
+        # Baseline columns repeated once per candidate of every category, then
+        # overwritten with each candidate's lever values
+        sizes = [len(values) for values, _ in candidates]
+        base = self._encode_records([baseline], table)
+        columns = {name: np.repeat(values, sum(sizes)) for name, values in base.items()}
+        offsets = np.cumsum([0] + sizes)
+        for (values, _), start in zip(candidates, offsets):
+            for lever in values[0]:
+                encoded = self._encode_parameter(lever, [setting[lever] for setting in values], table)
+                columns[SWEEP_PARAMETERS[lever][1]][start:start + len(values)] = encoded
+        breakdown = self._breakdown_arrays(columns, table)
+        
+        fronts = [
+            (efforts, breakdown[category][offsets[i]:offsets[i + 1]])
+            for i, (category, (_, efforts)) in enumerate(zip(CATEGORIES, candidates))
+        ]
+        effort, daily, choices = combine_fronts(fronts, max_effort)
+        
+        # Same arithmetic as predict_change_impact: savings from rounded dailies
+        predicted = _round_array(daily, 2)
+        savings = current - predicted
+        if current > 0:
+            savings_percentage = _round_array(savings / current * 100, 1)
+        else:
+            savings_percentage = np.zeros_like(savings)
+        savings = _round_array(savings, 2)
+        
+        improving = np.flatnonzero(savings > 0)
+        order = improving[spread(len(improving), limit)]
+        
+        per_category = np.column_stack([
+            breakdown[category][offsets[i] + choices[order, i]] for i, category in enumerate(CATEGORIES)
+        ])
+        rounded = _round_array(per_category, 2).tolist()
+        effort_list = _round_array(effort[order], 2).tolist()
+        predicted_list = predicted[order].tolist()
+        savings_list = savings[order].tolist()
+        percentage_list = savings_percentage[order].tolist()
+        efforts = {lever: dict((value, cost) for value, cost in pairs) for lever, pairs in options.items()}
+        
+        plans = []
+        for rank, idx in enumerate(order.tolist()):
+            changes = {}
+            actions = []
+            for i in range(len(CATEGORIES)):
+                for lever, value in candidates[i][0][choices[idx, i]].items():
+                    cost = efforts[lever][value]
+                    if cost == 0:
+                        continue
+                    section = LEVERS[lever][0]
+                    if section is None:
+                        changes[lever] = value
+                    else:
+                        changes.setdefault(section, {})[lever] = value
+                    actions.append({'lever': lever, 'from': options[lever][0][0], 'to': value, 'effort': cost})
+            plans.append({
+                'effort': effort_list[rank],
+                'changes': changes,
+                'actions': actions,
+                'predicted': predicted_list[rank],
+                'savings': savings_list[rank],
+                'savings_percentage': percentage_list[rank],
+                'breakdown': dict(zip(CATEGORIES, rounded[rank]))
+            })
+        
+        return {'current': current, 'plans': plans}
+    
+    def _merge_lifestyle(self, baseline: Dict, change: Dict) -> Dict:
+        """Apply a partial lifestyle change on top of a baseline lifestyle."""
+        merged = {}
+        for section in ('transportation', 'energy', 'shopping'):
+            merged[section] = {**baseline[section], **change.get(section, {})}
+        merged['diet'] = change.get('diet', baseline['diet'])
+        return merged
+    
+    def _encode_grid(self, baseline: Dict, grid: Dict[str, List],
+                     table: EmissionFactorTable) -> Tuple[Dict[str, np.ndarray], List[Dict]]:
+        """Encode the cartesian product of grid values as columns over the baseline."""
+        unknown = [name for name in grid if name not in SWEEP_PARAMETERS]
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {unknown}")
+        
+        names = [name for name in grid if len(grid[name]) > 0]
+        sizes = [len(grid[name]) for name in names]
+        total = int(np.prod(sizes)) if names else 0
+        if total > MAX_SWEEP_SCENARIOS:
+            raise ValueError(f"Sweep grid has {total} scenarios, maximum is {MAX_SWEEP_SCENARIOS}")
+        if total == 0:
+            return self._encode_records([], table), []
+        
+        # Baseline columns repeated once per scenario, then overwritten per parameter
+        base = self._encode_records([baseline], table)
+        columns = {name: np.repeat(values, total) for name, values in base.items()}
+        indices = np.indices(sizes).reshape(len(names), total)
+        
+        for axis, name in enumerate(names):
+            encoded = self._encode_parameter(name, grid[name], table)
+            columns[SWEEP_PARAMETERS[name][1]] = encoded[indices[axis]]
+        
+        changes = []
+        for combo in product(*(grid[name] for name in names)):
+            change = {}
+            for name, value in zip(names, combo):
+                section = SWEEP_PARAMETERS[name][0]
+                if section is None:
+                    change[name] = value
+                else:
+                    change.setdefault(section, {})[name] = value
+            changes.append(change)
+        
+        return columns, changes
+    
+    def _encode_parameter(self, name: str, values: List, table: EmissionFactorTable) -> np.ndarray:
+        """Encode candidate values for one sweep parameter like `_encode_records` does."""
+        if name == 'primaryMode':
+            return np.array([table.transport_codes.get(v, table.default_transport_code) for v in values], dtype=np.intp)
+        if name == 'diet':
+            return np.array([table.diet_codes.get(v, table.default_diet_code) for v in values], dtype=np.intp)
+        if name == 'region':
+            return np.array([table.region_code(v) for v in values], dtype=np.intp)
+        if name == 'renewableEnergy':
+            return np.array([bool(v) for v in values], dtype=bool)
+        return np.array(values, dtype=np.float64)
+    
     def calculate_annual_emissions(self, daily_emissions: float) -> Dict:
         """Calculate annual projections."""
         annual = daily_emissions * 365
         
-        # Context: Average person's annual emissions ~4 tons CO2
-        global_average = 4000  # kg
-        
         return {
             'annual_kg': round(annual, 2),
             'annual_tons': round(annual / 1000, 2),
-            'comparison_to_average': round((annual / global_average - 1) * 100, 1),
-            'trees_needed': round(annual / 21, 0)  # A tree absorbs ~21kg CO2/year
+            'comparison_to_average': round((annual / GLOBAL_AVERAGE_ANNUAL_KG - 1) * 100, 1),
+            'trees_needed': round(annual / TREE_ANNUAL_KG, 0)
         }
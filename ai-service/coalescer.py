@@ -0,0 +1,115 @@
+"""
+Request Coalescer
+Single-flight and micro-window batching for concurrent /calculate requests.
+"""
+
+import asyncio
+import contextvars
+import os
+from typing import Dict, List, Optional, Tuple
+
+from admission import detach_deadline
+from carbon_calculator import CarbonCalculator
+from cpu_pool import run_cpu
+from request_objects import Lifestyle
+
+DEFAULT_WINDOW_MS = 2.0
+DEFAULT_MAX_BATCH = 64
+
+
+class CalculationCoalescer:
+    """
+    Coalesces concurrent calculations within one worker's event loop.
+    
+    Requests whose canonical key (the calculator cache key) matches an
+    in-flight computation wait on it instead of computing again. Other
+    requests are queued, and the queue is calculated in one vectorized pass
+    on the CPU pool `window` seconds after its first request arrived, or as
+    soon as it holds `max_batch` requests. No request waits longer than
+    `window` before its calculation starts. With a window of 0 every request
+    is calculated at once and only identical concurrent requests are shared.
+    """
+    
+    def __init__(self, calculator: CarbonCalculator, window: Optional[float] = None,
+                 max_batch: Optional[int] = None):
+        if window is None:
+            window = float(os.getenv('CALC_COALESCE_WINDOW_MS', DEFAULT_WINDOW_MS)) / 1000
+        if max_batch is None:
+            max_batch = int(os.getenv('CALC_COALESCE_MAX_BATCH', DEFAULT_MAX_BATCH))
+        self.calculator = calculator
+        self.window = max(0.0, window)
+        self.max_batch = max(1, max_batch)
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._pending: List[Tuple[tuple, Lifestyle, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._requests = 0
+        self._cache_hits = 0
+        self._coalesced = 0
+        self._batches = 0
+        self._largest_batch = 0
+    
+    async def calculate(self, lifestyle: Lifestyle) -> Dict:
+        """Result of `calculator.calculate_lifestyle`, shared with identical concurrent requests."""
+        self._requests += 1
+        key = self.calculator.lifestyle_key(lifestyle)
+        result = self.calculator.cached_result(key)
+        if result is not None:
+            self._cache_hits += 1
+            return result
+        future = self._inflight.get(key)
+        if future is not None:
+            self._coalesced += 1
+            return await asyncio.shield(future)
+        
+        loop = asyncio.get_running_loop()
+        future = self._inflight[key] = loop.create_future()
+        self._pending.append((key, lifestyle, future))
+        if len(self._pending) >= self.max_batch or self.window == 0:
+            self._flush()
+        elif self._timer is None:
+            # Stage metrics of the batch are labelled with the first request's route
+            self._timer = loop.call_later(self.window, self._flush, context=contextvars.copy_context())
+        return await asyncio.shield(future)
+    
+    def stats(self) -> Dict:
+        return {
+            'windowMs': self.window * 1000,
+            'maxBatch': self.max_batch,
+            'requests': self._requests,
+            'cacheHits': self._cache_hits,
+            'coalesced': self._coalesced,
+            'batches': self._batches,
+            'largestBatch': self._largest_batch,
+            'inFlight': len(self._inflight)
+        }
+    
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._batches += 1
+            self._largest_batch = max(self._largest_batch, len(batch))
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[Tuple[tuple, Lifestyle, asyncio.Future]]) -> None:
+        # The batch serves every request in it, not only the first one's deadline
+        detach_deadline()
+        try:
+            results = await run_cpu(self.calculator.calculate_and_cache, [key for key, _, _ in batch],
+                                    [item for _, item, _ in batch])
+        except Exception as e:
+            for key, _, future in batch:
+                self._inflight.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (key, _, future), result in zip(batch, results):
+            self._inflight.pop(key, None)
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,80 @@
+"""
+CPU Pool
+Runs CPU-bound calculator and insights work off the event loop, in priority order.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from admission import AdmissionController
+
+T = TypeVar('T')
+
+DEFAULT_POOL_SIZE = min(4, os.cpu_count() or 1)
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_owner_pid: Optional[int] = None
+_admission: Optional[AdmissionController] = None
+
+
+def pool_size() -> int:
+    return max(1, int(os.getenv("CPU_POOL_SIZE", DEFAULT_POOL_SIZE)))
+
+
+def executor() -> ThreadPoolExecutor:
+    """
+    Return this process's CPU pool, creating it on first use.
+    
+    Threads do not survive fork, so a pool inherited from a parent process
+    is discarded and a fresh one is started in the worker.
+    """
+    global _executor, _owner_pid
+    pid = os.getpid()
+    if _executor is None or _owner_pid != pid:
+        with _lock:
+            if _executor is None or _owner_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=pool_size(), thread_name_prefix='cpu')
+                _owner_pid = pid
+    return _executor
+
+
+def admission() -> AdmissionController:
+    """This process's admission controller, with one CPU slot per pool thread."""
+    global _admission
+    if _admission is None:
+        with _lock:
+            if _admission is None:
+                _admission = AdmissionController(pool_size())
+    return _admission
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run `func(*args, **kwargs)` in the CPU pool and await its result.
+    
+    The event loop keeps accepting and answering requests while the work
+    runs; numpy releases the GIL for most of the heavy array operations.
+    The caller's context variables (such as the request timing used for
+    stage metrics) are visible to `func`.
+    
+    Calls wait for a free pool thread in the admission controller, which
+    starts interactive work before batch work and drops requests that can
+    no longer meet their deadline (raising `admission.Overloaded`).
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    controller = admission()
+    priority = await controller.acquire()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(executor(), functools.partial(context.run, func, *args, **kwargs))
+    finally:
+        controller.release(priority, time.perf_counter() - started)
+
@@ -0,0 +1,550 @@
+"""
+EcoStep AI Service Client
+Pooled, retrying and auto-batching client for calling the AI service from batch jobs.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth retrying: throttled, or the service restarting/overloaded
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+LIFESTYLE_SECTIONS = ('transportation', 'energy', 'shopping')
+
+
+class ServiceError(Exception):
+    """An AI service call failed with an error status (after any retries)."""
+    
+    def __init__(self, status: int, detail, method: str = '', path: str = ''):
+        self.status = status
+        self.detail = detail
+        super().__init__(f"{method} {path} returned {status}: {detail}")
+
+
+class HTTPTransport:
+    """
+    Blocking HTTP/1.1 transport over a pool of keep-alive connections.
+    
+    Up to `pool_size` connections to the service are kept open and reused,
+    so concurrent calls never wait on a TCP (or TLS) handshake.
+    """
+    
+    def __init__(self, base_url: str, pool_size: int = 10, timeout: float = 30.0,
+                 headers: Optional[Dict[str, str]] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json', 'Connection': 'keep-alive'})
+        self.session.headers.update(headers or {})
+    
+    def send(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, Dict[str, str], bytes]:
+        response = self.session.request(method, self.base_url + path, data=body, timeout=self.timeout)
+        return response.status_code, dict(response.headers), response.content
+    
+    def close(self) -> None:
+        self.session.close()
+
+
+class ASGITransport:
+    """Calls an ASGI app (e.g. the service's FastAPI app) in-process, without a socket."""
+    
+    def __init__(self, app, headers: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in (headers or {}).items()]
+    
+    async def send(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, Dict[str, str], bytes]:
+        body = body or b''
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': query.encode(),
+            'headers': [
+                (b'host', b'in-process'),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                *self.headers
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('in-process', 80)
+        }
+        done = asyncio.Event()
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status = 0
+        headers = {}
+        chunks = []
+        
+        async def receive():
+            if pending:
+                return pending.pop()
+            await done.wait()
+            return {'type': 'http.disconnect'}
+        
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers.update((k.decode('latin-1'), v.decode('latin-1')) for k, v in message.get('headers', ()))
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    done.set()
+        
+        await self.app(scope, receive, send)
+        done.set()
+        return status, headers, b''.join(chunks)
+    
+    def close(self) -> None:
+        pass
+
+
+class _Batcher:
+    """
+    Collects calls for up to `window` seconds (or `max_batch` calls) per key
+    and hands them to `flush` as one list; each caller gets its own result
+    (or its own exception, if `flush` returns one in its place).
+    """
+    
+    def __init__(self, flush: Callable[[object, List], Awaitable[List]], max_batch: int, window: float):
+        self.flush = flush
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: Dict[object, List[Tuple[object, asyncio.Future]]] = {}
+    
+    def submit(self, key, item) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future))
+        if len(batch) >= self.max_batch:
+            self._dispatch(key)
+        elif len(batch) == 1:
+            loop.call_later(self.window, self._dispatch, key, batch)
+        return future
+    
+    def _dispatch(self, key, batch: Optional[List] = None) -> None:
+        # A timer for a batch that already went out (because it filled up) does nothing
+        if batch is not None and self._pending.get(key) is not batch:
+            return
+        batch = self._pending.pop(key)
+        asyncio.ensure_future(self._run(key, batch))
+    
+    async def _run(self, key, batch: List[Tuple[object, asyncio.Future]]) -> None:
+        try:
+            results = await self.flush(key, [item for item, _ in batch])
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class AsyncServiceClient:
+    """
+    Asynchronous AI service client.
+    
+    Talks to a running service over pooled keep-alive connections
+    (`base_url`), or to the FastAPI app in the same process (`app`).
+    Concurrent `calculate` calls are sent as `/calculate/batch` requests and
+    concurrent `predict_impact` calls with the same current lifestyle as one
+    `/predict-impact/sweep`; results are the same as the single-call
+    endpoints'. Other calls run concurrently over the pool. Throttled,
+    unavailable or unreachable calls are retried with exponential backoff
+    and jitter (honoring `Retry-After`), except activity ingestion, the
+    one call that is not idempotent. Calls ask the service's admission
+    control for batch priority, so they yield to dashboard traffic.
+    
+    Example:
+        async with AsyncServiceClient('http://localhost:8000') as client:
+            results = await asyncio.gather(*(client.calculate(p) for p in profiles))
+    """
+    
+    def __init__(self, base_url: Optional[str] = None, app=None, pool_size: int = 10,
+                 timeout: float = 30.0, retries: int = 3, backoff: float = 0.1, max_backoff: float = 5.0,
+                 batch_size: int = 64, batch_window: float = 0.005, priority: Optional[str] = 'batch'):
+        """
+        Args:
+            base_url: Service URL, e.g. "http://ai-service:8000"
+            app: ASGI app to call in-process instead (e.g. `main.app`)
+            pool_size: Keep-alive connections (and concurrent requests) to the service
+            timeout: Per-request timeout in seconds (HTTP only)
+            retries: Retries per call after the first attempt
+            backoff: First retry delay in seconds, doubled per retry
+            max_backoff: Longest retry delay in seconds
+            batch_size: Most calls sent in one batch request (1 disables batching)
+            batch_window: Seconds a call waits for others to batch with
+            priority: `X-Priority` class ("batch" or "interactive"; None leaves it to the route)
+        """
+        if (base_url is None) == (app is None):
+            raise ValueError("Pass exactly one of base_url or app")
+        headers = {'X-Priority': priority} if priority else None
+        if app is not None:
+            self.transport = ASGITransport(app, headers=headers)
+            self._executor = None
+        else:
+            self.transport = HTTPTransport(base_url, pool_size=pool_size, timeout=timeout, headers=headers)
+            self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='ai-client')
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size
+        self._calculations = _Batcher(self._flush_calculations, batch_size, batch_window)
+        self._predictions = _Batcher(self._flush_predictions, batch_size, batch_window)
+    
+    async def __aenter__(self) -> 'AsyncServiceClient':
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+    
+    async def close(self) -> None:
+        self.transport.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+    
+    async def _send(self, method: str, path: str, body: Optional[bytes]) -> Tuple[int, Dict[str, str], bytes]:
+        if self._executor is None:
+            return await self.transport.send(method, path, body)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.transport.send, method, path, body)
+    
+    def _delay(self, attempt: int, headers: Optional[Dict[str, str]] = None) -> float:
+        retry_after = (headers or {}).get('retry-after') or (headers or {}).get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying clients from hitting the service in lockstep
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+    
+    async def request(self, method: str, path: str, payload=None, retry: bool = True, raw: bool = False):
+        """
+        Send one request, retrying throttled, unavailable and failed connections.
+        
+        Args:
+            method: HTTP method
+            path: Path with any query string, e.g. "/population/percentiles?category=total"
+            payload: JSON-serializable body
+            retry: Retry failures (only safe for idempotent requests)
+            raw: Return the response body undecoded
+        
+        Returns:
+            Decoded JSON response (bytes if `raw`)
+        
+        Raises:
+            ServiceError: If the service returns an error status (after retries)
+            requests.ConnectionError: If the service stays unreachable
+        """
+        body = orjson.dumps(payload) if payload is not None else None
+        retries = self.retries if retry else 0
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            try:
+                status, headers, content = await self._send(method, path, body)
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+                continue
+            if status < 400:
+                return content if raw else orjson.loads(content)
+            if status not in RETRY_STATUSES or last:
+                try:
+                    detail = orjson.loads(content).get('detail', content)
+                except (orjson.JSONDecodeError, AttributeError):
+                    detail = content.decode('utf-8', 'replace')
+                raise ServiceError(status, detail, method, path)
+            await asyncio.sleep(self._delay(attempt, headers))
+    
+    async def calculate(self, lifestyle: Dict) -> Dict:
+        """`/calculate` for one lifestyle, batched with concurrent calls."""
+        if self.batch_size <= 1:
+            return await self.request('POST', '/calculate', lifestyle)
+        return await self._calculations.submit(None, lifestyle)
+    
+    async def calculate_many(self, lifestyles: Sequence[Dict]) -> List[Dict]:
+        """`/calculate` results for many lifestyles, sent as concurrent `batch_size` chunks."""
+        size = max(self.batch_size, 1)
+        chunks = await asyncio.gather(*(
+            self._flush_calculations(None, lifestyles[start:start + size])
+            for start in range(0, len(lifestyles), size)
+        ))
+        return [result for chunk in chunks for result in chunk]
+    
+    async def _flush_calculations(self, _, lifestyles: Sequence[Dict]) -> List:
+        try:
+            response = await self.request('POST', '/calculate/batch', {'records': list(lifestyles)})
+        except ServiceError as e:
+            if e.status in RETRY_STATUSES or len(lifestyles) == 1:
+                raise
+            # One invalid record rejects the whole batch: send each on its own so only it fails
+            return await self._each('/calculate', lifestyles)
+        return [{'success': True, **result} for result in response['results']]
+    
+    async def _each(self, path: str, payloads: Sequence[Dict]) -> List:
+        return await asyncio.gather(*(self.request('POST', path, p) for p in payloads), return_exceptions=True)
+    
+    async def insights(self, request: Dict) -> Dict:
+        """`/insights` for one user."""
+        return await self.request('POST', '/insights', request)
+    
+    async def insights_many(self, requests_: Sequence[Dict]) -> List[Dict]:
+        """`/insights` for many users, sent concurrently over the connection pool."""
+        return list(await asyncio.gather(*(self.insights(request) for request in requests_)))
+    
+    async def insights_batch(self, user_ids: Sequence[str], dates: Sequence[str], totals: Sequence[float],
+                             carbon_saved: Optional[Sequence[float]] = None,
+                             challenges_completed: Optional[Sequence[int]] = None,
+                             locale: Optional[str] = None) -> Dict:
+        """`/insights/batch` (weekly digest) for columnar progress days."""
+        payload = {'userIds': list(user_ids), 'dates': list(dates), 'totals': list(totals)}
+        if carbon_saved is not None:
+            payload['carbonSaved'] = list(carbon_saved)
+        if challenges_completed is not None:
+            payload['challengesCompleted'] = list(challenges_completed)
+        if locale is not None:
+            payload['locale'] = locale
+        return await self.request('POST', '/insights/batch', payload)
+    
+    async def ingest_activities(self, user_ids: Sequence[str], types: Sequence[str],
+                                carbon_impacts: Sequence[float], timestamps: Sequence[str]) -> Dict:
+        """
+        `/activities` for columnar activity events. Not retried: a retried
+        ingest that had reached the service would count its events twice.
+        """
+        payload = {'userIds': list(user_ids), 'types': list(types), 'carbonImpacts': list(carbon_impacts),
+                   'timestamps': list(timestamps)}
+        return await self.request('POST', '/activities', payload, retry=False)
+    
+    async def predict_impact(self, change: Dict) -> Dict:
+        """
+        `/predict-impact` for a {"current": ..., "proposed": ...} change.
+        
+        Concurrent calls with the same current lifestyle become one sweep,
+        as long as each proposed lifestyle sets every field the current one
+        does (the sweep fills missing fields from the current lifestyle,
+        `/predict-impact` from defaults).
+        """
+        current, proposed = change.get('current'), change.get('proposed')
+        if self.batch_size <= 1 or not _sweepable(current, proposed):
+            return await self.request('POST', '/predict-impact', change)
+        return await self._predictions.submit(orjson.dumps(current, option=orjson.OPT_SORT_KEYS), proposed)
+    
+    async def predict_impact_many(self, changes: Sequence[Dict]) -> List[Dict]:
+        """`/predict-impact` for many changes, batched per current lifestyle."""
+        return list(await asyncio.gather(*(self.predict_impact(change) for change in changes)))
+    
+    async def submit_calculate_job(self, lifestyles: Sequence[Dict], chunk_size: Optional[int] = None) -> Dict:
+        """
+        Queue `/calculate` for many lifestyles as a background job (`/jobs/calculate`).
+        Not retried: a retried submission that had reached the service would queue the job twice.
+        """
+        path = '/jobs/calculate' if chunk_size is None else f'/jobs/calculate?chunk_size={chunk_size}'
+        return await self.request('POST', path, {'records': list(lifestyles)}, retry=False)
+    
+    async def submit_insights_job(self, user_ids: Sequence[str], dates: Sequence[str], totals: Sequence[float],
+                                  carbon_saved: Optional[Sequence[float]] = None,
+                                  challenges_completed: Optional[Sequence[int]] = None,
+                                  locale: Optional[str] = None, chunk_size: Optional[int] = None) -> Dict:
+        """Queue an `/insights/batch` as a background job (`/jobs/insights`); not retried."""
+        payload = {'userIds': list(user_ids), 'dates': list(dates), 'totals': list(totals)}
+        if carbon_saved is not None:
+            payload['carbonSaved'] = list(carbon_saved)
+        if challenges_completed is not None:
+            payload['challengesCompleted'] = list(challenges_completed)
+        if locale is not None:
+            payload['locale'] = locale
+        path = '/jobs/insights' if chunk_size is None else f'/jobs/insights?chunk_size={chunk_size}'
+        return await self.request('POST', path, payload, retry=False)
+    
+    async def job(self, job_id: str) -> Dict:
+        """Status and progress of a job."""
+        return await self.request('GET', f'/jobs/{job_id}')
+    
+    async def wait_for_job(self, job_id: str, poll_interval: float = 1.0, timeout: Optional[float] = None) -> Dict:
+        """
+        Poll a job until it is no longer queued or running.
+        
+        Raises:
+            TimeoutError: If the job is still active after `timeout` seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = await self.job(job_id)
+            if job['status'] not in ('queued', 'running'):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} is still {job['status']} after {timeout} seconds")
+            await asyncio.sleep(poll_interval)
+    
+    async def job_results(self, job_id: str) -> List[Dict]:
+        """Results of a job's finished chunks, in order (all of them once the job completed)."""
+        content = await self.request('GET', f'/jobs/{job_id}/results?follow=false', raw=True)
+        return [orjson.loads(line) for line in content.splitlines() if line]
+    
+    async def cancel_job(self, job_id: str) -> Dict:
+        return await self.request('DELETE', f'/jobs/{job_id}')
+    
+    async def savings_plans(self, baseline: Dict, max_effort: Optional[float] = None,
+                            levers: Optional[Sequence[str]] = None, limit: Optional[int] = None) -> Dict:
+        """`/savings-plans` for one baseline lifestyle."""
+        payload = {'baseline': baseline}
+        if max_effort is not None:
+            payload['maxEffort'] = max_effort
+        if levers is not None:
+            payload['levers'] = list(levers)
+        if limit is not None:
+            payload['limit'] = limit
+        return await self.request('POST', '/savings-plans', payload)
+    
+    async def _flush_predictions(self, current: bytes, proposed: Sequence[Dict]) -> List:
+        baseline = orjson.loads(current)
+        try:
+            sweep = await self.request('POST', '/predict-impact/sweep', {
+                'baseline': baseline,
+                'scenarios': list(proposed)
+            })
+        except ServiceError as e:
+            if e.status in RETRY_STATUSES:
+                raise
+            # The sweep validates the baseline and rejects bad scenarios together; fall back per change
+            return await self._each('/predict-impact', [{'current': baseline, 'proposed': p} for p in proposed])
+        # Scenarios come back ranked; identical changes have identical results
+        by_change = {
+            orjson.dumps(s['changes'], option=orjson.OPT_SORT_KEYS): s for s in sweep['scenarios']
+        }
+        results = []
+        for change in proposed:
+            scenario = by_change[orjson.dumps(change, option=orjson.OPT_SORT_KEYS)]
+            results.append({
+                'success': True,
+                'currentEmissions': sweep['currentEmissions'],
+                'predictedEmissions': scenario['predictedEmissions'],
+                'savings': scenario['savings'],
+                'savingsPercentage': scenario['savingsPercentage']
+            })
+        return results
+
+
+def _sweepable(current: Optional[Dict], proposed: Optional[Dict]) -> bool:
+    """Whether a sweep scenario of `proposed` over `current` is exactly `proposed`."""
+    if not isinstance(current, dict) or not isinstance(proposed, dict):
+        return False
+    try:
+        return 'diet' in proposed and all(set(current[s]) <= set(proposed[s]) for s in LIFESTYLE_SECTIONS)
+    except (KeyError, TypeError):
+        return False
+
+
+class ServiceClient:
+    """
+    Blocking AI service client for batch jobs and scripts.
+    
+    Wraps an `AsyncServiceClient` running on a private event loop thread,
+    so calls from many threads share its connection pool and are batched
+    together. Takes the same arguments.
+    
+    Example:
+        with ServiceClient('http://localhost:8000') as client:
+            footprints = client.calculate_many(profiles)
+    """
+    
+    def __init__(self, base_url: Optional[str] = None, app=None, **options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='ai-client-loop', daemon=True)
+        self._thread.start()
+        self.client = self._call(self._create(base_url, app, options))
+    
+    @staticmethod
+    async def _create(base_url, app, options) -> AsyncServiceClient:
+        return AsyncServiceClient(base_url, app=app, **options)
+    
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+    
+    def __enter__(self) -> 'ServiceClient':
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self._call(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+    
+    def request(self, method: str, path: str, payload=None, retry: bool = True, raw: bool = False):
+        return self._call(self.client.request(method, path, payload, retry, raw))
+    
+    def calculate(self, lifestyle: Dict) -> Dict:
+        return self._call(self.client.calculate(lifestyle))
+    
+    def calculate_many(self, lifestyles: Sequence[Dict]) -> List[Dict]:
+        return self._call(self.client.calculate_many(lifestyles))
+    
+    def insights(self, request: Dict) -> Dict:
+        return self._call(self.client.insights(request))
+    
+    def insights_many(self, requests_: Sequence[Dict]) -> List[Dict]:
+        return self._call(self.client.insights_many(requests_))
+    
+    def insights_batch(self, *args, **kwargs) -> Dict:
+        return self._call(self.client.insights_batch(*args, **kwargs))
+    
+    def ingest_activities(self, *args, **kwargs) -> Dict:
+        return self._call(self.client.ingest_activities(*args, **kwargs))
+    
+    def predict_impact(self, change: Dict) -> Dict:
+        return self._call(self.client.predict_impact(change))
+    
+    def predict_impact_many(self, changes: Sequence[Dict]) -> List[Dict]:
+        return self._call(self.client.predict_impact_many(changes))
+    
+    def savings_plans(self, *args, **kwargs) -> Dict:
+        return self._call(self.client.savings_plans(*args, **kwargs))
+    
+    def submit_calculate_job(self, *args, **kwargs) -> Dict:
+        return self._call(self.client.submit_calculate_job(*args, **kwargs))
+    
+    def submit_insights_job(self, *args, **kwargs) -> Dict:
+        return self._call(self.client.submit_insights_job(*args, **kwargs))
+    
+    def job(self, job_id: str) -> Dict:
+        return self._call(self.client.job(job_id))
+    
+    def wait_for_job(self, *args, **kwargs) -> Dict:
+        return self._call(self.client.wait_for_job(*args, **kwargs))
+    
+    def job_results(self, job_id: str) -> List[Dict]:
+        return self._call(self.client.job_results(job_id))
+    
+    def cancel_job(self, job_id: str) -> Dict:
+        return self._call(self.client.cancel_job(job_id))
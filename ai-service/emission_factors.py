@@ -0,0 +1,196 @@
+"""
+Emission Factor Table
+Versioned, immutable emission factors loaded from a local JSON file.
+"""
+
+import json
+import math
+import os
+import numpy as np
+from typing import Dict, Optional, Sequence, Union
+
+from reloadable import ReloadableFile
+
+
+DEFAULT_FACTORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'emission_factors.json')
+
+
+def _frozen_array(values) -> np.ndarray:
+    array = np.array(values, dtype=np.float64)
+    array.setflags(write=False)
+    return array
+
+
+def _lognormal_sigmas(spec: Union[None, float, Dict[str, float]], keys: Sequence[str], name: str) -> np.ndarray:
+    """
+    Lognormal shape parameters for relative standard deviations (coefficients of variation).
+    
+    `spec` is one coefficient for every key, or a key -> coefficient map with
+    an optional "default"; missing keys have no uncertainty.
+    """
+    if not isinstance(spec, dict):
+        spec = {'default': spec or 0.0}
+    unknown = set(spec) - set(keys) - {'default'}
+    if unknown:
+        raise ValueError(f"Uncertainty for unknown {name}: {sorted(unknown)}")
+    coefficients = [float(spec.get(key, spec.get('default', 0.0))) for key in keys]
+    if any(c < 0 for c in coefficients):
+        raise ValueError(f"Uncertainty of {name} must not be negative")
+    return _frozen_array([math.sqrt(math.log1p(c * c)) for c in coefficients])
+
+
+class EmissionFactorTable:
+    """
+    One version of the emission factors, indexed by category, region and year.
+    
+    Categorical factors are stored twice: as tuples of Python floats for the
+    scalar `calculate` path and as read-only NumPy arrays for batch work.
+    Both are indexed by the integer codes in `transport_codes`/`diet_codes`.
+    
+    The optional uncertainty of each factor is kept as the shape (sigma) of a
+    lognormal distribution around it, for Monte Carlo bands (uncertainty.py).
+    """
+    
+    __slots__ = (
+        'version', 'year', 'transport_modes', 'transport_codes', 'transport_factors',
+        'transport_factor_array', 'default_transport_code', 'diets', 'diet_codes',
+        'diet_factors', 'diet_factor_array', 'default_diet_code', 'regions', 'region_codes',
+        'years', 'electricity_matrix', 'electricity_factors', 'electricity_factor_array',
+        'default_region_code', 'electricity_factor', 'gas_factor', 'renewable_factor',
+        'clothing_factor', 'electronics_factor', 'transport_sigma', 'diet_sigma', 'electricity_sigma',
+        'gas_sigma', 'renewable_sigma', 'clothing_sigma', 'electronics_sigma'
+    )
+    
+    def __init__(self, version: str, year: int, transport: Dict[str, float], diet: Dict[str, float],
+                 electricity: Dict[str, Dict[int, float]], gas: float, renewable_factor: float,
+                 clothing: float, electronics: float, defaults: Dict[str, str],
+                 uncertainty: Optional[Dict] = None):
+        self.version = str(version)
+        self.year = int(year)
+        
+        # Transportation: kg CO2 per km
+        self.transport_modes = tuple(transport)
+        self.transport_codes = {mode: i for i, mode in enumerate(self.transport_modes)}
+        self.transport_factors = tuple(float(v) for v in transport.values())
+        self.transport_factor_array = _frozen_array(self.transport_factors)
+        self.default_transport_code = self.transport_codes[defaults['transport']]
+        
+        # Diet: kg CO2 per day
+        self.diets = tuple(diet)
+        self.diet_codes = {name: i for i, name in enumerate(self.diets)}
+        self.diet_factors = tuple(float(v) for v in diet.values())
+        self.diet_factor_array = _frozen_array(self.diet_factors)
+        self.default_diet_code = self.diet_codes[defaults['diet']]
+        
+        # Electricity: kg CO2 per kWh as a (region, year) matrix
+        self.regions = tuple(electricity)
+        self.region_codes = {region: i for i, region in enumerate(self.regions)}
+        self.years = tuple(sorted({int(y) for by_year in electricity.values() for y in by_year}))
+        matrix = []
+        for region, by_year in electricity.items():
+            by_year = {int(y): float(v) for y, v in by_year.items()}
+            missing = [y for y in self.years if y not in by_year]
+            if missing:
+                raise ValueError(f"Electricity factors for region '{region}' missing years {missing}")
+            matrix.append([by_year[y] for y in self.years])
+        self.electricity_matrix = _frozen_array(matrix)
+        if self.year not in self.years:
+            raise ValueError(f"No electricity factors for table year {self.year}")
+        
+        # Current-year column, plus the default region as a plain scalar for the common case
+        column = self.years.index(self.year)
+        self.electricity_factors = tuple(self.electricity_matrix[:, column].tolist())
+        self.electricity_factor_array = _frozen_array(self.electricity_factors)
+        self.default_region_code = self.region_codes[defaults['region']]
+        self.electricity_factor = self.electricity_factors[self.default_region_code]
+        
+        # Scalars
+        self.gas_factor = float(gas)
+        self.renewable_factor = float(renewable_factor)
+        self.clothing_factor = float(clothing)
+        self.electronics_factor = float(electronics)
+        
+        # Uncertainty: relative standard deviations, stored as lognormal sigmas
+        uncertainty = uncertainty or {}
+        self.transport_sigma = _lognormal_sigmas(uncertainty.get('transport'), self.transport_modes, 'transport modes')
+        self.diet_sigma = _lognormal_sigmas(uncertainty.get('diet'), self.diets, 'diets')
+        self.electricity_sigma = _lognormal_sigmas(uncertainty.get('electricity'), self.regions, 'regions')
+        scalars = {name: uncertainty.get(name) for name in ('gas', 'renewableFactor', 'clothing', 'electronics')}
+        self.gas_sigma = float(_lognormal_sigmas(scalars['gas'], ('gas',), 'gas')[0])
+        self.renewable_sigma = float(_lognormal_sigmas(scalars['renewableFactor'], ('renewableFactor',),
+                                                       'renewableFactor')[0])
+        self.clothing_sigma = float(_lognormal_sigmas(scalars['clothing'], ('clothing',), 'clothing')[0])
+        self.electronics_sigma = float(_lognormal_sigmas(scalars['electronics'], ('electronics',),
+                                                         'electronics')[0])
+    
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f"EmissionFactorTable is immutable (tried to set '{name}')")
+        object.__setattr__(self, name, value)
+    
+    def transport_code(self, mode: str) -> int:
+        """Integer code for a transport mode, falling back to the default mode."""
+        return self.transport_codes.get(mode, self.default_transport_code)
+    
+    def diet_code(self, diet: str) -> int:
+        """Integer code for a diet, falling back to the default diet."""
+        return self.diet_codes.get(diet, self.default_diet_code)
+    
+    def region_code(self, region: Optional[str]) -> int:
+        """Integer code for an electricity region, falling back to the default region."""
+        if region is None:
+            return self.default_region_code
+        return self.region_codes.get(region.upper(), self.default_region_code)
+    
+    def electricity_for(self, region: Optional[str] = None, year: Optional[int] = None) -> float:
+        """Electricity factor for a region and year (defaults to the table year)."""
+        column = self.years.index(self.year if year is None else int(year))
+        return float(self.electricity_matrix[self.region_code(region), column])
+    
+    def describe(self) -> Dict:
+        """Summary of the table for the API."""
+        return {
+            'version': self.version,
+            'year': self.year,
+            'years': list(self.years),
+            'regions': list(self.regions),
+            'defaultRegion': self.regions[self.default_region_code],
+            'transportModes': list(self.transport_modes),
+            'diets': list(self.diets)
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'EmissionFactorTable':
+        """Build a table from the parsed JSON file layout."""
+        return cls(
+            version=data['version'],
+            year=data['year'],
+            transport=data['transport'],
+            diet=data['diet'],
+            electricity=data['electricity'],
+            gas=data['gas'],
+            renewable_factor=data['renewableFactor'],
+            clothing=data['shopping']['clothing'],
+            electronics=data['shopping']['electronics'],
+            defaults=data['defaults'],
+            uncertainty=data.get('uncertainty')
+        )
+    
+    @classmethod
+    def load(cls, path: str = DEFAULT_FACTORS_PATH) -> 'EmissionFactorTable':
+        """Load a table from a JSON file."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+class EmissionFactorRegistry(ReloadableFile[EmissionFactorTable]):
+    """Active emission factor table for a worker process, swapped when the file changes."""
+    
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None):
+        if check_interval is None:
+            check_interval = float(os.getenv('EMISSION_FACTORS_CHECK_INTERVAL', 30))
+        super().__init__(
+            path or os.getenv('EMISSION_FACTORS_PATH', DEFAULT_FACTORS_PATH),
+            EmissionFactorTable.load,
+            check_interval
+        )
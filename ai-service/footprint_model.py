@@ -0,0 +1,201 @@
+"""
+Footprint Model
+Learned per-user expected daily emissions and insight thresholds, loaded from a compact local artifact.
+"""
+
+import json
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from reloadable import ReloadableFile
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'models',
+                                  'footprint_model.npz')
+
+# Thresholds used without a trained model (and by the original fixed rules)
+DEFAULT_CHANGE_THRESHOLD = 5.0
+DEFAULT_VARIANCE_THRESHOLD = 2.0
+
+# Expected emissions of the newest day are predicted from up to the 6 days before it
+PREVIOUS_DAYS = 6
+MIN_PREVIOUS_DAYS = 3
+
+# Regression features: previous days' mean, the day before, the user's level, one-hot weekday
+FEATURES = ('previousMean', 'previousDay', 'level') + tuple(f'weekday{d}' for d in range(7))
+
+# A day outside expected ± ANOMALY_Z residual deviations is unusual for the user
+ANOMALY_Z = 2.0
+
+
+class FootprintModel:
+    """
+    Trained footprint model (see train_footprint_model.py).
+    
+    A linear model predicts a day's total from the days before it; each
+    trained user adds a weekday offset and has their own residual spread and
+    thresholds for week-over-week change and weekly variance. Users not in
+    the model get the population defaults. An untrained model has no
+    predictions and the fixed default thresholds.
+    """
+    
+    def __init__(self, version: str, coef: Optional[np.ndarray] = None, users: Sequence[str] = (),
+                 level: Optional[np.ndarray] = None, sigma: Optional[np.ndarray] = None,
+                 weekday: Optional[np.ndarray] = None, change_threshold: Optional[np.ndarray] = None,
+                 variance_threshold: Optional[np.ndarray] = None, default_cv: float = 0.0,
+                 default_change: float = DEFAULT_CHANGE_THRESHOLD,
+                 default_variance: float = DEFAULT_VARIANCE_THRESHOLD, meta: Optional[Dict] = None):
+        n_users = len(users)
+        self.version = version
+        self.coef = coef
+        self.users = list(users)
+        self.user_codes = {user_id: code for code, user_id in enumerate(self.users)}
+        # Per-user arrays carry a trailing row with the defaults, for code -1
+        self.level = np.append(level if level is not None else np.zeros(n_users), np.nan)
+        self.sigma = np.append(sigma if sigma is not None else np.zeros(n_users), np.nan)
+        self.weekday = np.vstack((weekday if weekday is not None else np.zeros((n_users, 7)), np.zeros((1, 7))))
+        self.change_threshold = np.append(
+            change_threshold if change_threshold is not None else np.full(n_users, default_change), default_change)
+        self.variance_threshold = np.append(
+            variance_threshold if variance_threshold is not None else np.full(n_users, default_variance),
+            default_variance)
+        self.default_cv = default_cv
+        self.meta = meta or {}
+    
+    @property
+    def trained(self) -> bool:
+        return self.coef is not None
+    
+    @classmethod
+    def untrained(cls) -> 'FootprintModel':
+        return cls('untrained')
+    
+    @classmethod
+    def load(cls, path: str) -> 'FootprintModel':
+        with np.load(path) as artifact:
+            meta = json.loads(str(artifact['meta']))
+            defaults = artifact['defaults'].tolist()
+            return cls(
+                meta['version'],
+                coef=artifact['coef'],
+                users=[user_id.decode() for user_id in artifact['users'].tolist()],
+                level=artifact['level'].astype(np.float64),
+                sigma=artifact['sigma'].astype(np.float64),
+                weekday=artifact['weekday'].astype(np.float64),
+                change_threshold=artifact['change_threshold'].astype(np.float64),
+                variance_threshold=artifact['variance_threshold'].astype(np.float64),
+                default_cv=defaults[0],
+                default_change=defaults[1],
+                default_variance=defaults[2],
+                meta=meta
+            )
+    
+    def save(self, path: str) -> None:
+        """Write the artifact atomically, so workers never load a partial file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'wb') as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps({**self.meta, 'version': self.version})),
+                coef=self.coef,
+                users=np.array([user_id.encode() for user_id in self.users], dtype=bytes),
+                level=self.level[:-1].astype(np.float32),
+                sigma=self.sigma[:-1].astype(np.float32),
+                weekday=self.weekday[:-1].astype(np.float32),
+                change_threshold=self.change_threshold[:-1].astype(np.float32),
+                variance_threshold=self.variance_threshold[:-1].astype(np.float32),
+                defaults=np.array([self.default_cv, self.change_threshold[-1], self.variance_threshold[-1]])
+            )
+        os.replace(temp, path)
+    
+    def stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'trained': self.trained,
+            'users': len(self.users),
+            'defaultChangeThreshold': round(float(self.change_threshold[-1]), 2),
+            'defaultVarianceThreshold': round(float(self.variance_threshold[-1]), 2),
+            **{key: value for key, value in self.meta.items() if key != 'version'}
+        }
+    
+    def codes(self, user_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """Row of each user in the per-user arrays; -1 (the defaults) for unknown users."""
+        get = self.user_codes.get
+        return np.fromiter((get(user_id, -1) for user_id in user_ids), dtype=np.intp, count=len(user_ids))
+    
+    def thresholds(self, user_id: Optional[str]) -> Tuple[float, float]:
+        """(week-over-week change %, weekly variance) thresholds of one user."""
+        code = self.user_codes.get(user_id, -1)
+        return float(self.change_threshold[code]), float(self.variance_threshold[code])
+    
+    def personalize(self, user_ids: Sequence[Optional[str]], window: np.ndarray,
+                    weekdays: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Thresholds and expected emissions of the newest day for many users at once.
+        
+        Args:
+            user_ids: User ids (None for anonymous users)
+            window: (users, 7) daily totals, newest first, NaN-padded
+            weekdays: Day number modulo 7 of each user's newest day
+        
+        Returns:
+            Dict of per-user arrays: changeThreshold, varianceThreshold, and
+            expected, lower and upper for the newest day (NaN without a
+            trained model or with fewer than MIN_PREVIOUS_DAYS earlier days)
+        """
+        codes = self.codes(user_ids)
+        result = {
+            'changeThreshold': self.change_threshold[codes],
+            'varianceThreshold': self.variance_threshold[codes]
+        }
+        n_users = len(codes)
+        if not self.trained:
+            missing = np.full(n_users, np.nan)
+            return {**result, 'expected': missing, 'lower': missing, 'upper': missing}
+        
+        previous = window[:, 1:PREVIOUS_DAYS + 1]
+        count = (~np.isnan(previous)).sum(axis=1)
+        with np.errstate(invalid='ignore'):
+            previous_mean = np.nansum(previous, axis=1) / count
+        level = self.level[codes]
+        level = np.where(np.isnan(level), previous_mean, level)
+        
+        features = np.zeros((n_users, len(FEATURES)))
+        features[:, 0] = previous_mean
+        features[:, 1] = previous[:, 0]
+        features[:, 2] = level
+        features[np.arange(n_users), 3 + weekdays] = 1.0
+        expected = np.maximum(features @ self.coef + self.weekday[codes, weekdays], 0.0)
+        sigma = self.sigma[codes]
+        sigma = np.where(np.isnan(sigma), self.default_cv * level, sigma)
+        expected = np.where(count >= MIN_PREVIOUS_DAYS, expected, np.nan)
+        return {
+            **result,
+            'expected': expected,
+            'lower': np.maximum(expected - ANOMALY_Z * sigma, 0.0),
+            'upper': expected + ANOMALY_Z * sigma
+        }
+
+
+class FootprintModelRegistry(ReloadableFile[FootprintModel]):
+    """
+    Active footprint model for a worker process, loaded once at startup and
+    swapped when a retrained artifact replaces the file. Without an artifact
+    the untrained model (fixed thresholds) is used.
+    """
+    
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None):
+        if check_interval is None:
+            check_interval = float(os.getenv('FOOTPRINT_MODEL_CHECK_INTERVAL', 30))
+        super().__init__(path or os.getenv('FOOTPRINT_MODEL_PATH', DEFAULT_MODEL_PATH), FootprintModel.load,
+                         check_interval)
+    
+    def reload(self) -> FootprintModel:
+        if not os.path.exists(self.path):
+            with self._lock:
+                self._value = FootprintModel.untrained()
+                self._mtime = None
+                return self._value
+        return super().reload()
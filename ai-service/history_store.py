@@ -0,0 +1,272 @@
+"""
+History Store
+Per-user daily progress history in an append-only, memory-mapped log shared by all workers.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from append_log import AppendLog
+from trend_store import RING_DAYS, TrendStore, day_number
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'history')
+LOG_NAME = 'progress.log'
+
+# Fixed-width log record; user ids are stored as up to 64 UTF-8 bytes
+MAX_USER_ID_BYTES = 64
+RECORD = np.dtype([
+    ('user', f'S{MAX_USER_ID_BYTES}'),
+    ('day', '<i4'),
+    ('challenges', '<i4'),
+    ('total', '<f8'),
+    ('saved', '<f8')
+])
+
+# Days of history kept in memory per user; compaction keeps at least the trend ring in the log
+DEFAULT_RETAIN_DAYS = 90
+
+# Users kept in memory, least recently used are dropped
+DEFAULT_MAX_USERS = 100000
+
+
+class NoHistory(LookupError):
+    """Nothing is stored for the requested user."""
+
+
+class UserHistory:
+    """
+    One user's retained daily history as parallel NumPy columns.
+    
+    Days are ascending day numbers with one row each; `merge` replaces
+    days that are already present and drops days older than the retention.
+    """
+    
+    __slots__ = ('days', 'totals', 'saved', 'challenges')
+    
+    def __init__(self):
+        self.days = np.empty(0, dtype=np.int32)
+        self.totals = np.empty(0, dtype=np.float64)
+        self.saved = np.empty(0, dtype=np.float64)
+        self.challenges = np.empty(0, dtype=np.int32)
+    
+    def merge(self, rows: np.ndarray, retain_days: int) -> None:
+        """Merge log rows for this user, sorted by day with one row per day."""
+        days = np.concatenate((self.days, rows['day']))
+        totals = np.concatenate((self.totals, rows['total']))
+        saved = np.concatenate((self.saved, rows['saved']))
+        challenges = np.concatenate((self.challenges, rows['challenges']))
+        
+        # Stable sort keeps existing rows ahead of new ones for the same day; keep the last
+        order = np.argsort(days, kind='stable')
+        days = days[order]
+        keep = np.ones(len(days), dtype=bool)
+        keep[:-1] = days[1:] != days[:-1]
+        keep &= days > days[-1] - retain_days
+        order = order[keep]
+        
+        self.days = days[keep]
+        self.totals = totals[order]
+        self.saved = saved[order]
+        self.challenges = challenges[order]
+    
+    def get(self, day: int) -> Optional[Tuple[float, float, int]]:
+        """(total, saved, challenges) stored for a day number, if retained."""
+        i = np.searchsorted(self.days, day)
+        if i < len(self.days) and self.days[i] == day:
+            return float(self.totals[i]), float(self.saved[i]), int(self.challenges[i])
+        return None
+    
+    def columns(self, count: Optional[int] = None) -> Dict[str, List]:
+        """The newest `count` days (all retained days if None), newest first."""
+        start = 0 if count is None else max(len(self.days) - count, 0)
+        return {
+            'dates': [date.fromordinal(day).isoformat() for day in self.days[start:][::-1].tolist()],
+            'totals': self.totals[start:][::-1].tolist(),
+            'carbonSaved': self.saved[start:][::-1].tolist(),
+            'challengesCompleted': self.challenges[start:][::-1].tolist()
+        }
+
+
+class HistoryStore:
+    """
+    Append-only per-user progress history.
+    
+    Every ingested day is appended as a fixed-width record to
+    `<directory>/progress.log`; a later record for the same user and day
+    replaces the earlier one. Each process keeps the last `retain_days` of
+    up to `max_users` users (least recently used are dropped) in memory as
+    NumPy columns and reads the log from its last offset (memory-mapped)
+    before each lookup, so days ingested by any worker are visible to all
+    of them. Records are also fed to `trends`, keeping the rolling
+    aggregates in step with the history.
+    
+    The log is compacted to the latest row of each user and day within the
+    last max(retain_days, RING_DAYS) days of that user (see AppendLog), so
+    start-up replay and disk use follow the retained history. Replaying a
+    compacted log is idempotent: days replace themselves in the histories
+    and in the trend ring.
+    
+    Without a directory the history is kept in memory only.
+    """
+    
+    def __init__(self, directory: Optional[str] = DEFAULT_HISTORY_DIR, retain_days: Optional[int] = None,
+                 trends: Optional[TrendStore] = None, max_users: Optional[int] = None):
+        if retain_days is None:
+            retain_days = int(os.getenv('HISTORY_RETAIN_DAYS', DEFAULT_RETAIN_DAYS))
+        if max_users is None:
+            max_users = int(os.getenv('HISTORY_MAX_USERS', DEFAULT_MAX_USERS))
+        self.retain_days = max(1, retain_days)
+        self.max_users = max_users
+        self.trends = trends
+        self.path = os.path.join(directory, LOG_NAME) if directory else None
+        self._users: Dict[str, UserHistory] = OrderedDict()
+        self._lock = threading.Lock()
+        self._log = None
+        if self.path is not None:
+            self._log = AppendLog(self.path, RECORD,
+                                  compact=partial(retained_rows, days=max(self.retain_days, RING_DAYS)))
+            with self._lock:
+                self._catch_up()
+    
+    @classmethod
+    def from_env(cls, trends: Optional[TrendStore] = None) -> 'HistoryStore':
+        """Store in HISTORY_STORE_DIR (default data/history; empty keeps history in memory only)."""
+        return cls(os.getenv('HISTORY_STORE_DIR', DEFAULT_HISTORY_DIR) or None, trends=trends)
+    
+    def append(self, user_id: str, records: Iterable[Tuple]) -> int:
+        """
+        Record (day, total, carbon saved, challenges completed) rows for a user.
+        
+        Days may come in any order as ISO strings, dates or day numbers.
+        A carbon saved or challenges value of None keeps the stored one (0 for
+        a day that is not retained). Days whose stored values are unchanged
+        are not written again, so re-sending recent history does not grow the log.
+        
+        Returns:
+            Number of rows written
+        
+        Raises:
+            ValueError: If the user id is longer than MAX_USER_ID_BYTES or a day is not a date
+        """
+        key = user_id.encode()
+        if len(key) > MAX_USER_ID_BYTES:
+            raise ValueError(f"User id longer than {MAX_USER_ID_BYTES} bytes")
+        latest = {}
+        for day, total, saved, challenges in records:
+            latest[day_number(day)] = (float(total), saved, challenges)
+        
+        with self._lock:
+            self._catch_up()
+            history = self._users.get(user_id)
+            changed = []
+            for day, (total, saved, challenges) in sorted(latest.items()):
+                stored = history.get(day) if history is not None else None
+                values = (total,
+                          float(saved) if saved is not None else stored[1] if stored else 0.0,
+                          int(challenges) if challenges is not None else stored[2] if stored else 0)
+                if values != stored:
+                    changed.append((key, day, values[2], values[0], values[1]))
+            if not changed:
+                return 0
+            rows = np.array(changed, dtype=RECORD)
+            if self._log is None:
+                self._apply(rows)
+            else:
+                self._log.append(rows)
+                self._catch_up()
+            return len(rows)
+    
+    def history(self, user_id: str, days: Optional[int] = None) -> Optional[Dict[str, List]]:
+        """
+        Stored history of a user as columns, newest first.
+        
+        Args:
+            user_id: User id
+            days: Return only the newest `days` entries
+        
+        Returns:
+            Dict with dates, totals, carbonSaved and challengesCompleted lists,
+            or None if nothing is stored for the user
+        """
+        with self._lock:
+            self._catch_up()
+            history = self._users.get(user_id)
+            if history is None:
+                return None
+            self._users.move_to_end(user_id)
+            return history.columns(days)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'maxUsers': self.max_users,
+                'logRows': self._log.rows if self._log is not None else 0,
+                'logBytes': self._log.offset if self._log is not None else 0,
+                'compactions': self._log.compactions if self._log is not None else 0,
+                'retainDays': self.retain_days,
+                'path': self.path
+            }
+    
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            self._catch_up()
+            return user_id in self._users
+    
+    def __len__(self) -> int:
+        return len(self._users)
+    
+    def _catch_up(self) -> None:
+        """Apply records appended to the log since this process last read it."""
+        if self._log is None:
+            return
+        # After a compaction the whole log comes back; merging it again changes nothing
+        rows, _ = self._log.read()
+        if rows is not None:
+            self._apply(rows)
+    
+    def _apply(self, rows: np.ndarray) -> None:
+        """Merge log rows (in log order) into the per-user histories and trends."""
+        rows = latest_rows(rows)
+        starts = np.flatnonzero(np.concatenate(([True], rows['user'][1:] != rows['user'][:-1])))
+        for chunk in np.split(rows, starts[1:]):
+            user_id = chunk['user'][0].decode()
+            history = self._users.get(user_id)
+            if history is None:
+                history = self._users[user_id] = UserHistory()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            history.merge(chunk, self.retain_days)
+            if self.trends is not None:
+                self.trends.record_many(user_id, zip(chunk['day'].tolist(), chunk['total'].tolist()))
+
+
+def latest_rows(rows: np.ndarray) -> np.ndarray:
+    """Log rows (in log order) sorted by user and day, keeping the last row of each (user, day)."""
+    order = np.lexsort((np.arange(len(rows)), rows['day'], rows['user']))
+    rows = np.asarray(rows[order])
+    users = rows['user']
+    days = rows['day']
+    last = np.ones(len(rows), dtype=bool)
+    last[:-1] = (users[1:] != users[:-1]) | (days[1:] != days[:-1])
+    return rows[last]
+
+
+def retained_rows(rows: np.ndarray, days: int) -> np.ndarray:
+    """`latest_rows` within the newest `days` days of each user: what a compacted log keeps."""
+    rows = latest_rows(rows)
+    if not len(rows):
+        return rows
+    users = rows['user']
+    first = np.concatenate(([True], users[1:] != users[:-1]))
+    last = np.concatenate((first[1:], [True]))
+    newest = rows['day'][last][np.cumsum(first) - 1]
+    return rows[rows['day'] > newest - days]
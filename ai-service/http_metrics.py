@@ -0,0 +1,75 @@
+"""
+HTTP Metrics
+Route class and ASGI middleware that time endpoints and request stages into metrics.py histograms.
+"""
+
+import asyncio
+import functools
+import time
+
+from fastapi.routing import APIRoute
+
+from metrics import REQUEST_DURATION, STAGE_DURATION, begin_request, current_timing, end_request
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    Route class that marks when FastAPI hands a request to the endpoint.
+    
+    Everything before the endpoint runs (body read, JSON decoding and
+    pydantic validation) is recorded as the `validation` stage, and the
+    endpoint's return time is kept so the middleware can time response
+    serialization.
+    """
+    
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            super().__init__(path, endpoint, **kwargs)
+            return
+        route = path
+        
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kw):
+            timing = current_timing()
+            if timing is not None:
+                timing.route = route
+                STAGE_DURATION.observe(time.perf_counter() - timing.start, (route, 'validation'))
+            try:
+                return await endpoint(*args, **kw)
+            finally:
+                if timing is not None:
+                    timing.handler_end = time.perf_counter()
+        
+        timed_endpoint.metrics_route = route
+        super().__init__(path, timed_endpoint, **kwargs)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and the serialization stage."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        timing, token = begin_request()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            end_request(token)
+            end = time.perf_counter()
+            route = timing.route or getattr(scope.get('endpoint'), 'metrics_route', None) or 'unmatched'
+            REQUEST_DURATION.observe(end - timing.start, (scope['method'], route, str(status)))
+            if timing.handler_end is not None:
+                STAGE_DURATION.observe(end - timing.handler_end, (route, 'serialization'))
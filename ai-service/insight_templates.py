@@ -0,0 +1,271 @@
+"""
+Insight Templates
+Localized insight and recommendation texts compiled once into reusable render objects.
+"""
+
+import json
+import os
+import re
+import string
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from reloadable import ReloadableFile
+
+DEFAULT_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'insight_templates.json')
+
+DEFAULT_LOCALE = 'en'
+
+# Format specs with an exact printf equivalent: sign, alternate form, zero padding, width, precision, type
+PRINTF_SPEC = re.compile(r'^([+ ]?#?0?\d*(?:\.\d+)?)([deEfFgGoxX])$')
+
+
+def normalize_locale(locale: str) -> str:
+    return locale.strip().replace('_', '-').lower()
+
+
+def resolve_locale(locale: Optional[str], available, default: Optional[str] = None) -> Optional[str]:
+    """
+    Best available locale for a requested one: the exact tag, then its
+    language ("es-MX" -> "es"), then `default`.
+    """
+    if not locale:
+        return default
+    locale = normalize_locale(locale)
+    if locale in available:
+        return locale
+    language = locale.split('-', 1)[0]
+    return language if language in available else default
+
+
+class Template:
+    """
+    A `str.format` text compiled into a printf-style format string.
+    
+    Fields with a printf equivalent (`{x}`, `{x:.1f}`, `{x:d}`, ...) are
+    formatted by the `%` operator in C; other specs are applied with
+    `format()` first. Output equals `source.format(**values)`. Texts
+    without fields render to the same interned string every time.
+    """
+    
+    __slots__ = ('source', 'fields', '_named', '_positional', '_preformat', '_static')
+    
+    def __init__(self, source: str):
+        self.source = source
+        named, positional, fields, preformat = [], [], [], []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            literal = literal.replace('%', '%%')
+            named.append(literal)
+            positional.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"Template field '{field}' must be a plain name: {source!r}")
+            fields.append(field)
+            if spec and not conversion and PRINTF_SPEC.match(spec):
+                printf = spec
+            elif spec or conversion:
+                preformat.append((field, conversion, spec))
+                printf = 's'
+            else:
+                printf = 's'
+            named.append(f'%({field}){printf}')
+            positional.append(f'%{printf}')
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self._named = sys.intern(''.join(named))
+        self._positional = sys.intern(''.join(positional))
+        self._preformat = tuple(preformat)
+        self._static = sys.intern(source) if not fields else None
+    
+    def __repr__(self) -> str:
+        return f'Template({self.source!r})'
+    
+    def render(self, **values) -> str:
+        """Render with field values by name."""
+        if self._static is not None:
+            return self._static
+        if self._preformat:
+            values = dict(values)
+            for field, conversion, spec in self._preformat:
+                value = values[field]
+                if conversion:
+                    value = {'r': repr, 's': str, 'a': ascii}[conversion](value)
+                values[field] = format(value, spec)
+        return self._named % values
+    
+    def render_args(self, args: tuple) -> str:
+        """Render with one value per entry of `fields`, in order."""
+        if self._static is not None:
+            return self._static
+        if self._preformat:
+            return self.render(**dict(zip(self.fields, args)))
+        return self._positional % args
+    
+    def render_many(self, columns: Dict[str, Sequence], count: Optional[int] = None) -> List[str]:
+        """Render once per row of equally long value columns (`count` rows if none are needed)."""
+        if self._static is not None:
+            return [self._static] * (len(next(iter(columns.values()))) if count is None else count)
+        if self._preformat:
+            return [self.render_args(args) for args in zip(*(columns[f] for f in self.fields))]
+        positional = self._positional
+        return [positional % args for args in zip(*(columns[f] for f in self.fields))]
+
+
+class InsightTemplate:
+    """
+    An insight (or other output dict) with static fields and text templates.
+    
+    Static values are stored once; rendering copies them and fills in the
+    templated texts, keeping the key order of the source. A template with no
+    fields renders to one shared dict, which callers must not mutate.
+    """
+    
+    __slots__ = ('name', 'texts', '_static', '_shared')
+    
+    def __init__(self, name: str, spec: Dict):
+        self.name = name
+        self._static = {}
+        texts = []
+        for key, value in spec.items():
+            key = sys.intern(key)
+            if isinstance(value, str) and '{' in value:
+                self._static[key] = None
+                texts.append((key, Template(value)))
+            else:
+                self._static[key] = sys.intern(value) if isinstance(value, str) else value
+        self.texts: Tuple[Tuple[str, Template], ...] = tuple(texts)
+        self._shared = None if texts else self._static
+    
+    def render(self, **values) -> Dict:
+        if self._shared is not None:
+            return self._shared
+        item = self._static.copy()
+        for key, template in self.texts:
+            item[key] = template.render(**values)
+        return item
+    
+    def render_many(self, columns: Dict[str, Sequence], count: Optional[int] = None) -> List[Dict]:
+        """One rendered dict per row of equally long value columns (`count` rows if none are needed)."""
+        if count is None:
+            count = len(next(iter(columns.values())))
+        if self._shared is not None:
+            return [self._shared] * count
+        rendered = [(key, template.render_many(columns, count)) for key, template in self.texts]
+        items = []
+        static = self._static
+        for i in range(count):
+            item = static.copy()
+            for key, texts in rendered:
+                item[key] = texts[i]
+            items.append(item)
+        return items
+
+
+class LocaleTemplates:
+    """All templates of one locale, with the default locale filling any gaps."""
+    
+    def __init__(self, locale: str, insights: Dict[str, InsightTemplate], texts: Dict[str, Template],
+                 terms: Dict[str, Dict[str, str]]):
+        self.locale = locale
+        self.insights = insights
+        self.texts = texts
+        self.terms = terms
+    
+    def insight(self, name: str, **values) -> Dict:
+        return self.insights[name].render(**values)
+    
+    def text(self, name: str, **values) -> str:
+        return self.texts[name].render(**values)
+    
+    def term(self, group: str, key: str) -> str:
+        return self.terms.get(group, {}).get(key, key)
+
+
+class TemplateBook:
+    """
+    One version of all insight templates, compiled per locale.
+    
+    Each locale may override any subset of the default locale's insights
+    (field by field), texts and terms; everything else comes from the
+    default locale.
+    """
+    
+    def __init__(self, version: str, default_locale: str, locales: Dict[str, LocaleTemplates]):
+        self.version = str(version)
+        self.default_locale = default_locale
+        self.locales = locales
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TemplateBook':
+        default_locale = normalize_locale(data.get('defaultLocale', DEFAULT_LOCALE))
+        sources = {normalize_locale(locale): spec for locale, spec in data['locales'].items()}
+        if default_locale not in sources:
+            raise ValueError(f"Default locale '{default_locale}' has no templates")
+        base = sources[default_locale]
+        locales = {}
+        # The default locale first: other locales' fields are checked against it
+        for locale, spec in sorted(sources.items(), key=lambda item: item[0] != default_locale):
+            unknown = set(spec.get('insights', {})) - set(base.get('insights', {}))
+            unknown |= set(spec.get('texts', {})) - set(base.get('texts', {}))
+            if unknown:
+                raise ValueError(f"Locale '{locale}' has templates missing from '{default_locale}': "
+                                 f"{', '.join(sorted(unknown))}")
+            insights = {
+                name: InsightTemplate(name, {**fields, **spec.get('insights', {}).get(name, {})})
+                for name, fields in base.get('insights', {}).items()
+            }
+            texts = {name: Template(spec.get('texts', {}).get(name, text))
+                     for name, text in base.get('texts', {}).items()}
+            terms = {}
+            for group, values in base.get('terms', {}).items():
+                values = {**values, **spec.get('terms', {}).get(group, {})}
+                terms[group] = {key: sys.intern(value) for key, value in values.items()}
+            if locale != default_locale:
+                cls._check_fields(locale, insights, texts, locales[default_locale])
+            locales[locale] = LocaleTemplates(locale, insights, texts, terms)
+        return cls(data['version'], default_locale, locales)
+    
+    @staticmethod
+    def _check_fields(locale: str, insights: Dict[str, InsightTemplate], texts: Dict[str, Template],
+                      default: LocaleTemplates) -> None:
+        """A translation may only use values the default locale's template is rendered with."""
+        pairs = [(name, texts[name], default.texts[name]) for name in texts]
+        pairs += [(name, template, dict(default.insights[name].texts)[key])
+                  for name, insight in insights.items() for key, template in insight.texts
+                  if key in dict(default.insights[name].texts)]
+        for name, template, reference in pairs:
+            extra = set(template.fields) - set(reference.fields)
+            if extra:
+                raise ValueError(f"Locale '{locale}' template '{name}' uses unknown fields: {', '.join(sorted(extra))}")
+    
+    @classmethod
+    def load(cls, path: str = DEFAULT_TEMPLATES_PATH) -> 'TemplateBook':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+    
+    def get(self, locale: Optional[str] = None) -> LocaleTemplates:
+        """Templates for a requested locale (e.g. "es-MX"), falling back to the default locale."""
+        return self.locales[resolve_locale(locale, self.locales, self.default_locale)]
+    
+    def describe(self) -> Dict:
+        templates = self.locales[self.default_locale]
+        return {
+            'version': self.version,
+            'defaultLocale': self.default_locale,
+            'locales': sorted(self.locales),
+            'insights': sorted(templates.insights),
+            'texts': sorted(templates.texts)
+        }
+
+
+class TemplateRegistry(ReloadableFile[TemplateBook]):
+    """Active template book for a worker process, recompiled when the templates file changes."""
+    
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None):
+        if check_interval is None:
+            check_interval = float(os.getenv('INSIGHT_TEMPLATES_CHECK_INTERVAL', 30))
+        super().__init__(
+            path or os.getenv('INSIGHT_TEMPLATES_PATH', DEFAULT_TEMPLATES_PATH),
+            TemplateBook.load,
+            check_interval
+        )
@@ -3,37 +3,60 @@ AI Insights Generator
 Generates personalized sustainability insights and tips based on user data.
 """
 
+import time
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 
+from activity_store import ActivityStore, rollup_events
+from carbon_calculator import TREE_ANNUAL_KG
+from footprint_model import (DEFAULT_CHANGE_THRESHOLD, DEFAULT_VARIANCE_THRESHOLD, MIN_PREVIOUS_DAYS,
+                             FootprintModelRegistry)
+from insight_templates import LocaleTemplates, TemplateRegistry
+from lazy_imports import lazy_module
+from metrics import observe_stage
+from population_snapshot import CATEGORIES, EPOCH_ORDINAL, PopulationRegistry
+from request_objects import InsightsInput
+from rule_engine import RuleRegistry
+from trend_store import day_number
+
+# Only the batch digest uses pandas; importing it on first use keeps start-up fast
+pd = lazy_module('pandas')
+
+# "Top N%" labels, tightest first
+TOP_PERCENT_LABELS = (1, 5, 10)
+
+# Activity insights: days per window, smallest share of the window worth
+# calling out, and smallest change against the window before
+ACTIVITY_WINDOW = 7
+ACTIVITY_SHARE_THRESHOLD = 30
+ACTIVITY_CHANGE_THRESHOLD = 20
+
 
 class InsightsGenerator:
     """Generate personalized eco insights and recommendations."""
     
-    def __init__(self):
-        self.insight_templates = {
-            'improvement': [
-                "Great job! Your carbon footprint decreased by {percent}% this week! 🎉",
-                "You're on fire! {percent}% reduction in emissions - keep it up! 🔥",
-                "Amazing progress! You've reduced your footprint by {amount}kg CO₂ this week! 🌱"
-            ],
-            'decline': [
-                "Your emissions increased by {percent}% this week. Let's get back on track! 💪",
-                "Small setback this week (+{percent}%), but you've got this! Remember your goals! 🎯"
-            ],
-            'streak': [
-                "Incredible! {days}-day streak! You're a climate champion! 🏆",
-                "{days} days in a row! Your consistency is inspiring! ⭐"
-            ],
-            'milestone': [
-                "You've saved {amount}kg CO₂ total - equivalent to {trees} trees! 🌳",
-                "Milestone achieved! {amount}kg CO₂ saved. That's like not driving {km}km! 🚗"
-            ]
-        }
+    def __init__(self, rules: Optional[RuleRegistry] = None, population: Optional[PopulationRegistry] = None,
+                 model: Optional[FootprintModelRegistry] = None, templates: Optional[TemplateRegistry] = None,
+                 activities: Optional[ActivityStore] = None):
+        # Lifestyle insights and category recommendations are declarative rules
+        self.rules = rules or RuleRegistry()
+        
+        # Optional population snapshot for comparative insights
+        self.population = population
+        
+        # Optional trained footprint model for personalized thresholds and unusual days
+        self.model = model
+        
+        # Insight texts, compiled once per locale
+        self.templates = templates or TemplateRegistry()
+        
+        # Optional ingested activity totals for activity insights
+        self.activities = activities
     
     def generate(self, lifestyle: Dict, recent_progress: List[Dict], 
-                 carbon_footprint: Dict) -> Dict:
+                 carbon_footprint: Dict, trends: Optional[Dict] = None,
+                 user_id: Optional[str] = None, locale: Optional[str] = None) -> Dict:
         """
         Generate personalized insights based on user data.
         
@@ -41,44 +64,283 @@ class InsightsGenerator:
             lifestyle: User's lifestyle data
             recent_progress: List of recent daily progress records
             carbon_footprint: Current carbon footprint metrics
+            trends: Optional stored aggregates from TrendStore.snapshot; when
+                given they replace rescanning `recent_progress` for trends
+            user_id: Optional user id, to rank the user in the population snapshot
+            locale: Optional language of the texts, e.g. "es" (default: English)
         
         Returns:
             Dict with insights and recommendations
         """
+        # Emissions from the last 7 days (newest first)
+        totals = [p['carbonData']['total'] for p in recent_progress[:7]]
+        
+        # Total carbon saved from challenges
+        total_saved = 0
+        for progress in recent_progress:
+            challenges = progress.get('challengesCompleted') or []
+            for challenge in challenges:
+                total_saved += challenge.get('carbonSaved', 0)
+        
+        latest_date = recent_progress[0].get('date') if recent_progress else None
+        # Days before the activity window and the one before it cannot change the rollup
+        activities = [(a.get('type'), a.get('carbonImpact', 0), a.get('timestamp'))
+                      for progress in recent_progress[:2 * ACTIVITY_WINDOW] for a in progress.get('activities', [])]
+        return self._generate(self._lifestyle_profile(lifestyle, carbon_footprint), totals,
+                              total_saved, len(recent_progress), trends, user_id, latest_date, locale, activities)
+    
+    def generate_request(self, request: InsightsInput, trends: Optional[Dict] = None,
+                         history: Optional[Dict] = None) -> Dict:
+        """
+        Generate insights for a validated request object.
+        
+        Same result as `generate` with the equivalent dicts, read straight
+        from the request's attributes (locale included), challenge savings
+        of the request progress included.
+        
+        Args:
+            request: Validated `/insights` request
+            trends: Optional stored aggregates from TrendStore.snapshot
+            history: Optional stored days from HistoryStore.history (newest
+                first); replaces the request progress, challenge savings included
+        
+        Returns:
+            Dict with insights and recommendations
+        """
+        if history is not None:
+            totals = history['totals']
+            total_saved = sum(history['carbonSaved'])
+            latest_date = history['dates'][0] if totals else None
+        else:
+            totals = [day.total for day in request.progress]
+            total_saved = sum(day.saved for day in request.progress)
+            latest_date = request.progress[0].date if totals else None
+        
+        lifestyle = request.lifestyle
+        profile = {
+            'primaryMode': lifestyle.primary_mode,
+            'distancePerDay': lifestyle.distance,
+            'renewableEnergy': lifestyle.renewable,
+            'electricityUsage': lifestyle.electricity,
+            'dietType': lifestyle.diet,
+            'daily': request.carbon_footprint.get('daily', 0)
+        }
+        activities = [(a.type, a.carbon_impact, a.timestamp)
+                      for day in request.progress[:2 * ACTIVITY_WINDOW] for a in day.activities]
+        return self._generate(profile, totals[:7], total_saved, len(totals), trends, request.user_id,
+                              latest_date, request.locale, activities)
+    
+    def _generate(self, profile: Dict, totals: List[float], total_saved: float, days: int,
+                  trends: Optional[Dict], user_id: Optional[str] = None, latest_date=None,
+                  locale: Optional[str] = None, activities: Optional[List[tuple]] = None) -> Dict:
+        """
+        Insights and recommendations from extracted lifestyle features and progress.
+        `totals` are the last 7 daily totals, newest first, `latest_date` the newest day
+        and `activities` the request's (type, carbon impact, timestamp) activities.
+        """
         insights = []
         recommendations = []
-        
-        # Analyze trends
-        if len(recent_progress) >= 2:
-            trend_insights = self._analyze_trends(recent_progress)
+        started = time.perf_counter()
+        templates = self.templates.current().get(locale)
+        personal = self._personalize(user_id, totals, latest_date)
+        
+        # Analyze trends, against the user's own thresholds when a model is trained
+        if trends is not None:
+            insights.extend(self._analyze_trend_aggregates(templates, trends, totals, personal['changeThreshold'],
+                                                           personal['varianceThreshold']))
+        elif len(totals) >= 2:
+            trend_insights = self._analyze_trends(templates, totals, personal['changeThreshold'],
+                                                  personal['varianceThreshold'])
             insights.extend(trend_insights)
+        unusual = self._unusual_day_insight(templates, totals[0] if totals else None, personal['expected'],
+                                            personal['lower'], personal['upper'])
+        if unusual is not None:
+            insights.append(unusual)
+        started = observe_stage('trends', started)
+        
+        # Compare with the population snapshot
+        if self.population is not None:
+            insights.extend(self._comparative_insights(templates, user_id, profile['daily']))
+            started = observe_stage('comparison', started)
+        
+        # Where this week's logged activity emissions came from
+        rollup = self._activity_rollup(user_id, activities or (), latest_date)
+        if rollup is not None:
+            insights.extend(self._activity_insights(templates, rollup))
+            started = observe_stage('activities', started)
         
         # Analyze lifestyle patterns
-        lifestyle_insights = self._analyze_lifestyle(lifestyle)
+        lifestyle_insights = self._analyze_lifestyle(profile, locale)
         insights.extend(lifestyle_insights)
         
         # Generate category-specific recommendations
-        category_recs = self._generate_category_recommendations(lifestyle, carbon_footprint)
+        category_recs = self._generate_category_recommendations(profile, locale)
         recommendations.extend(category_recs)
+        started = observe_stage('recommendations', started)
         
         # Add motivational insights
-        motivational = self._generate_motivational_insights(recent_progress)
+        motivational = self._generate_motivational_insights(templates, total_saved, days)
         insights.extend(motivational)
+        observe_stage('motivation', started)
         
         return {
             'insights': insights[:5],  # Top 5 insights
             'recommendations': recommendations[:5]  # Top 5 recommendations
         }
     
-    def _analyze_trends(self, recent_progress: List[Dict]) -> List[Dict]:
-        """Analyze recent progress trends."""
-        insights = []
+    def generate_batch(self, user_ids: List[str], dates: List[str], totals: List[float],
+                       carbon_saved: Optional[List[float]] = None,
+                       challenges_completed: Optional[List[int]] = None,
+                       locale: Optional[str] = None) -> List[Dict]:
+        """
+        Generate progress insights and weekly summaries for many users at once.
+        
+        Input is columnar with one entry per progress day across all users.
+        Trends, variance, streaks and summaries are computed with vectorized
+        pandas/NumPy operations; per user the results match `_analyze_trends`,
+        `_unusual_day_insight`, `_generate_motivational_insights` and
+        `generate_weekly_summary` applied to that user's days sorted newest
+        first (trends and the summary use the 7 most recent days). With a
+        trained footprint model, thresholds and expected days for all users
+        come from one batched model call. Each kind of insight is rendered for
+        all users that get it in one pass over its compiled template.
         
-        if len(recent_progress) < 2:
-            return insights
+        Args:
+            user_ids: User id for each row
+            dates: ISO date for each row
+            totals: Total daily emissions for each row
+            carbon_saved: Carbon saved through challenges for each row
+            challenges_completed: Number of challenges completed for each row
+            locale: Optional language of the texts, e.g. "es" (default: English)
         
-        # Get emissions from last 7 days
-        recent_emissions = [p['carbonData']['total'] for p in recent_progress[:7]]
+        Returns:
+            List of dicts with userId, insights and summary, in order of first appearance
+        """
+        rows = len(user_ids)
+        columns = {'dates': dates, 'totals': totals, 'carbon_saved': carbon_saved,
+                   'challenges_completed': challenges_completed}
+        for name, column in columns.items():
+            if column is not None and len(column) != rows:
+                raise ValueError(f"'{name}' has {len(column)} entries, expected {rows}")
+        if rows == 0:
+            return []
+        
+        frame = pd.DataFrame({
+            'total': np.asarray(totals, dtype=np.float64),
+            'saved': np.asarray(carbon_saved, dtype=np.float64) if carbon_saved is not None else 0.0,
+            'challenges': np.asarray(challenges_completed, dtype=np.int64) if challenges_completed is not None else 0,
+            'date': pd.to_datetime(pd.Series(dates), utc=True, format='ISO8601')
+        })
+        codes, users = pd.factorize(pd.Series(user_ids))
+        frame['user'] = codes
+        
+        # Newest first within each user, as recentProgress is ordered
+        frame = frame.sort_values(['user', 'date'], ascending=[True, False], kind='stable')
+        user = frame['user'].to_numpy()
+        position = frame.groupby('user', sort=False).cumcount().to_numpy()
+        total = frame['total'].to_numpy()
+        saved = frame['saved'].to_numpy()
+        challenges = frame['challenges'].to_numpy()
+        n_users = len(users)
+        
+        days = np.bincount(user, minlength=n_users)
+        saved_all = np.bincount(user, weights=saved, minlength=n_users)
+        
+        # (users, 7) matrix of the most recent totals, NaN-padded
+        recent = position < 7
+        window = np.full((n_users, 7), np.nan)
+        window[user[recent], position[recent]] = total[recent]
+        count = np.minimum(days, 7)
+        
+        # Trend: mean of the newest 3 vs mean of the oldest 3 (or single endpoints)
+        first = window[:, 0]
+        last = np.take_along_axis(window, (count - 1)[:, None], axis=1)[:, 0]
+        current_avg = np.where(count >= 3, window[:, :3].sum(axis=1) / 3, first)
+        oldest = np.take_along_axis(window, np.clip(count[:, None] + np.arange(-3, 0), 0, 6), axis=1)
+        previous_avg = np.where(count >= 6, oldest.sum(axis=1) / 3, last)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change_percent = np.where(previous_avg > 0, (previous_avg - current_avg) / previous_avg * 100, 0.0)
+        
+        # Personalized thresholds and the expected range of each user's newest day
+        if self.model is not None:
+            newest = frame['date'].dt.tz_localize(None).to_numpy()[position == 0].astype('datetime64[D]')
+            weekdays = (newest.astype(np.int64) + EPOCH_ORDINAL) % 7
+            personal = self.model.current().personalize(users, window, weekdays)
+        else:
+            missing = np.full(n_users, np.nan)
+            personal = {'changeThreshold': np.full(n_users, DEFAULT_CHANGE_THRESHOLD),
+                        'varianceThreshold': np.full(n_users, DEFAULT_VARIANCE_THRESHOLD),
+                        'expected': missing, 'lower': missing, 'upper': missing}
+        
+        # Consistency over a full week
+        full_week = count >= 7
+        variance = np.full(n_users, np.inf)
+        if full_week.any():
+            variance[full_week] = np.var(window[full_week], axis=1)
+        consistent = variance < personal['varianceThreshold']
+        
+        # Weekly summary over the most recent 7 days
+        week_total = np.nansum(window, axis=1)
+        week_challenges = np.bincount(user[recent], weights=challenges[recent], minlength=n_users)
+        week_saved = np.bincount(user[recent], weights=saved[recent], minlength=n_users)
+        
+        # Which users get each insight, in the order insights are listed
+        templates = self.templates.current().get(locale)
+        tracked = days >= 2
+        threshold = personal['changeThreshold']
+        expected = personal['expected']
+        unusual = ~np.isnan(expected)
+        with np.errstate(invalid='ignore'):
+            high = unusual & (first > personal['upper'])
+            low = unusual & ~high & (first < personal['lower'])
+        percent = np.abs(change_percent)
+        kinds = (
+            ('trend_down', tracked & (change_percent > threshold), {'percent': percent}),
+            ('trend_up', tracked & (change_percent < -threshold), {'percent': percent}),
+            ('consistency', tracked & consistent, {}),
+            ('unusual_high', high, {'total': first, 'expected': expected}),
+            ('unusual_low', low, {'total': first, 'expected': expected}),
+            ('milestone', saved_all > 0, {'saved': saved_all, 'trees': (saved_all / TREE_ANNUAL_KG).astype(np.int64)}),
+            ('streak', days >= 7, {'days': days})
+        )
+        insights = [[] for _ in range(n_users)]
+        for name, mask, values in kinds:
+            index = np.flatnonzero(mask)
+            if len(index) == 0:
+                continue
+            rendered = templates.insights[name].render_many(
+                {key: column[index].tolist() for key, column in values.items()}, len(index))
+            for i, item in zip(index.tolist(), rendered):
+                insights[i].append(item)
+        
+        net = week_total - week_saved
+        summaries = templates.texts['weekly_summary'].render_many(
+            {'emitted': week_total.tolist(), 'saved': week_saved.tolist(), 'net': net.tolist()})
+        period = templates.text('weekly_period')
+        return [
+            {
+                'userId': user_id,
+                'insights': user_insights,
+                'summary': {
+                    'period': period,
+                    'totalEmissions': round(total, 2),
+                    'averageDaily': round(average, 2),
+                    'challengesCompleted': completed,
+                    'carbonSaved': round(saved_week, 2),
+                    'netImpact': round(net_week, 2),
+                    'summary': summary
+                }
+            }
+            for user_id, user_insights, total, average, completed, saved_week, net_week, summary in zip(
+                users.tolist(), insights, week_total.tolist(), (week_total / count).tolist(),
+                week_challenges.astype(np.int64).tolist(), week_saved.tolist(), net.tolist(), summaries)
+        ]
+    
+    def _analyze_trends(self, templates: LocaleTemplates, recent_emissions: List[float],
+                        change_threshold: float = DEFAULT_CHANGE_THRESHOLD,
+                        variance_threshold: float = DEFAULT_VARIANCE_THRESHOLD) -> List[Dict]:
+        """Analyze recent progress trends from the last 7 daily totals, newest first."""
+        insights = []
         
         if len(recent_emissions) >= 2:
             # Calculate trend
@@ -88,187 +350,219 @@ class InsightsGenerator:
             change = previous_avg - current_avg
             change_percent = (change / previous_avg * 100) if previous_avg > 0 else 0
             
-            if change_percent > 5:
-                insights.append({
-                    'type': 'trend',
-                    'title': '📉 Great Progress!',
-                    'description': f'Your carbon footprint decreased by {abs(change_percent):.1f}% this week!',
-                    'sentiment': 'positive',
-                    'impact': 'high'
-                })
-            elif change_percent < -5:
-                insights.append({
-                    'type': 'trend',
-                    'title': '📈 Let\'s Improve',
-                    'description': f'Your emissions increased by {abs(change_percent):.1f}% this week. Small changes can make a big difference!',
-                    'sentiment': 'neutral',
-                    'impact': 'medium'
-                })
+            trend = self._weekly_trend_insight(templates, change_percent, change_threshold)
+            if trend is not None:
+                insights.append(trend)
         
         # Analyze consistency
         if len(recent_emissions) >= 7:
             variance = np.var(recent_emissions)
-            if variance < 2.0:  # Low variance = consistent
-                insights.append({
-                    'type': 'consistency',
-                    'title': '🎯 Consistency Champion',
-                    'description': 'Your emissions are very consistent. Great job maintaining your eco-friendly habits!',
-                    'sentiment': 'positive',
-                    'impact': 'medium'
-                })
+            if variance < variance_threshold:  # Low variance = consistent
+                insights.append(templates.insight('consistency'))
         
         return insights
     
-    def _analyze_lifestyle(self, lifestyle: Dict) -> List[Dict]:
-        """Analyze lifestyle patterns and generate insights."""
+    def _weekly_trend_insight(self, templates: LocaleTemplates, change_percent: float,
+                              threshold: float = DEFAULT_CHANGE_THRESHOLD) -> Optional[Dict]:
+        """Insight for a week-over-week change (positive = emissions went down)."""
+        if change_percent > threshold:
+            return templates.insight('trend_down', percent=abs(change_percent))
+        if change_percent < -threshold:
+            return templates.insight('trend_up', percent=abs(change_percent))
+        return None
+    
+    def _personalize(self, user_id: Optional[str], totals: List[float], latest_date) -> Dict:
+        """
+        Thresholds and the expected range of the newest day for one user
+        (see FootprintModel.personalize); fixed thresholds without a model.
+        """
+        if self.model is None:
+            return {'changeThreshold': DEFAULT_CHANGE_THRESHOLD, 'varianceThreshold': DEFAULT_VARIANCE_THRESHOLD,
+                    'expected': None, 'lower': None, 'upper': None}
+        model = self.model.current()
+        if not model.trained or len(totals) <= MIN_PREVIOUS_DAYS or latest_date is None:
+            change, variance = model.thresholds(user_id)
+            return {'changeThreshold': change, 'varianceThreshold': variance,
+                    'expected': None, 'lower': None, 'upper': None}
+        
+        window = np.full((1, 7), np.nan)
+        window[0, :len(totals)] = totals[:7]
+        result = model.personalize([user_id], window, np.array([day_number(latest_date) % 7]))
+        return {key: float(values[0]) for key, values in result.items()}
+    
+    def _unusual_day_insight(self, templates: LocaleTemplates, total: Optional[float], expected: Optional[float],
+                             lower: Optional[float], upper: Optional[float]) -> Optional[Dict]:
+        """Insight when the newest day is outside the range the model expects for the user."""
+        if total is None or expected is None or np.isnan(expected):
+            return None
+        if total > upper:
+            return templates.insight('unusual_high', total=total, expected=expected)
+        if total < lower:
+            return templates.insight('unusual_low', total=total, expected=expected)
+        return None
+    
+    def _activity_rollup(self, user_id: Optional[str], activities, latest_date) -> Optional[Dict]:
+        """
+        Per-type activity totals for the week ending at `latest_date`: from
+        the activity store when the user has ingested activity, otherwise
+        from the request's activities.
+        """
+        as_of = day_number(latest_date) if latest_date else None
+        if self.activities is not None and user_id is not None:
+            stored = self.activities.activity(user_id)
+            if stored is not None:
+                return stored.rollup(ACTIVITY_WINDOW, as_of)
+        return rollup_events(activities, ACTIVITY_WINDOW, as_of) if activities else None
+    
+    def _activity_insights(self, templates: LocaleTemplates, rollup: Dict) -> List[Dict]:
+        """
+        Insights on activity types: the type with the largest share of the
+        week's activity emissions, and the type that changed most since the
+        week before.
+        """
         insights = []
+        types = rollup['types']
+        emitting = [(stats['total'], name) for name, stats in types.items() if stats['total'] > 0]
+        if len(emitting) >= 2:
+            total, name = max(emitting)
+            share = types[name]['share']
+            if share >= ACTIVITY_SHARE_THRESHOLD:
+                insights.append(templates.insight('activity_share', category=templates.term('activityTypes', name),
+                                                  percent=share, total=total))
+        
+        changes = [(abs(stats['changePercent']), name) for name, stats in types.items()
+                   if stats['changePercent'] is not None]
+        if changes:
+            size, name = max(changes)
+            if size >= ACTIVITY_CHANGE_THRESHOLD:
+                kind = 'activity_down' if types[name]['changePercent'] > 0 else 'activity_up'
+                insights.append(templates.insight(kind, category=templates.term('activityTypes', name),
+                                                  percent=size))
+        return insights
+    
+    def _analyze_trend_aggregates(self, templates: LocaleTemplates, trends: Dict, recent_emissions: List[float],
+                                  change_threshold: float = DEFAULT_CHANGE_THRESHOLD,
+                                  variance_threshold: float = DEFAULT_VARIANCE_THRESHOLD) -> List[Dict]:
+        """
+        Analyze weekly, monthly and quarterly trends from stored aggregates.
         
-        transportation = lifestyle.get('transportation', {})
-        energy = lifestyle.get('energy', {})
-        diet = lifestyle.get('diet', 'omnivore')
-        
-        # Transportation insights
-        if transportation.get('primaryMode') == 'car' and transportation.get('distancePerDay', 0) > 20:
-            insights.append({
-                'type': 'lifestyle',
-                'title': '🚗 High Travel Distance',
-                'description': f'You travel {transportation["distancePerDay"]}km daily by car. Consider carpooling or remote work days to reduce emissions.',
-                'sentiment': 'neutral',
-                'impact': 'high'
-            })
-        elif transportation.get('primaryMode') in ['bicycle', 'walking']:
-            insights.append({
-                'type': 'lifestyle',
-                'title': '🚴 Eco Transport Champion',
-                'description': 'Amazing! Your zero-emission transportation is making a real difference for the planet!',
-                'sentiment': 'positive',
-                'impact': 'high'
-            })
-        
-        # Energy insights
-        if energy.get('renewableEnergy'):
-            insights.append({
-                'type': 'lifestyle',
-                'title': '♻️ Clean Energy User',
-                'description': 'Excellent! Using renewable energy reduces your carbon footprint by up to 70%!',
-                'sentiment': 'positive',
-                'impact': 'high'
-            })
-        
-        # Diet insights
-        if diet in ['vegan', 'vegetarian']:
-            insights.append({
-                'type': 'lifestyle',
-                'title': '🌱 Plant-Based Hero',
-                'description': 'Your plant-based diet saves approximately 3-5kg CO₂ daily compared to a meat-heavy diet!',
-                'sentiment': 'positive',
-                'impact': 'high'
-            })
+        Until half of both weeks are tracked, the weekly trend comes from
+        `recent_emissions` (the last 7 daily totals, newest first) instead.
+        """
+        insights = []
+        windows = trends['windows']
+        
+        # Week over week, same thresholds as _analyze_trends
+        weekly = windows[7]
+        if weekly['changePercent'] is not None and min(weekly['days'], weekly['previousDays']) >= 7 // 2:
+            trend = self._weekly_trend_insight(templates, weekly['changePercent'], change_threshold)
+            if trend is not None:
+                insights.append(trend)
+            
+            if weekly['days'] >= 7 and weekly['variance'] < variance_threshold:  # Low variance = consistent
+                insights.append(templates.insight('consistency'))
+        else:
+            insights.extend(self._analyze_trends(templates, recent_emissions, change_threshold, variance_threshold))
+        
+        # Longer windows need most of both periods tracked to be meaningful
+        for window, period in ((30, 'month'), (90, 'quarter')):
+            stats = windows[window]
+            change_percent = stats['changePercent']
+            if change_percent is None or min(stats['days'], stats['previousDays']) < window // 2:
+                continue
+            if change_percent > 5:
+                insights.append(templates.insight(f'{period}_down', percent=change_percent, days=window))
+            elif change_percent < -5:
+                insights.append(templates.insight(f'{period}_up', percent=abs(change_percent), days=window))
         
         return insights
     
-    def _generate_category_recommendations(self, lifestyle: Dict, 
-                                          carbon_footprint: Dict) -> List[Dict]:
-        """Generate recommendations by category."""
-        recommendations = []
+    def _comparative_insights(self, templates: LocaleTemplates, user_id: Optional[str], daily: float) -> List[Dict]:
+        """
+        Insights on how the user compares with everyone in the population snapshot.
         
+        Users in the snapshot are ranked on their own 30-day means; others
+        are placed by their current daily footprint.
+        """
+        comparison = self.population.current().compare(user_id, daily)
+        if comparison is None:
+            return []
+        insights = []
+        total = comparison['total']
+        
+        top = self._top_label(total['topPercent'])
+        if top is not None:
+            insights.append(templates.insight('top_users', top=top, value=total['value'], lower=100 - top))
+        elif total['topPercent'] <= 50:
+            insights.append(templates.insight('better_than_most', lower=100 - total['topPercent'],
+                                              median=total['median']))
+        elif total['topPercent'] >= 75:
+            gaps = [(comparison[name]['value'] - comparison[name]['median'], name)
+                    for name in CATEGORIES if name in comparison]
+            gap, category = max(gaps) if gaps else (0, None)
+            focus = templates.text('catch_up_focus', category=templates.term('categories', category),
+                                   gap=gap) if gap > 0 else ''
+            above = int((total['rank'] - 1) / total['users'] * 100)
+            insights.append(templates.insight('room_to_catch_up', above=above, median=total['median'], focus=focus))
+        
+        # Best category, when it alone makes the top 10% of its peer group
+        best = min(((comparison[name]['topPercent'], name) for name in CATEGORIES if name in comparison),
+                   default=None)
+        if best is not None and top is None:
+            label = self._top_label(best[0])
+            if label is not None:
+                insights.append(templates.insight('top_peer', top=label, lower=100 - label,
+                                                  group=templates.term('peerGroups', best[1]),
+                                                  category=templates.term('categories', best[1])))
+        return insights
+    
+    def _top_label(self, top_percent: float) -> Optional[int]:
+        """Tightest "top N%" label that applies, if any."""
+        for label in TOP_PERCENT_LABELS:
+            if top_percent <= label:
+                return label
+        return None
+    
+    def _analyze_lifestyle(self, profile: Dict, locale: Optional[str] = None) -> List[Dict]:
+        """Analyze lifestyle patterns and generate insights."""
+        return self.rules.current()['lifestyle_insights'].evaluate_one(profile, locale=locale)
+    
+    def _generate_category_recommendations(self, profile: Dict, locale: Optional[str] = None) -> List[Dict]:
+        """Generate recommendations by category, highest potential saving first."""
+        return self.rules.current()['category_recommendations'].evaluate_one(profile, locale=locale)
+    
+    def _lifestyle_profile(self, lifestyle: Dict, carbon_footprint: Dict) -> Dict:
+        """Flatten lifestyle data into the features the insight rule sets read."""
         transportation = lifestyle.get('transportation', {})
         energy = lifestyle.get('energy', {})
-        diet = lifestyle.get('diet', 'omnivore')
-        
-        # Transportation recommendations
-        if transportation.get('primaryMode') == 'car':
-            recommendations.append({
-                'title': 'Try a Car-Free Day',
-                'description': 'Challenge yourself to use alternative transport one day this week. You could save 2-5kg CO₂!',
-                'category': 'transportation',
-                'difficulty': 'easy',
-                'potentialSaving': 3.5,
-                'timeframe': 'weekly'
-            })
-        
-        # Energy recommendations
-        if not energy.get('renewableEnergy'):
-            recommendations.append({
-                'title': 'Contact Your Energy Provider',
-                'description': 'Ask about renewable energy plans. It\'s often the same price and can cut emissions by 70%!',
-                'category': 'energy',
-                'difficulty': 'easy',
-                'potentialSaving': carbon_footprint.get('daily', 0) * 0.3,
-                'timeframe': 'one-time'
-            })
-        
-        if energy.get('electricityUsage', 0) > 10:
-            recommendations.append({
-                'title': 'Energy Audit',
-                'description': 'Your electricity usage is above average. Consider an energy audit to find savings opportunities.',
-                'category': 'energy',
-                'difficulty': 'medium',
-                'potentialSaving': 2.0,
-                'timeframe': 'monthly'
-            })
-        
-        # Diet recommendations
-        if diet in ['high_meat', 'omnivore']:
-            recommendations.append({
-                'title': 'Meatless Mondays',
-                'description': 'Start with one plant-based day per week. It\'s easier than you think and saves ~1kg CO₂ per day!',
-                'category': 'diet',
-                'difficulty': 'easy',
-                'potentialSaving': 1.0,
-                'timeframe': 'weekly'
-            })
-        
-        # Shopping recommendations
-        recommendations.append({
-            'title': 'Second-Hand First',
-            'description': 'Before buying new, check second-hand options. It reduces manufacturing emissions significantly!',
-            'category': 'shopping',
-            'difficulty': 'easy',
-            'potentialSaving': 1.5,
-            'timeframe': 'ongoing'
-        })
-        
-        return recommendations
+        return {
+            'primaryMode': transportation.get('primaryMode'),
+            'distancePerDay': transportation.get('distancePerDay', 0),
+            'renewableEnergy': bool(energy.get('renewableEnergy')),
+            'electricityUsage': energy.get('electricityUsage', 0),
+            'dietType': lifestyle.get('diet', 'omnivore'),
+            'daily': carbon_footprint.get('daily', 0)
+        }
     
-    def _generate_motivational_insights(self, recent_progress: List[Dict]) -> List[Dict]:
-        """Generate motivational insights based on achievements."""
+    def _generate_motivational_insights(self, templates: LocaleTemplates, total_saved: float,
+                                        consecutive_days: int) -> List[Dict]:
+        """Generate motivational insights from challenge savings and days tracked."""
         insights = []
         
-        if len(recent_progress) == 0:
+        if consecutive_days == 0:
             return insights
         
-        # Calculate total carbon saved from challenges
-        total_saved = 0
-        for progress in recent_progress:
-            challenges = progress.get('challengesCompleted', [])
-            for challenge in challenges:
-                total_saved += challenge.get('carbonSaved', 0)
-        
         if total_saved > 0:
-            trees_equivalent = int(total_saved / 21)  # A tree absorbs ~21kg CO₂/year
-            insights.append({
-                'type': 'achievement',
-                'title': '🌳 Impact Milestone',
-                'description': f'You\'ve saved {total_saved:.1f}kg CO₂! That\'s like planting {trees_equivalent} trees!',
-                'sentiment': 'positive',
-                'impact': 'high'
-            })
+            trees_equivalent = int(total_saved / TREE_ANNUAL_KG)
+            insights.append(templates.insight('milestone', saved=total_saved, trees=trees_equivalent))
         
         # Check for consecutive days
-        consecutive_days = len(recent_progress)
         if consecutive_days >= 7:
-            insights.append({
-                'type': 'streak',
-                'title': '🔥 Consistency Matters',
-                'description': f'{consecutive_days} days of tracking! Your commitment is making a real difference!',
-                'sentiment': 'positive',
-                'impact': 'medium'
-            })
+            insights.append(templates.insight('streak', days=consecutive_days))
         
         return insights
     
-    def generate_weekly_summary(self, weekly_data: List[Dict]) -> Dict:
+    def generate_weekly_summary(self, weekly_data: List[Dict], locale: Optional[str] = None) -> Dict:
         """Generate a comprehensive weekly summary."""
         if not weekly_data:
             return {'error': 'No data available'}
@@ -282,12 +576,14 @@ class InsightsGenerator:
             for day in weekly_data
         )
         
+        templates = self.templates.current().get(locale)
+        net = total_emissions - total_saved
         return {
-            'period': 'This Week',
+            'period': templates.text('weekly_period'),
             'totalEmissions': round(total_emissions, 2),
             'averageDaily': round(avg_daily, 2),
             'challengesCompleted': total_challenges,
             'carbonSaved': round(total_saved, 2),
-            'netImpact': round(total_emissions - total_saved, 2),
-            'summary': f'You emitted {total_emissions:.1f}kg CO₂ but saved {total_saved:.1f}kg through challenges. Net impact: {total_emissions - total_saved:.1f}kg CO₂.'
+            'netImpact': round(net, 2),
+            'summary': templates.text('weekly_summary', emitted=total_emissions, saved=total_saved, net=net)
         }
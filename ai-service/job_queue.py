@@ -0,0 +1,555 @@
+"""
+Job Queue
+Durable batch jobs in a local SQLite queue, run in chunks by a pool of worker processes.
+
+Usage:
+    python job_queue.py --workers 4     # run workers without the HTTP service
+"""
+
+import argparse
+import fcntl
+import importlib
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs', 'jobs.sqlite3')
+DEFAULT_HANDLERS = 'main:job_handlers'
+
+DEFAULT_WORKERS = min(2, os.cpu_count() or 1)
+
+# Users per chunk of an insights job (records per calculate chunk follow bulk_stream)
+DEFAULT_USERS_PER_CHUNK = 200
+
+# Seconds a claimed chunk stays with its worker before others may take it over
+DEFAULT_LEASE_SECONDS = 30.0
+
+# Claims of one chunk before its job is failed (a chunk that keeps killing workers)
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Finished jobs are deleted this many seconds after they finish
+DEFAULT_RETAIN_SECONDS = 86400
+
+# Seconds an idle worker waits before looking for work again
+POLL_INTERVAL = 0.2
+
+# Scheduling niceness added to worker processes, so jobs yield the CPU to interactive requests
+DEFAULT_WORKER_NICE = 10
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    items INTEGER NOT NULL,
+    chunks INTEGER NOT NULL,
+    done_chunks INTEGER NOT NULL DEFAULT 0,
+    done_items INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    items INTEGER NOT NULL,
+    input BLOB,
+    output BLOB,
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+CREATE INDEX IF NOT EXISTS chunks_pending ON chunks (job_id, seq) WHERE output IS NULL;
+"""
+
+# Chunk handler: (chunk input, index of its first item) -> one result per item
+Handler = Callable[[bytes, int], List[Dict]]
+
+
+def chunk_records(records: Sequence, size: int) -> List[Tuple[int, bytes]]:
+    """Split records into (first index, `{"records": [...]}` JSON) chunks of `size`."""
+    return [(start, orjson.dumps({'records': list(records[start:start + size])}))
+            for start in range(0, len(records), size)]
+
+
+def chunk_columns(columns: Dict[str, Optional[Sequence]], key: str, size: int,
+                  extra: Optional[Dict] = None) -> List[Tuple[int, bytes]]:
+    """
+    Split equally long columns into JSON chunks of `size` distinct `key` values.
+    
+    Rows of one key value always land in the same chunk, in their original
+    order; key values keep their order of first appearance. Each chunk also
+    carries `extra` fields, and `None` columns stay `None`.
+    
+    Returns:
+        (index of the chunk's first key value, chunk JSON) pairs
+    
+    Raises:
+        ValueError: If the columns have different lengths
+    """
+    lengths = {name: len(values) for name, values in columns.items() if values is not None}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"Columns must have equal lengths, got {lengths}")
+    rows: Dict[str, List[int]] = {}
+    for i, value in enumerate(columns[key]):
+        rows.setdefault(value, []).append(i)
+    groups = list(rows.values())
+    
+    chunks = []
+    for start in range(0, len(groups), size):
+        index = [i for group in groups[start:start + size] for i in group]
+        chunk = {name: None if values is None else [values[i] for i in index] for name, values in columns.items()}
+        chunks.append((start, orjson.dumps({**chunk, **(extra or {})})))
+    return chunks
+
+
+def load_handlers(spec: str) -> Dict[str, Handler]:
+    """Call a "module:function" returning job kind -> chunk handler."""
+    module, _, attr = spec.partition(':')
+    # Under "spawn" the parent's script is already imported as __mp_main__; reuse it instead of importing it twice
+    script = getattr(sys.modules.get('__mp_main__'), '__file__', None)
+    if module not in sys.modules and script and os.path.splitext(os.path.basename(script))[0] == module:
+        sys.modules[module] = sys.modules['__mp_main__']
+    return getattr(importlib.import_module(module), attr)()
+
+
+class Claim:
+    """A chunk leased to one worker."""
+    
+    __slots__ = ('job_id', 'seq', 'start', 'items', 'kind', 'input')
+    
+    def __init__(self, job_id: str, seq: int, start: int, items: int, kind: str, input: bytes):
+        self.job_id = job_id
+        self.seq = seq
+        self.start = start
+        self.items = items
+        self.kind = kind
+        self.input = input
+
+
+class JobQueue:
+    """
+    Jobs and their chunks in one SQLite database, shared by every process on the host.
+    
+    A job is stored as input chunks when it is submitted. Workers lease one
+    chunk at a time and write its output back in the same transaction that
+    advances the job, so each finished chunk is a checkpoint: after a crash
+    only the chunks that were leased at the time run again, once their
+    lease expires or the pool releases it.
+    """
+    
+    def __init__(self, path: str, lease_seconds: Optional[float] = None, max_attempts: Optional[int] = None,
+                 retain_seconds: Optional[float] = None):
+        self.path = path
+        self.lease_seconds = float(os.getenv('JOB_LEASE_SECONDS', DEFAULT_LEASE_SECONDS)
+                                   if lease_seconds is None else lease_seconds)
+        self.max_attempts = int(os.getenv('JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+                                if max_attempts is None else max_attempts)
+        self.retain_seconds = float(os.getenv('JOB_RETAIN_SECONDS', DEFAULT_RETAIN_SECONDS)
+                                    if retain_seconds is None else retain_seconds)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+    
+    @classmethod
+    def from_env(cls) -> Optional['JobQueue']:
+        """Queue at JOB_QUEUE_PATH (default data/jobs/jobs.sqlite3); None when it is set empty."""
+        path = os.getenv('JOB_QUEUE_PATH', DEFAULT_QUEUE_PATH)
+        return cls(path) if path else None
+    
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection; connections are not shared across threads or forks."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+    
+    def _transaction(self):
+        """Write transaction that takes the database lock up front, so claims never race."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        return _Transaction(connection)
+    
+    def submit(self, kind: str, chunks: Sequence[Tuple[int, bytes]], items: int) -> str:
+        """
+        Store a job as input chunks and queue it.
+        
+        Args:
+            kind: Job kind, the name of the worker handler that runs its chunks
+            chunks: (index of the first item, input) per chunk
+            items: Number of results the job produces
+        
+        Returns:
+            The job id
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        sizes = [(chunks[i + 1][0] if i + 1 < len(chunks) else items) - start for i, (start, _) in enumerate(chunks)]
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT INTO jobs (id, kind, status, items, chunks, created, finished) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, 'queued' if chunks else 'completed', items, len(chunks), now, None if chunks else now)
+            )
+            connection.executemany(
+                'INSERT INTO chunks (job_id, seq, start, items, input) VALUES (?, ?, ?, ?, ?)',
+                [(job_id, seq, start, size, data) for seq, ((start, data), size) in enumerate(zip(chunks, sizes))]
+            )
+        return job_id
+    
+    def claim(self, owner: str) -> Optional[Claim]:
+        """
+        Lease the oldest unfinished chunk of an active job to `owner`.
+        
+        Chunks whose lease expired are taken over. A chunk that has already
+        been claimed `max_attempts` times fails its job instead.
+        """
+        while True:
+            now = time.time()
+            with self._transaction() as connection:
+                row = connection.execute(
+                    'SELECT c.job_id, c.seq, c.start, c.items, c.attempts, j.kind, c.input '
+                    'FROM jobs j JOIN chunks c ON c.job_id = j.id '
+                    "WHERE j.status IN ('queued', 'running') AND c.output IS NULL "
+                    'AND (c.lease_until IS NULL OR c.lease_until < ?) '
+                    'ORDER BY j.created, c.seq LIMIT 1',
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, seq, start, items, attempts, kind, data = row
+                if attempts >= self.max_attempts:
+                    self._finish(connection, job_id, 'failed',
+                                 f'Chunk {seq} did not finish after {attempts} attempts')
+                    continue
+                connection.execute(
+                    'UPDATE chunks SET owner = ?, lease_until = ?, attempts = attempts + 1 WHERE job_id = ? AND seq = ?',
+                    (owner, now + self.lease_seconds, job_id, seq)
+                )
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', started = ? WHERE id = ? AND status = 'queued'",
+                    (now, job_id)
+                )
+                return Claim(job_id, seq, start, items, kind, data)
+    
+    def complete(self, claim: Claim, output: bytes, owner: str) -> bool:
+        """
+        Checkpoint a claimed chunk's output and advance its job.
+        
+        Returns:
+            False if the lease was lost to another worker (the output is discarded)
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            updated = connection.execute(
+                'UPDATE chunks SET output = ?, input = NULL, owner = NULL, lease_until = NULL '
+                'WHERE job_id = ? AND seq = ? AND owner = ? AND output IS NULL',
+                (output, claim.job_id, claim.seq, owner)
+            ).rowcount
+            if not updated:
+                return False
+            connection.execute(
+                'UPDATE jobs SET done_chunks = done_chunks + 1, done_items = done_items + ? WHERE id = ?',
+                (claim.items, claim.job_id)
+            )
+            connection.execute(
+                "UPDATE jobs SET status = 'completed', finished = ? "
+                "WHERE id = ? AND status = 'running' AND done_chunks >= chunks",
+                (now, claim.job_id)
+            )
+        return True
+    
+    def fail(self, claim: Claim, error: str) -> None:
+        """Fail a claimed chunk's job; its other chunks are not run."""
+        with self._transaction() as connection:
+            self._finish(connection, claim.job_id, 'failed', f'Chunk {claim.seq} failed: {error}')
+    
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Chunks already leased finish, but nothing new starts."""
+        with self._transaction() as connection:
+            if not self._finish(connection, job_id, 'cancelled', None):
+                return connection.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone() is not None
+        return True
+    
+    def _finish(self, connection: sqlite3.Connection, job_id: str, status: str, error: Optional[str]) -> bool:
+        return connection.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+            (status, error, time.time(), job_id)
+        ).rowcount > 0
+    
+    def release(self, owners: Iterable[str]) -> int:
+        """Hand the chunks leased to `owners` (workers known to be gone) back immediately."""
+        owners = list(owners)
+        if not owners:
+            return 0
+        with self._transaction() as connection:
+            return connection.execute(
+                f'UPDATE chunks SET owner = NULL, lease_until = NULL '
+                f'WHERE output IS NULL AND owner IN ({", ".join("?" * len(owners))})',
+                owners
+            ).rowcount
+    
+    def leased_owners(self) -> List[str]:
+        return [row[0] for row in self._connection().execute(
+            'SELECT DISTINCT owner FROM chunks WHERE owner IS NOT NULL AND output IS NULL'
+        )]
+    
+    def purge(self) -> int:
+        """Delete jobs that finished more than `retain_seconds` ago."""
+        cutoff = time.time() - self.retain_seconds
+        with self._transaction() as connection:
+            expired = [row[0] for row in connection.execute(
+                "SELECT id FROM jobs WHERE finished IS NOT NULL AND finished < ?", (cutoff,)
+            )]
+            for job_id in expired:
+                connection.execute('DELETE FROM chunks WHERE job_id = ?', (job_id,))
+                connection.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        return len(expired)
+    
+    def job(self, job_id: str) -> Optional[Dict]:
+        """A job's status and progress, or None if it does not exist."""
+        row = self._connection().execute(
+            'SELECT id, kind, status, items, chunks, done_chunks, done_items, error, created, started, finished '
+            'FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, items, chunks, done_chunks, done_items, error, created, started, finished = row
+        return {
+            'jobId': job_id,
+            'kind': kind,
+            'status': status,
+            'items': items,
+            'doneItems': done_items,
+            'chunks': chunks,
+            'doneChunks': done_chunks,
+            'progress': round(done_chunks / chunks, 4) if chunks else 1.0,
+            'error': error,
+            'created': created,
+            'started': started,
+            'finished': finished
+        }
+    
+    def outputs(self, job_id: str, start_seq: int = 0) -> List[Tuple[int, bytes]]:
+        """Consecutive finished chunk outputs from `start_seq` on, up to the first unfinished chunk."""
+        rows = self._connection().execute(
+            'SELECT seq, output FROM chunks WHERE job_id = ? AND seq >= ? ORDER BY seq',
+            (job_id, start_seq)
+        ).fetchall()
+        done = []
+        for seq, output in rows:
+            if output is None:
+                break
+            done.append((seq, output))
+        return done
+    
+    def stats(self) -> Dict:
+        connection = self._connection()
+        counts = dict(connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        pending, leased = connection.execute(
+            'SELECT COUNT(*), COUNT(owner) FROM chunks c JOIN jobs j ON j.id = c.job_id '
+            "WHERE c.output IS NULL AND j.status IN ('queued', 'running')"
+        ).fetchone()
+        return {
+            'path': self.path,
+            'jobs': {status: counts.get(status, 0) for status in ('queued', 'running', 'completed', 'failed',
+                                                                  'cancelled')},
+            'pendingChunks': pending,
+            'leasedChunks': leased,
+            'bytes': sum(os.path.getsize(p) for p in (self.path, self.path + '-wal') if os.path.exists(p))
+        }
+
+
+class _Transaction:
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+    
+    def __enter__(self) -> sqlite3.Connection:
+        return self.connection
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def worker_id(pid: Optional[int] = None) -> str:
+    return f'{socket.gethostname()}:{pid or os.getpid()}'
+
+
+def run_worker(path: str, handlers: str, stop=None, parent_pid: Optional[int] = None) -> None:
+    """
+    Run chunks from the queue at `path` until `stop` is set or the parent process exits.
+    
+    Args:
+        path: Queue database
+        handlers: "module:function" returning job kind -> chunk handler
+        stop: Event that ends the loop (checked between chunks)
+        parent_pid: Exit when this is no longer the parent process (orphaned worker)
+    """
+    nice = int(os.getenv('JOB_WORKER_NICE', DEFAULT_WORKER_NICE))
+    if nice > 0 and hasattr(os, 'nice'):
+        os.nice(nice)
+    queue = JobQueue(path)
+    kinds = load_handlers(handlers)
+    owner = worker_id()
+    next_purge = 0.0
+    while not (stop is not None and stop.is_set()):
+        if parent_pid is not None and os.getppid() != parent_pid:
+            return
+        claim = queue.claim(owner)
+        if claim is None:
+            if time.monotonic() >= next_purge:
+                queue.purge()
+                next_purge = time.monotonic() + 60
+            if stop is not None:
+                stop.wait(POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+            continue
+        try:
+            if claim.kind not in kinds:
+                raise ValueError(f"No handler for job kind '{claim.kind}'")
+            results = kinds[claim.kind](claim.input, claim.start)
+            output = b''.join(orjson.dumps(item) + b'\n' for item in results)
+        except Exception as e:
+            queue.fail(claim, str(e))
+            continue
+        queue.complete(claim, output, owner)
+
+
+class JobWorkerPool:
+    """
+    Worker processes running queued job chunks, supervised by one owning process.
+    
+    Only one process per queue owns a pool (an exclusive lock next to the
+    database), so every pre-fork HTTP worker may call `start()`. Workers are
+    started with "spawn" and build their handlers by importing `handlers`.
+    A worker that dies is replaced and its leased chunk is handed back at
+    once, as are chunks leased by an earlier pool when the pool starts.
+    """
+    
+    def __init__(self, path: str, handlers: str = DEFAULT_HANDLERS, processes: Optional[int] = None):
+        self.path = path
+        self.handlers = handlers
+        self.processes = int(os.getenv('JOB_WORKERS', DEFAULT_WORKERS) if processes is None else processes)
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = self._context.Event()
+        self._workers: List = []
+        self._lock_fd: Optional[int] = None
+        self._supervisor: Optional[threading.Thread] = None
+        self.restarts = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._supervisor is not None
+    
+    def start(self) -> bool:
+        """Start the workers unless another process owns the pool; True if this process does."""
+        if self.processes <= 0 or self.running:
+            return self.running
+        queue = JobQueue(self.path)
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        
+        # Holding the lock means every worker leasing chunks on this host belonged to a pool that is gone.
+        # Orphaned workers still finishing a chunk exit afterwards, and their output is discarded
+        host = socket.gethostname()
+        queue.release(owner for owner in queue.leased_owners() if owner.rpartition(':')[0] == host)
+        
+        self._stop.clear()
+        self._workers = [self._spawn() for _ in range(self.processes)]
+        self._supervisor = threading.Thread(target=self._supervise, args=(queue,), name='job-pool', daemon=True)
+        self._supervisor.start()
+        return True
+    
+    def _spawn(self):
+        process = self._context.Process(target=run_worker, args=(self.path, self.handlers, self._stop, os.getpid()),
+                                        name='job-worker', daemon=True)
+        process.start()
+        return process
+    
+    def _supervise(self, queue: JobQueue) -> None:
+        while not self._stop.wait(1.0):
+            for i, process in enumerate(self._workers):
+                if process.is_alive():
+                    continue
+                queue.release([worker_id(process.pid)])
+                self._workers[i] = self._spawn()
+                self.restarts += 1
+    
+    def stop(self, timeout: float = 10.0) -> None:
+        """Let workers finish their current chunk, then stop them and release ownership."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._supervisor.join()
+        self._supervisor = None
+        deadline = time.monotonic() + timeout
+        for process in self._workers:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._workers = []
+        os.close(self._lock_fd)
+        self._lock_fd = None
+    
+    def stats(self) -> Dict:
+        return {
+            'owner': self.running,
+            'processes': self.processes,
+            'alive': sum(process.is_alive() for process in self._workers),
+            'restarts': self.restarts
+        }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run job queue workers without the HTTP service.")
+    parser.add_argument('--path', default=os.getenv('JOB_QUEUE_PATH') or DEFAULT_QUEUE_PATH,
+                        help="Queue database (default: JOB_QUEUE_PATH or data/jobs/jobs.sqlite3)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: JOB_WORKERS or 2)")
+    parser.add_argument('--handlers', default=DEFAULT_HANDLERS,
+                        help=f"module:function returning the chunk handlers (default: {DEFAULT_HANDLERS})")
+    args = parser.parse_args(argv)
+    
+    pool = JobWorkerPool(args.path, args.handlers, args.workers)
+    if not pool.start():
+        print(f"Another process already runs the workers for {args.path}", file=sys.stderr)
+        return 1
+    print(f"Running {pool.processes} job workers on {args.path}", flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
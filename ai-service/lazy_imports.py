@@ -0,0 +1,28 @@
+"""
+Lazy Imports
+Defers importing heavy modules until their first use, to keep service start-up fast.
+"""
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+    
+    The import copies the module's attributes onto the stand-in, so later
+    lookups cost the same as on the real module. Concurrent first uses are
+    safe: the import system's per-module lock makes them wait for one import.
+    """
+    
+    def __getattr__(self, name: str):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(vars(module))
+        return getattr(module, name)
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """The module itself if already imported, otherwise a LazyModule for it."""
+    return sys.modules.get(name) or LazyModule(name)
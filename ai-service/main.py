@@ -1,21 +1,80 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict
+from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
+import importlib
 import os
+import orjson
 from dotenv import load_dotenv
 
-from carbon_calculator import CarbonCalculator
+from activity_store import ActivityStore
+from admission import AdmissionMiddleware
+from bulk_stream import DEFAULT_CHUNK_SIZE, aiter_results
+from calculation_cache import CalculationCache
+from carbon_calculator import CarbonCalculator, format_calculation
+from coalescer import CalculationCoalescer
+from cpu_pool import admission, run_cpu
+from emission_factors import EmissionFactorRegistry
+from footprint_model import FootprintModelRegistry
+from history_store import HistoryStore, NoHistory
+from http_metrics import InstrumentedRoute, MetricsMiddleware
+from insight_templates import TemplateRegistry
 from insights_generator import InsightsGenerator
+from job_queue import (ACTIVE_STATUSES as ACTIVE_JOB_STATUSES, DEFAULT_USERS_PER_CHUNK, JobQueue, JobWorkerPool,
+                       POLL_INTERVAL as JOB_POLL_INTERVAL, chunk_columns, chunk_records)
+from metrics import render_metrics, stage, start_flusher
+from population_snapshot import COLUMNS as POPULATION_COLUMNS, PopulationRegistry
+from profiler import SamplingProfiler
+from projection import DEFAULT_LEVEL, DEFAULT_MONTHS, ProjectionEngine
+from request_objects import (InsightsInput, ValidationError, parse_activity_batch, parse_batch_request,
+                             parse_carbon_request, parse_insights_request)
+from rule_engine import RuleRegistry
+from savings_plan import DEFAULT_MAX_EFFORT
+from server import default_workers, serve
+from trend_store import WINDOWS as TREND_WINDOWS, TrendStore, day_number
+from uncertainty import MAX_SAMPLES as MAX_UNCERTAINTY_SAMPLES
+from warmup import Warmup, warmup_mode
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # With several workers, each one publishes its histograms for /metrics to merge
+    start_flusher()
+    # Under the pre-fork server the parent already warmed up before forking
+    mode = warmup_mode()
+    if mode == 'off':
+        warmup.skip()
+    elif mode == 'blocking':
+        warmup.run()
+    else:
+        warmup.start()
+    # One process per queue owns the job workers; the other pre-fork workers only submit and read
+    if job_queue is not None:
+        job_workers.start()
+    yield
+    if job_queue is not None:
+        job_workers.stop()
+
+
 app = FastAPI(
     title="EcoStep AI Service",
     description="AI-powered carbon footprint calculation and personalized eco insights",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
+# Time validation and serialization around every endpoint
+app.router.route_class = InstrumentedRoute
+
+# Priority classes and load shedding in front of the CPU pool
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 # CORS middleware
 app.add_middleware(
@@ -25,10 +84,77 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Initialize services
-calculator = CarbonCalculator()
-insights_gen = InsightsGenerator()
+emission_factors = EmissionFactorRegistry()
+recommendation_rules = RuleRegistry()
+calculation_cache = CalculationCache()
+calculator = CarbonCalculator(factors=emission_factors, cache=calculation_cache, rules=recommendation_rules)
+coalescer = CalculationCoalescer(calculator)
+population = PopulationRegistry()
+footprint_model = FootprintModelRegistry()
+insight_templates = TemplateRegistry()
+activity_store = ActivityStore.from_env()
+insights_gen = InsightsGenerator(rules=recommendation_rules, population=population, model=footprint_model,
+                                 templates=insight_templates, activities=activity_store)
+projection_engine = ProjectionEngine(population=population)
+trend_store = TrendStore()
+history_store = HistoryStore.from_env(trends=trend_store)
+profiler = SamplingProfiler()
+job_queue = JobQueue.from_env()
+job_workers = JobWorkerPool(job_queue.path) if job_queue is not None else None
+
+
+# Startup warm-up: every step exercises a request path once with sample data,
+# without touching the calculation cache, history or trend stores
+warmup = Warmup()
+_WARMUP_LIFESTYLE = {
+    "transportation": {"primaryMode": "car", "distancePerDay": 20},
+    "energy": {"electricityUsage": 10, "gasUsage": 5, "renewableEnergy": False},
+    "diet": "omnivore",
+    "shopping": {"clothesPerMonth": 2, "electronicsPerYear": 1}
+}
+_WARMUP_DATES = [f"2024-01-{day:02d}" for day in range(1, 15)]
+_WARMUP_TOTALS = [15.0 + day % 3 for day in range(14)]
+
+
+@warmup.step('imports')
+def _warm_imports():
+    # Dependencies loaded lazily on first use
+    importlib.import_module('pandas')
+
+
+@warmup.step('data')
+def _warm_data():
+    for registry in (emission_factors, recommendation_rules, insight_templates, population, footprint_model):
+        registry.current()
+
+
+@warmup.step('calculate')
+def _warm_calculate():
+    lifestyle = parse_carbon_request(orjson.dumps(_WARMUP_LIFESTYLE))
+    uncached = CarbonCalculator(factors=emission_factors, rules=recommendation_rules)
+    result = uncached.calculate_lifestyle(lifestyle)
+    uncached.calculate_lifestyles([lifestyle, lifestyle])
+    ORJSONResponse({"success": True, **format_calculation(result)})
+
+
+@warmup.step('insights')
+def _warm_insights():
+    request = parse_insights_request(orjson.dumps({
+        "lifestyle": _WARMUP_LIFESTYLE,
+        "carbonFootprint": {"daily": 15.0},
+        "recentProgress": [{"date": date, "carbonData": {"total": total}, "activities": []}
+                           for date, total in zip(reversed(_WARMUP_DATES), reversed(_WARMUP_TOTALS))]
+    }))
+    insights_gen.generate_request(request)
+    insights_gen.generate_batch(["warmup"] * len(_WARMUP_DATES), _WARMUP_DATES, _WARMUP_TOTALS)
+
+
+@warmup.step('projection')
+def _warm_projection():
+    projection_engine.project(["warmup"] * len(_WARMUP_DATES), _WARMUP_DATES, _WARMUP_TOTALS, months=2)
 
 
 # Request/Response Models
@@ -41,6 +167,7 @@ class EnergyData(BaseModel):
     electricityUsage: float
     gasUsage: float
     renewableEnergy: bool
+    region: Optional[str] = None
 
 
 class LifestyleData(BaseModel):
@@ -57,6 +184,24 @@ class CarbonRequest(BaseModel):
     shopping: Dict
 
 
+class CarbonBatchRequest(BaseModel):
+    records: List[CarbonRequest]
+
+
+class SweepRequest(BaseModel):
+    baseline: CarbonRequest
+    scenarios: Optional[List[Dict]] = None
+    grid: Optional[Dict[str, List]] = None
+    limit: Optional[int] = None
+
+
+class SavingsPlanRequest(BaseModel):
+    baseline: CarbonRequest
+    maxEffort: float = DEFAULT_MAX_EFFORT
+    levers: Optional[List[str]] = None
+    limit: Optional[int] = None
+
+
 class ActivityData(BaseModel):
     type: str
     description: str
@@ -68,12 +213,118 @@ class ProgressData(BaseModel):
     date: str
     carbonData: Dict
     activities: List[ActivityData]
+    challengesCompleted: List[Dict] = []
+
+
+class ProgressDelta(BaseModel):
+    date: str
+    carbonData: Dict
+    activities: List[ActivityData] = []
+    challengesCompleted: List[Dict] = []
 
 
 class InsightsRequest(BaseModel):
     lifestyle: LifestyleData
-    recentProgress: List[ProgressData]
+    recentProgress: Optional[List[ProgressData]] = None
     carbonFootprint: Dict
+    userId: Optional[str] = None
+    # Delta form, sent instead of recentProgress: only the newest days
+    latest: Optional[List[ProgressDelta]] = None
+    # Language of insight and recommendation texts, e.g. "es" or "fr-CA" (default: English)
+    locale: Optional[str] = None
+
+
+class BatchInsightsRequest(BaseModel):
+    userIds: List[str]
+    dates: List[str]
+    totals: List[float]
+    carbonSaved: Optional[List[float]] = None
+    challengesCompleted: Optional[List[int]] = None
+    locale: Optional[str] = None
+
+
+class DailyTotal(BaseModel):
+    date: str
+    total: float
+
+
+class TrendRecordRequest(BaseModel):
+    records: List[DailyTotal]
+
+
+class HistoryDay(BaseModel):
+    date: str
+    total: float
+    carbonSaved: float = 0
+    challengesCompleted: int = 0
+
+
+class HistoryRecordRequest(BaseModel):
+    records: List[HistoryDay]
+
+
+class PopulationSnapshotRequest(BaseModel):
+    userIds: List[str]
+    dates: List[str]
+    transportation: Optional[List[float]] = None
+    energy: Optional[List[float]] = None
+    diet: Optional[List[float]] = None
+    shopping: Optional[List[float]] = None
+    total: Optional[List[float]] = None
+
+
+class PlannedChallenge(BaseModel):
+    startDate: str
+    endDate: Optional[str] = None
+    dailySaving: float
+    userId: Optional[str] = None
+
+
+class ProjectionRequest(BaseModel):
+    months: int = DEFAULT_MONTHS
+    level: float = DEFAULT_LEVEL
+    start: Optional[str] = None
+    targetAnnual: Optional[float] = None
+    challenges: Optional[List[PlannedChallenge]] = None
+
+
+class BatchProjectionRequest(ProjectionRequest):
+    userIds: List[str]
+    # Columnar history; without it the users' stored history is used
+    dates: Optional[List[str]] = None
+    totals: Optional[List[float]] = None
+
+
+def _json_body(model) -> Dict:
+    """
+    OpenAPI request body for an endpoint that validates `model`-shaped JSON
+    itself, with nested model definitions inlined.
+    """
+    schema = model.model_json_schema()
+    definitions = schema.pop('$defs', {})
+    
+    def inline(node):
+        if isinstance(node, dict):
+            if '$ref' in node:
+                return inline(definitions[node['$ref'].rsplit('/', 1)[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+    
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": inline(schema)}}}}
+
+
+def _parse(parse: Callable, body: bytes):
+    """
+    Validate a raw request body straight into request objects.
+    Invalid bodies get the same 422 response as pydantic-validated routes.
+    """
+    with stage('parse'):
+        try:
+            return parse(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors)
 
 
 @app.get("/")
@@ -93,61 +344,672 @@ async def health_check():
     }
 
 
-@app.post("/calculate")
-async def calculate_carbon_footprint(data: CarbonRequest):
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 503 until the startup warm-up has finished, then 200.
+    Unlike /health, which only says the process is up.
+    """
+    status = warmup.status()
+    return ORJSONResponse({"status": "ready" if status["ready"] else "warming", **status},
+                          status_code=200 if status["ready"] else 503)
+
+
+def _check_samples(samples: Optional[int]) -> None:
+    if samples is not None and not 1 <= samples <= MAX_UNCERTAINTY_SAMPLES:
+        raise HTTPException(status_code=400, detail=f"samples must be between 1 and {MAX_UNCERTAINTY_SAMPLES}")
+
+
+@app.post("/calculate", openapi_extra=_json_body(CarbonRequest))
+async def calculate_carbon_footprint(request: Request, uncertainty: bool = False, samples: Optional[int] = None,
+                                     seed: Optional[int] = None):
     """
     Calculate carbon footprint based on lifestyle data.
     Returns daily, weekly, monthly estimates and breakdown by category.
+    Concurrent requests are coalesced (identical ones share one calculation).
+    With `uncertainty`, p5/p50/p95 bands from sampled emission factors are added.
     """
+    _check_samples(samples)
+    lifestyle = _parse(parse_carbon_request, await request.body())
     try:
-        result = calculator.calculate(
-            transportation=data.transportation.dict(),
-            energy=data.energy.dict(),
-            diet=data.diet,
-            shopping=data.shopping
-        )
+        result = await coalescer.calculate(lifestyle)
+        response = {"success": True, **format_calculation(result)}
+        if uncertainty:
+            response["uncertainty"] = (await run_cpu(calculator.uncertainty_lifestyles, [lifestyle], samples, seed))[0]
         
+        return ORJSONResponse(response)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Calculation error: {str(e)}")
+
+
+@app.post("/calculate/batch", openapi_extra=_json_body(CarbonBatchRequest))
+async def calculate_carbon_footprint_batch(request: Request, uncertainty: bool = False,
+                                           samples: Optional[int] = None, seed: Optional[int] = None):
+    """
+    Calculate carbon footprints for many lifestyle records in one vectorized pass.
+    Results are returned in request order and match `/calculate` per record.
+    With `uncertainty`, every record's bands come from the same factor samples.
+    """
+    _check_samples(samples)
+    lifestyles = await run_cpu(_parse, parse_batch_request, await request.body())
+    try:
+        results = await run_cpu(calculator.calculate_lifestyles, lifestyles)
+        results = [format_calculation(result) for result in results]
+        if uncertainty:
+            bands = await run_cpu(calculator.uncertainty_lifestyles, lifestyles, samples, seed)
+            for result, band in zip(results, bands):
+                result["uncertainty"] = band
+        
+        return ORJSONResponse({
+            "success": True,
+            "count": len(results),
+            "results": results
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch calculation error: {str(e)}")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response that reads the request body while it writes.
+    
+    StreamingResponse listens for client disconnects by calling `receive`,
+    which would swallow request body messages; here the body reader owns
+    `receive` and surfaces disconnects itself.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/calculate/stream")
+async def calculate_carbon_footprint_stream(request: Request, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Calculate carbon footprints for a newline-delimited JSON stream of records.
+    Records are processed in fixed-size chunks and results streamed back as NDJSON,
+    one line per input record, so memory stays constant regardless of input size.
+    """
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be at least 1")
+    
+    return DuplexStreamingResponse(
+        aiter_results(calculator, request.stream(), chunk_size=chunk_size, run=run_cpu),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.get("/emission-factors")
+async def get_emission_factors():
+    """Describe the active emission factor table."""
+    return {
+        "success": True,
+        **emission_factors.current().describe()
+    }
+
+
+@app.post("/emission-factors/reload")
+async def reload_emission_factors():
+    """
+    Reload the emission factor table from disk without restarting the service.
+    Tables are also picked up automatically when the file changes.
+    """
+    try:
+        table = emission_factors.reload()
         return {
             "success": True,
-            "daily": result["daily"],
-            "weekly": result["daily"] * 7,
-            "monthly": result["daily"] * 30,
-            "breakdown": result["breakdown"],
-            "recommendations": result.get("recommendations", [])
+            **table.describe()
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Calculation error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Emission factor reload error: {str(e)}")
+
+
+@app.get("/rules")
+async def get_rules():
+    """Describe the active recommendation rule book."""
+    return {
+        "success": True,
+        **recommendation_rules.current().describe()
+    }
+
+
+@app.post("/rules/reload")
+async def reload_rules():
+    """
+    Recompile recommendation rules from disk without restarting the service.
+    Rules are also picked up automatically when the file changes.
+    """
+    try:
+        rules = recommendation_rules.reload()
+        return {
+            "success": True,
+            **rules.describe()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Rule reload error: {str(e)}")
+
+
+@app.get("/templates")
+async def get_templates():
+    """Describe the active insight templates: version, locales and template names."""
+    return {
+        "success": True,
+        **insight_templates.current().describe()
+    }
+
+
+@app.post("/templates/reload")
+async def reload_templates():
+    """
+    Recompile insight templates from disk without restarting the service.
+    Templates are also picked up automatically when the file changes.
+    """
+    try:
+        templates = insight_templates.reload()
+        return {
+            "success": True,
+            **templates.describe()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Template reload error: {str(e)}")
+
+
+@app.get("/model")
+async def get_model():
+    """Describe the active footprint model (untrained until an artifact is published)."""
+    return {
+        "success": True,
+        **footprint_model.current().stats()
+    }
+
+
+@app.post("/model/reload")
+async def reload_model():
+    """
+    Load the footprint model artifact from disk without restarting the service.
+    A retrained artifact is also picked up automatically when the file changes.
+    """
+    try:
+        model = footprint_model.reload()
+        return {
+            "success": True,
+            **model.stats()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload error: {str(e)}")
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Request and stage latency histograms in Prometheus text format.
+    Stages: validation, parse, calculate, recommendations, trend_store,
+    trends, activities, activity_store, motivation and serialization.
+    Also admission queue depth, in-flight requests and shed counts per class.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/profiler")
+async def get_profiler_status():
+    """State of the sampling profiler in this worker."""
+    return {
+        "success": True,
+        **profiler.status()
+    }
 
 
-@app.post("/insights")
-async def generate_insights(data: InsightsRequest):
+@app.post("/profiler/start")
+async def start_profiler(interval_ms: float = 5.0, seconds: Optional[float] = None):
+    """
+    Start sampling all thread stacks every `interval_ms` milliseconds.
+    Stops by itself after `seconds` (at most 10 minutes) or on /profiler/stop.
+    """
+    try:
+        status = profiler.start(interval=interval_ms / 1000, duration=seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "success": True,
+        **status
+    }
+
+
+@app.post("/profiler/stop")
+async def stop_profiler():
+    """Stop the sampling profiler; collected stacks stay available."""
+    return {
+        "success": True,
+        **await run_cpu(profiler.stop)
+    }
+
+
+@app.get("/profiler/stacks")
+async def get_profiler_stacks():
+    """
+    Collected stacks in folded format (`frame;frame;... count`), ready for
+    flamegraph.pl or speedscope.
+    """
+    return PlainTextResponse(profiler.folded())
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit, miss and eviction counters for the calculation cache."""
+    return {
+        "success": True,
+        **calculation_cache.stats()
+    }
+
+
+@app.get("/coalescer/stats")
+async def get_coalescer_stats():
+    """Coalesced requests and micro-batches of `/calculate`."""
+    return {
+        "success": True,
+        **coalescer.stats()
+    }
+
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """Per-class in-flight requests, queued CPU calls and shed counts of this worker."""
+    return {
+        "success": True,
+        **admission().stats()
+    }
+
+
+@app.post("/cache/clear")
+async def clear_cache():
+    """Drop all cached calculation results."""
+    calculation_cache.clear()
+    return {
+        "success": True,
+        **calculation_cache.stats()
+    }
+
+
+def _generate_insights(request: InsightsInput) -> Dict:
+    # With a user id, the request days go to the history store, which also
+    # feeds the incremental trend aggregates. Unchanged days are not written
+    # again, so re-sending recent progress is idempotent.
+    trends = None
+    history = None
+    if request.user_id:
+        with stage('history_store'):
+            if request.delta and request.user_id not in history_store:
+                raise NoHistory("No stored history for user; send recentProgress")
+            history_store.append(request.user_id, [(day.date, day.total, day.saved, day.challenges)
+                                                  for day in request.progress])
+            if request.delta:
+                history = history_store.history(request.user_id, days=7)
+            trends = trend_store.snapshot(request.user_id)
+    
+    return insights_gen.generate_request(request, trends=trends, history=history)
+
+
+@app.post("/insights", openapi_extra=_json_body(InsightsRequest))
+async def generate_insights(request: Request):
     """
     Generate personalized AI insights and recommendations
     based on user's lifestyle and progress history.
+    
+    With a userId, `latest` (the newest days) can replace `recentProgress`;
+    earlier days then come from the stored history (404 if there is none).
     """
+    data = await run_cpu(_parse, parse_insights_request, await request.body())
     try:
-        insights = insights_gen.generate(
-            lifestyle=data.lifestyle.dict(),
-            recent_progress=[p.dict() for p in data.recentProgress],
-            carbon_footprint=data.carbonFootprint
-        )
+        insights = await run_cpu(_generate_insights, data)
         
-        return {
+        return ORJSONResponse({
             "success": True,
             "insights": insights["insights"],
             "recommendations": insights["recommendations"]
-        }
+        })
+    except NoHistory as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Insights generation error: {str(e)}")
 
 
+@app.post("/insights/batch")
+async def generate_insights_batch(data: BatchInsightsRequest):
+    """
+    Generate progress insights and weekly summaries for many users in one call.
+    Input is columnar: one entry per progress day in each list.
+    """
+    try:
+        users = await run_cpu(
+            insights_gen.generate_batch,
+            user_ids=data.userIds,
+            dates=data.dates,
+            totals=data.totals,
+            carbon_saved=data.carbonSaved,
+            challenges_completed=data.challengesCompleted,
+            locale=data.locale
+        )
+        
+        return {
+            "success": True,
+            "count": len(users),
+            "users": users
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch insights error: {str(e)}")
+
+
+@app.post("/trends/{user_id}")
+async def record_trend(user_id: str, data: TrendRecordRequest):
+    """
+    Record daily emission totals for a user's incremental trend aggregates.
+    Days go to the stored history, which feeds the trends of every worker;
+    recording a day again replaces its previous total and keeps its challenge savings.
+    """
+    try:
+        await run_cpu(history_store.append, user_id, [(r.date, r.total, None, None) for r in data.records])
+        return {
+            "success": True,
+            "trends": trend_store.snapshot(user_id)
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Trend update error: {str(e)}")
+
+
+@app.get("/trends/{user_id}")
+async def get_trends(user_id: str):
+    """Stored all-time and rolling 7/30/90-day aggregates for a user."""
+    trends = trend_store.snapshot(user_id)
+    if trends is None:
+        raise HTTPException(status_code=404, detail="No trend data for user")
+    return {
+        "success": True,
+        "trends": trends
+    }
+
+
+def _ingest_activities(body: bytes) -> Dict:
+    columns = _parse(parse_activity_batch, body)
+    with stage('activity_store'):
+        return activity_store.ingest(columns['userIds'], columns['types'], columns['carbonImpacts'],
+                                     columns['timestamps'])
+
+
+@app.post("/activities")
+async def ingest_activities(request: Request):
+    """
+    Ingest activity events in bulk, as columns with one entry per event.
+    Events are summed per user, day and activity type.
+    """
+    body = await request.body()
+    try:
+        result = await run_cpu(_ingest_activities, body)
+        
+        return {
+            "success": True,
+            **result
+        }
+    except RequestValidationError:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Activity ingest error: {str(e)}")
+
+
+@app.get("/activities")
+async def get_activity_stats():
+    """Users, ingested events and log size of the activity store."""
+    return {
+        "success": True,
+        **activity_store.stats()
+    }
+
+
+@app.get("/activities/{user_id}")
+async def get_activities(user_id: str, days: Optional[int] = None, asOf: Optional[str] = None):
+    """
+    A user's activity totals per type for the rolling 7/30/90-day windows
+    ending at `asOf` (default: the latest day with activity), and per day.
+    """
+    activity = activity_store.activity(user_id)
+    if activity is None:
+        raise HTTPException(status_code=404, detail="No activity for user")
+    try:
+        end = day_number(asOf) if asOf else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "userId": user_id,
+        "windows": {window: activity.rollup(window, end) for window in TREND_WINDOWS},
+        "daily": activity.daily(days)
+    }
+
+
+@app.get("/history")
+async def get_history_stats():
+    """Users and log size of the progress history store."""
+    return {
+        "success": True,
+        **history_store.stats()
+    }
+
+
+@app.post("/history/{user_id}")
+async def ingest_history(user_id: str, data: HistoryRecordRequest):
+    """
+    Append daily progress to a user's stored history.
+    Recording a day again replaces it; unchanged days are not written.
+    """
+    try:
+        written = await run_cpu(
+            history_store.append,
+            user_id,
+            [(r.date, r.total, r.carbonSaved, r.challengesCompleted) for r in data.records]
+        )
+        return {
+            "success": True,
+            "written": written
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"History ingest error: {str(e)}")
+
+
+@app.get("/history/{user_id}")
+async def get_history(user_id: str, days: Optional[int] = None):
+    """Stored daily history of a user as columns, newest first."""
+    history = history_store.history(user_id, days)
+    if history is None:
+        raise HTTPException(status_code=404, detail="No history for user")
+    return {
+        "success": True,
+        "userId": user_id,
+        **history
+    }
+
+
+def _project(user_ids: List[str], dates: Optional[List[str]], totals: Optional[List[float]],
+             options: ProjectionRequest) -> List[Dict]:
+    with stage('projection'):
+        if dates is None:
+            # Stored history of each user, flattened into columns
+            stored = [(user_id, history_store.history(user_id)) for user_id in dict.fromkeys(user_ids)]
+            missing = [user_id for user_id, history in stored if history is None]
+            if missing:
+                raise NoHistory(f"No stored history for user(s): {', '.join(missing[:10])}")
+            user_ids = [user_id for user_id, history in stored for _ in history['dates']]
+            dates = [day for _, history in stored for day in history['dates']]
+            totals = [total for _, history in stored for total in history['totals']]
+        elif totals is None:
+            raise ValueError("'totals' is required with 'dates'")
+        
+        return projection_engine.project(
+            user_ids, dates, totals,
+            months=options.months,
+            level=options.level,
+            challenges=[c.dict() for c in options.challenges or []],
+            start=options.start,
+            target_annual=options.targetAnnual
+        )
+
+
+@app.post("/projection/batch")
+async def project_emissions_batch(data: BatchProjectionRequest):
+    """
+    Monthly and annual emission projections for many users in one vectorized pass.
+    History is columnar (one entry per day), or each user's stored history if `dates` is omitted.
+    Planned challenges apply to the user named by their `userId`.
+    """
+    try:
+        projections = await run_cpu(_project, data.userIds, data.dates, data.totals, data)
+        return ORJSONResponse({
+            "success": True,
+            "count": len(projections),
+            "projections": projections
+        })
+    except NoHistory as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Projection error: {str(e)}")
+
+
+@app.post("/projection/{user_id}")
+async def project_emissions(user_id: str, data: Optional[ProjectionRequest] = None):
+    """
+    Year-ahead (by default) monthly projection of a user's emissions from their stored history,
+    with confidence bands, the effect of planned challenges and the offset needed to reach a target.
+    """
+    data = data or ProjectionRequest()
+    for challenge in data.challenges or []:
+        challenge.userId = user_id
+    try:
+        projections = await run_cpu(_project, [user_id], None, None, data)
+        return ORJSONResponse({
+            "success": True,
+            **projections[0]
+        })
+    except NoHistory:
+        raise HTTPException(status_code=404, detail="No history for user")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Projection error: {str(e)}")
+
+
+@app.get("/population")
+async def get_population_stats():
+    """Version, size and date range of the active population snapshot."""
+    return {
+        "success": True,
+        **population.current().stats()
+    }
+
+
+@app.post("/population/snapshot")
+async def publish_population_snapshot(data: PopulationSnapshotRequest):
+    """
+    Replace the population snapshot with daily breakdowns per user.
+    Input is columnar: one entry per user and day in each list.
+    """
+    try:
+        stats = await run_cpu(
+            population.publish,
+            data.userIds,
+            data.dates,
+            {name: getattr(data, name) for name in POPULATION_COLUMNS}
+        )
+        return {
+            "success": True,
+            **stats
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Population snapshot error: {str(e)}")
+
+
+@app.get("/population/percentiles")
+async def get_population_percentiles(category: str = 'total', q: str = '10,25,50,75,90',
+                                     days: Optional[int] = None, per_user: bool = True):
+    """Percentiles of per-user mean daily emissions (or of daily rows) over the last `days` days."""
+    try:
+        percentiles = [float(p) for p in q.split(',')]
+        result = await run_cpu(population.current().percentiles, category, percentiles, days, per_user)
+        return {
+            "success": True,
+            "category": category,
+            "percentiles": result
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/population/histogram")
+async def get_population_histogram(category: str = 'total', bins: int = 20, days: Optional[int] = None,
+                                   per_user: bool = True):
+    """Histogram of per-user mean daily emissions (or of daily rows) over the last `days` days."""
+    try:
+        result = await run_cpu(population.current().histogram, category, bins, days, per_user)
+        return {
+            "success": True,
+            "category": category,
+            **result
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/population/leaderboard")
+async def get_population_leaderboard(category: str = 'total', limit: int = 100, days: Optional[int] = 7):
+    """Users with the lowest mean daily emissions over the last `days` days."""
+    try:
+        leaderboard = await run_cpu(population.current().leaderboard, category, limit, days)
+        return {
+            "success": True,
+            "category": category,
+            "count": len(leaderboard),
+            "leaderboard": leaderboard
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/population/rank/{user_id}")
+async def get_population_rank(user_id: str, category: str = 'total', days: Optional[int] = None):
+    """A user's rank (1 = lowest emitter) and top percentage among all users."""
+    try:
+        rank = await run_cpu(population.current().rank, user_id, category, days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not in population snapshot")
+    return {
+        "success": True,
+        "userId": user_id,
+        "category": category,
+        **rank
+    }
+
+
 @app.post("/predict-impact")
 async def predict_impact(lifestyle_change: Dict):
     """
     Predict the carbon impact of a proposed lifestyle change.
     """
     try:
-        prediction = calculator.predict_change_impact(lifestyle_change)
+        prediction = await run_cpu(calculator.predict_change_impact, lifestyle_change)
         
         return {
             "success": True,
@@ -160,14 +1022,233 @@ async def predict_impact(lifestyle_change: Dict):
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
 
+@app.post("/predict-impact/sweep")
+async def predict_impact_sweep(data: SweepRequest):
+    """
+    Predict the impact of many lifestyle changes against one baseline.
+    Accepts explicit scenarios and/or a parameter grid; results are ranked by savings.
+    """
+    try:
+        sweep = await run_cpu(
+            calculator.predict_change_sweep,
+            baseline=data.baseline.dict(),
+            scenarios=data.scenarios,
+            grid=data.grid,
+            limit=data.limit
+        )
+        
+        return {
+            "success": True,
+            "currentEmissions": sweep["current"],
+            "count": len(sweep["scenarios"]),
+            "scenarios": [
+                {
+                    "rank": s["rank"],
+                    "changes": s["changes"],
+                    "predictedEmissions": s["predicted"],
+                    "savings": s["savings"],
+                    "savingsPercentage": s["savings_percentage"],
+                    "breakdown": s["breakdown"]
+                }
+                for s in sweep["scenarios"]
+            ]
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sweep error: {str(e)}")
+
+
+@app.post("/savings-plans")
+async def savings_plans(data: SavingsPlanRequest):
+    """
+    Pareto-optimal plans of combined lifestyle changes by savings versus effort.
+    Every plan within the effort budget saves more than any plan needing less effort.
+    """
+    try:
+        result = await run_cpu(
+            calculator.plan_savings,
+            baseline=data.baseline.dict(),
+            max_effort=data.maxEffort,
+            levers=data.levers,
+            limit=data.limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Savings plan error: {str(e)}")
+    
+    return {
+        "success": True,
+        "currentEmissions": result["current"],
+        "maxEffort": data.maxEffort,
+        "count": len(result["plans"]),
+        "plans": [
+            {
+                "effort": p["effort"],
+                "changes": p["changes"],
+                "actions": p["actions"],
+                "predictedEmissions": p["predicted"],
+                "savings": p["savings"],
+                "savingsPercentage": p["savings_percentage"],
+                "breakdown": p["breakdown"]
+            }
+            for p in result["plans"]
+        ]
+    }
+
+
+# Job chunk handlers, run by the job worker processes on their own copy of the services
+def _calculate_job_chunk(data: bytes, start: int) -> List[Dict]:
+    results = calculator.calculate_lifestyles(parse_batch_request(data))
+    return [{"index": start + i, **format_calculation(result)} for i, result in enumerate(results)]
+
+
+def _insights_job_chunk(data: bytes, start: int) -> List[Dict]:
+    columns = orjson.loads(data)
+    return insights_gen.generate_batch(
+        user_ids=columns["userIds"],
+        dates=columns["dates"],
+        totals=columns["totals"],
+        carbon_saved=columns["carbonSaved"],
+        challenges_completed=columns["challengesCompleted"],
+        locale=columns["locale"]
+    )
+
+
+def job_handlers() -> Dict[str, Callable]:
+    """Chunk handler per job kind, loaded by each job worker process."""
+    return {"calculate": _calculate_job_chunk, "insights": _insights_job_chunk}
+
+
+def _require_jobs() -> JobQueue:
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is disabled (JOB_QUEUE_PATH is empty)")
+    return job_queue
+
+
+def _job_accepted(job_id: str) -> ORJSONResponse:
+    return ORJSONResponse({"success": True, **job_queue.job(job_id)}, status_code=202,
+                          headers={"Location": f"/jobs/{job_id}"})
+
+
+def _submit_calculate_job(body: bytes, chunk_size: int) -> ORJSONResponse:
+    _parse(parse_batch_request, body)
+    records = orjson.loads(body)["records"]
+    return _job_accepted(job_queue.submit("calculate", chunk_records(records, chunk_size), len(records)))
+
+
+@app.post("/jobs/calculate", openapi_extra=_json_body(CarbonBatchRequest))
+async def submit_calculate_job(request: Request, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Queue a `/calculate/batch` body as a background job of `chunk_size` records per chunk.
+    Results are `/calculate` results with the record's `index`, in request order.
+    """
+    _require_jobs()
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be at least 1")
+    return await run_cpu(_submit_calculate_job, await request.body(), chunk_size)
+
+
+def _submit_insights_job(data: BatchInsightsRequest, chunk_size: int) -> ORJSONResponse:
+    columns = {
+        "userIds": data.userIds,
+        "dates": data.dates,
+        "totals": data.totals,
+        "carbonSaved": data.carbonSaved,
+        "challengesCompleted": data.challengesCompleted
+    }
+    chunks = chunk_columns(columns, "userIds", chunk_size, extra={"locale": data.locale})
+    return _job_accepted(job_queue.submit("insights", chunks, len(set(data.userIds))))
+
+
+@app.post("/jobs/insights")
+async def submit_insights_job(data: BatchInsightsRequest, chunk_size: int = DEFAULT_USERS_PER_CHUNK):
+    """
+    Queue an `/insights/batch` body as a background job of `chunk_size` users per chunk.
+    Results are the `/insights/batch` users, in order of first appearance.
+    """
+    _require_jobs()
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be at least 1")
+    try:
+        return await run_cpu(_submit_insights_job, data, chunk_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/jobs")
+async def get_job_stats():
+    """Jobs per status, pending chunks and this process's worker pool."""
+    queue = _require_jobs()
+    return {
+        "success": True,
+        **(await run_cpu(queue.stats)),
+        "workers": job_workers.stats()
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a job."""
+    job = await run_cpu(_require_jobs().job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, **job}
+
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, follow: bool = True):
+    """
+    Stream a job's results as NDJSON, one line per result in order.
+    With `follow`, results are streamed as chunks finish until the job ends;
+    otherwise only the results available now are returned.
+    """
+    queue = _require_jobs()
+    if await run_cpu(queue.job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def results():
+        seq = 0
+        while True:
+            # Status first: if the job had ended, the outputs read after it are complete
+            job = await run_cpu(queue.job, job_id)
+            outputs = await run_cpu(queue.outputs, job_id, seq)
+            for _, output in outputs:
+                yield output
+            seq += len(outputs)
+            if not follow or job is None or job["status"] not in ACTIVE_JOB_STATUSES:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; results of chunks already finished are kept."""
+    queue = _require_jobs()
+    if not await run_cpu(queue.cancel, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, **(await run_cpu(queue.job, job_id))}
+
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
     debug = os.getenv("DEBUG", "True").lower() == "true"
     
-    uvicorn.run(
-        "main:app",
-        host=host,
-        port=port,
-        reload=debug
-    )
+    if debug:
+        uvicorn.run(
+            "main:app",
+            host=host,
+            port=port,
+            reload=True
+        )
+    else:
+        # Factor tables and compiled rules were loaded at import time above,
+        # so forked workers share them copy-on-write. Warming up here, before
+        # forking, hands every worker the lazily imported modules too.
+        if warmup_mode() != 'off':
+            warmup.run()
+        serve(app, host=host, port=port, workers=default_workers())
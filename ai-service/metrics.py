@@ -0,0 +1,324 @@
+"""
+Metrics
+Latency histograms per endpoint and per internal stage, plus admission counters and gauges, in Prometheus text format.
+"""
+
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route label for stages timed outside an HTTP request (CLI, benchmarks)
+NO_ROUTE = 'internal'
+
+
+class Histogram:
+    """
+    Cumulative latency histogram keyed by label values.
+    
+    Each series is a list of per-bucket counts followed by the +Inf count
+    and the running sum, so merging snapshots from several processes is an
+    element-wise sum.
+    """
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds: float, labels: Tuple[str, ...]) -> None:
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+    
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+    
+    def render(self, snapshot: Dict[Tuple[str, ...], List[float]]) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        bounds = [_format_bound(b) for b in self.buckets] + ['+Inf']
+        for labels in sorted(snapshot):
+            series = snapshot[labels]
+            pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, labels)]
+            base = ','.join(pairs)
+            prefix = base + ',' if base else ''
+            cumulative = 0
+            for bound, count in zip(bounds, series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-1]!r}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """
+    Monotonic count keyed by label values.
+    
+    Series are one-element lists so snapshots merge across processes the
+    same way as histograms.
+    """
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, labels: Tuple[str, ...], amount: float = 1) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0]
+            series[0] += amount
+    
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+    
+    def render(self, snapshot: Dict[Tuple[str, ...], List[float]]) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for labels in sorted(snapshot):
+            pairs = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, labels))
+            lines.append(f'{self.name}{{{pairs}}} {snapshot[labels][0]!r}')
+        return lines
+
+
+class Gauge(Counter):
+    """
+    Current value keyed by label values.
+    
+    Merged across processes by summing the live ones, so a per-worker queue
+    depth reads as the depth of the whole server.
+    """
+    
+    kind = 'gauge'
+    
+    def set(self, value: float, labels: Tuple[str, ...]) -> None:
+        with self._lock:
+            self._series[labels] = [value]
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+REQUEST_DURATION = Histogram(
+    'ecostep_request_duration_seconds',
+    'HTTP request latency by method, route template and status code.',
+    ('method', 'route', 'status')
+)
+STAGE_DURATION = Histogram(
+    'ecostep_stage_duration_seconds',
+    'Time spent in internal request stages (validation, parse, calculate, '
+    'recommendations, history_store, trends, comparison, motivation, projection, serialization) by route.',
+    ('route', 'stage')
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'ecostep_admission_queue_depth',
+    'CPU calls waiting for a CPU pool slot, by priority class.',
+    ('class',)
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    'ecostep_admission_in_flight',
+    'Admitted requests not yet answered, by priority class.',
+    ('class',)
+)
+ADMISSION_ADMITTED = Counter(
+    'ecostep_admission_admitted_total',
+    'Requests admitted, by priority class.',
+    ('class',)
+)
+ADMISSION_SHED = Counter(
+    'ecostep_admission_shed_total',
+    'Requests rejected or dropped by admission control, by priority class and reason '
+    '(queue_full, deadline, expired).',
+    ('class', 'reason')
+)
+REGISTRY = (REQUEST_DURATION, STAGE_DURATION, ADMISSION_QUEUE_DEPTH, ADMISSION_IN_FLIGHT, ADMISSION_ADMITTED,
+            ADMISSION_SHED)
+
+
+class RequestTiming:
+    """Timestamps of one request, shared by the middleware, route and stages."""
+    
+    __slots__ = ('start', 'route', 'handler_end')
+    
+    def __init__(self, start: float):
+        self.start = start
+        self.route: Optional[str] = None
+        self.handler_end: Optional[float] = None
+
+
+_current: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar('request_timing', default=None)
+
+
+def begin_request() -> Tuple[RequestTiming, contextvars.Token]:
+    """Start timing a request in the current context."""
+    timing = RequestTiming(time.perf_counter())
+    return timing, _current.set(timing)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def observe_stage(name: str, started: float) -> float:
+    """
+    Record a stage that began at `started` (a `time.perf_counter()` value).
+    
+    Returns the end time, so consecutive stages can be chained without
+    re-reading the clock.
+    """
+    now = time.perf_counter()
+    timing = _current.get()
+    route = timing.route if timing is not None and timing.route else NO_ROUTE
+    STAGE_DURATION.observe(now - started, (route, name))
+    return now
+
+
+class stage:
+    """
+    Time a block as an internal stage of the current request.
+    
+    Usage:
+        with stage('calculate'):
+            ...
+    """
+    
+    __slots__ = ('name', 'started')
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        observe_stage(self.name, self.started)
+        return False
+
+
+def _multiprocess_dir() -> Optional[str]:
+    return os.getenv('METRICS_MULTIPROC_DIR') or None
+
+
+def flush() -> None:
+    """Write this process's metrics to the shared metrics directory, if any."""
+    directory = _multiprocess_dir()
+    if directory is None:
+        return
+    data = {h.name: [[list(labels), series] for labels, series in h.snapshot().items()] for h in REGISTRY}
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def start_flusher(interval: float = 1.0) -> Optional[threading.Thread]:
+    """
+    Periodically flush histograms when several workers share a metrics directory.
+    
+    Files of exited workers are kept, so merged counts never go backwards.
+    """
+    if _multiprocess_dir() is None:
+        return None
+    
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except OSError:
+                pass
+    
+    thread = threading.Thread(target=loop, name='metrics-flush', daemon=True)
+    thread.start()
+    return thread
+
+
+def render_metrics() -> str:
+    """
+    Prometheus text exposition of all metrics.
+    
+    With METRICS_MULTIPROC_DIR set (the pre-fork server sets it), the
+    snapshots of every worker are merged; otherwise only this process is
+    reported. Gauges of exited workers are left out.
+    """
+    directory = _multiprocess_dir()
+    snapshots = {h.name: h.snapshot() for h in REGISTRY}
+    if directory is not None:
+        flush()
+        snapshots = {h.name: {} for h in REGISTRY}
+        kinds = {h.name: getattr(h, 'kind', 'histogram') for h in REGISTRY}
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            live = _alive(path)
+            for name, series_list in data.items():
+                merged = snapshots.get(name)
+                if merged is None or (not live and kinds[name] == 'gauge'):
+                    continue
+                for labels, series in series_list:
+                    key = tuple(labels)
+                    current = merged.get(key)
+                    merged[key] = series if current is None else [a + b for a, b in zip(current, series)]
+    
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(snapshots[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+def _alive(path: str) -> bool:
+    """Whether the process that wrote a `metrics-<pid>.json` file is still running."""
+    try:
+        os.kill(int(os.path.basename(path)[len('metrics-'):-len('.json')]), 0)
+    except ValueError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,334 @@
+"""
+Population Snapshot
+Memory-mapped columnar snapshot of per-user daily breakdowns for percentile, rank and histogram queries.
+
+Usage:
+    python population_snapshot.py export.csv
+    python population_snapshot.py export.csv --directory data/population
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lazy_imports import lazy_module
+from reloadable import ReloadableFile
+
+# Only writing snapshots uses pandas; importing it on first use keeps start-up fast
+pd = lazy_module('pandas')
+
+DEFAULT_POPULATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'population')
+MANIFEST_NAME = 'current.json'
+
+CATEGORIES = ('transportation', 'energy', 'diet', 'shopping')
+COLUMNS = CATEGORIES + ('total',)
+
+# Comparative insights look at each user's mean over the snapshot's last 30 days
+COMPARISON_DAYS = 30
+
+# Per-user mean arrays cached per (category, days) on each snapshot
+MAX_CACHED_MEANS = 32
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _day_numbers(dates: Sequence[str]) -> np.ndarray:
+    """Day numbers (date.toordinal) for ISO dates or datetimes, taken in UTC."""
+    if len(dates) == 0:
+        return np.empty(0, dtype=np.int32)
+    stamps = pd.to_datetime(pd.Series(dates), utc=True, format='ISO8601').dt.tz_localize(None)
+    return (stamps.to_numpy().astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL).astype(np.int32)
+
+
+class PopulationSnapshot:
+    """
+    One immutable snapshot of daily emissions per user.
+    
+    Rows are sorted by day, then user, and every column is a `.npy` file
+    opened with `mmap_mode='r'`, so loading is cheap and workers share the
+    pages. A trailing window of days is a contiguous row range. Queries
+    over users first reduce the window to one mean per user with
+    `np.bincount`; those arrays are cached per category and window.
+    """
+    
+    def __init__(self, version: str, users: List[str], day: np.ndarray, user: np.ndarray,
+                 columns: Dict[str, np.ndarray]):
+        self.version = version
+        self.users = users
+        self.user_codes = {user_id: code for code, user_id in enumerate(users)}
+        self.day = day
+        self.user = user
+        self.columns = columns
+        self._means: Dict[Tuple[str, Optional[int]], Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+    
+    @property
+    def rows(self) -> int:
+        return len(self.day)
+    
+    @classmethod
+    def load(cls, manifest_path: str) -> 'PopulationSnapshot':
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        path = os.path.join(os.path.dirname(manifest_path), manifest['version'])
+        
+        def column(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+        
+        with open(os.path.join(path, 'users.json')) as f:
+            users = json.load(f)
+        return cls(manifest['version'], users, column('day'), column('user'),
+                   {name: column(name) for name in COLUMNS})
+    
+    @staticmethod
+    def write(directory: str, user_ids: Sequence[str], dates: Sequence[str],
+              values: Dict[str, Optional[Sequence[float]]]) -> Dict:
+        """
+        Write a new snapshot version and make it current.
+        
+        Args:
+            directory: Snapshot directory
+            user_ids: User id for each row
+            dates: ISO date for each row
+            values: Daily kg CO₂ per category name; missing categories are 0 and
+                a missing `total` is the sum of the categories
+        
+        Returns:
+            The new manifest
+        
+        Raises:
+            ValueError: If a column length differs from the number of rows
+        """
+        rows = len(user_ids)
+        for name, column in [('dates', dates)] + [(name, values.get(name)) for name in COLUMNS]:
+            if column is not None and len(column) != rows:
+                raise ValueError(f"'{name}' has {len(column)} entries, expected {rows}")
+        
+        codes, users = pd.factorize(pd.Series(list(user_ids), dtype=object))
+        days = _day_numbers(dates)
+        data = {name: np.asarray(values[name], dtype=np.float64) if values.get(name) is not None
+                else np.zeros(rows) for name in CATEGORIES}
+        if values.get('total') is not None:
+            data['total'] = np.asarray(values['total'], dtype=np.float64)
+        else:
+            data['total'] = data['transportation'] + data['energy'] + data['diet'] + data['shopping']
+        
+        # Sort by day, then user; the last row for a (user, day) wins
+        order = np.lexsort((np.arange(rows), codes, days))
+        keep = np.ones(rows, dtype=bool)
+        keep[:-1] = (days[order][1:] != days[order][:-1]) | (codes[order][1:] != codes[order][:-1])
+        order = order[keep]
+        
+        version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        path = os.path.join(directory, version)
+        os.makedirs(path)
+        np.save(os.path.join(path, 'day.npy'), days[order])
+        np.save(os.path.join(path, 'user.npy'), codes[order].astype(np.int32))
+        for name, column in data.items():
+            np.save(os.path.join(path, f'{name}.npy'), column[order].astype(np.float32))
+        with open(os.path.join(path, 'users.json'), 'w') as f:
+            json.dump(list(users), f)
+        
+        manifest = {
+            'version': version,
+            'rows': int(len(order)),
+            'users': len(users),
+            'firstDay': date.fromordinal(int(days.min())).isoformat() if rows else None,
+            'lastDay': date.fromordinal(int(days.max())).isoformat() if rows else None
+        }
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        previous = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                previous = json.load(f).get('version')
+        tmp = manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, manifest_path)
+        
+        # Keep the previous version for workers that have not switched yet
+        for name in os.listdir(directory):
+            full = os.path.join(directory, name)
+            if name not in (version, previous) and os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+        return manifest
+    
+    def stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'rows': self.rows,
+            'users': len(self.users),
+            'firstDay': date.fromordinal(int(self.day[0])).isoformat() if self.rows else None,
+            'lastDay': date.fromordinal(int(self.day[-1])).isoformat() if self.rows else None
+        }
+    
+    def _window(self, days: Optional[int]) -> slice:
+        """Row range of the snapshot's last `days` days (all rows if None)."""
+        if days is None or not self.rows:
+            return slice(0, self.rows)
+        start = int(np.searchsorted(self.day, int(self.day[-1]) - days + 1))
+        return slice(start, self.rows)
+    
+    def _column(self, category: str) -> np.ndarray:
+        if category not in self.columns:
+            raise ValueError(f"Unknown category '{category}'; expected one of {', '.join(COLUMNS)}")
+        return self.columns[category]
+    
+    def user_means(self, category: str = 'total', days: Optional[int] = None
+                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Mean daily value per user over a window.
+        
+        Returns:
+            Tuple of (user codes with data, their means, the means sorted ascending)
+        """
+        key = (category, days)
+        cached = self._means.get(key)
+        if cached is not None:
+            return cached
+        column = self._column(category)
+        window = self._window(days)
+        user = self.user[window]
+        counts = np.bincount(user, minlength=len(self.users))
+        sums = np.bincount(user, weights=column[window], minlength=len(self.users))
+        codes = np.flatnonzero(counts)
+        means = sums[codes] / counts[codes]
+        cached = (codes, means, np.sort(means))
+        with self._lock:
+            if len(self._means) >= MAX_CACHED_MEANS:
+                self._means.pop(next(iter(self._means)))
+            self._means[key] = cached
+        return cached
+    
+    def _values(self, category: str, days: Optional[int], per_user: bool) -> np.ndarray:
+        if per_user:
+            return self.user_means(category, days)[1]
+        return self._column(category)[self._window(days)]
+    
+    def percentiles(self, category: str = 'total', q: Sequence[float] = (10, 25, 50, 75, 90),
+                    days: Optional[int] = None, per_user: bool = True) -> Dict[str, Optional[float]]:
+        """Percentiles of per-user means (or of daily rows with per_user=False)."""
+        values = self._values(category, days, per_user)
+        if not len(values):
+            return {f'p{p:g}': None for p in q}
+        return {f'p{p:g}': round(float(v), 2) for p, v in zip(q, np.percentile(values, q))}
+    
+    def histogram(self, category: str = 'total', bins: int = 20, days: Optional[int] = None,
+                  per_user: bool = True) -> Dict[str, List]:
+        """Equal-width histogram of per-user means (or of daily rows)."""
+        values = self._values(category, days, per_user)
+        if not len(values):
+            return {'counts': [], 'edges': []}
+        counts, edges = np.histogram(values, bins=bins)
+        return {'counts': counts.tolist(), 'edges': np.round(edges, 2).tolist()}
+    
+    def standing(self, value: float, category: str = 'total', days: Optional[int] = None) -> Optional[Dict]:
+        """
+        Where a mean daily value falls among users; rank 1 is the lowest emitter.
+        
+        Returns:
+            Dict with value, rank, users, topPercent (share of users at or
+            below the value) and median, or None for an empty snapshot
+        """
+        ranked = self.user_means(category, days)[2]
+        if not len(ranked):
+            return None
+        n = len(ranked)
+        rank = int(np.searchsorted(ranked, value, side='left')) + 1
+        return {
+            'value': round(float(value), 2),
+            'rank': rank,
+            'users': n,
+            'topPercent': round(min(rank, n) / n * 100, 1),
+            'median': round(float(ranked[(n - 1) // 2] + ranked[n // 2]) / 2, 2)
+        }
+    
+    def rank(self, user_id: str, category: str = 'total', days: Optional[int] = None) -> Optional[Dict]:
+        """Standing of a user's own mean, or None if the user has no rows in the window."""
+        code = self.user_codes.get(user_id)
+        if code is None:
+            return None
+        codes, means, _ = self.user_means(category, days)
+        i = int(np.searchsorted(codes, code))
+        if i == len(codes) or codes[i] != code:
+            return None
+        return self.standing(float(means[i]), category, days)
+    
+    def leaderboard(self, category: str = 'total', limit: int = 100, days: Optional[int] = None) -> List[Dict]:
+        """Lowest mean daily emitters, best first."""
+        codes, means, _ = self.user_means(category, days)
+        limit = max(0, min(limit, len(means)))
+        top = np.argpartition(means, limit - 1)[:limit] if limit else np.empty(0, dtype=np.int64)
+        top = top[np.argsort(means[top], kind='stable')]
+        return [{'rank': i + 1, 'userId': self.users[codes[j]], 'value': round(float(means[j]), 2)}
+                for i, j in enumerate(top.tolist())]
+    
+    def compare(self, user_id: Optional[str], daily: Optional[float],
+                days: int = COMPARISON_DAYS) -> Optional[Dict]:
+        """
+        Standing for comparative insights.
+        
+        A user in the snapshot is ranked on their own means for the total and
+        each category; anyone else is placed by their current daily footprint.
+        
+        Returns:
+            Dict mapping 'total' (and categories, for known users) to standings,
+            or None if there is nothing to compare against
+        """
+        if not self.rows:
+            return None
+        if user_id is not None and user_id in self.user_codes:
+            standings = {name: self.rank(user_id, name, days) for name in COLUMNS}
+            if standings['total'] is not None:
+                return {name: s for name, s in standings.items() if s is not None}
+        if daily:
+            standing = self.standing(float(daily), 'total', days)
+            return {'total': standing} if standing is not None else None
+        return None
+
+
+class PopulationRegistry(ReloadableFile[PopulationSnapshot]):
+    """Active population snapshot for a worker process, swapped when a new one is published."""
+    
+    def __init__(self, directory: Optional[str] = None, check_interval: Optional[float] = None):
+        if check_interval is None:
+            check_interval = float(os.getenv('POPULATION_SNAPSHOT_CHECK_INTERVAL', 30))
+        self.directory = directory or os.getenv('POPULATION_SNAPSHOT_DIR', DEFAULT_POPULATION_DIR)
+        manifest = os.path.join(self.directory, MANIFEST_NAME)
+        if not os.path.exists(manifest):
+            os.makedirs(self.directory, exist_ok=True)
+            PopulationSnapshot.write(self.directory, [], [], {})
+        super().__init__(manifest, PopulationSnapshot.load, check_interval)
+    
+    def publish(self, user_ids: Sequence[str], dates: Sequence[str],
+                values: Dict[str, Optional[Sequence[float]]]) -> Dict:
+        """Write a new snapshot (see `PopulationSnapshot.write`) and switch to it."""
+        PopulationSnapshot.write(self.directory, user_ids, dates, values)
+        return self.reload().stats()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Publish a population snapshot from a CSV export with userId, date, "
+                    "transportation, energy, diet, shopping and optional total columns.")
+    parser.add_argument('input', help="CSV file ('-' for stdin)")
+    parser.add_argument('--directory', default=None,
+                        help="Snapshot directory (default: POPULATION_SNAPSHOT_DIR or data/population)")
+    args = parser.parse_args(argv)
+    
+    frame = pd.read_csv(sys.stdin if args.input == '-' else args.input, dtype={'userId': str})
+    values = {name: frame[name].to_numpy() for name in COLUMNS if name in frame}
+    registry = PopulationRegistry(args.directory, check_interval=0)
+    print(json.dumps(registry.publish(frame['userId'].to_numpy(), frame['date'].to_numpy(), values)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
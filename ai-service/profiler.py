@@ -0,0 +1,120 @@
+"""
+Sampling Profiler
+Samples the stacks of all threads in-process and dumps them as folded flamegraph stacks.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+DEFAULT_INTERVAL = 0.005
+MAX_DURATION = 600.0
+
+
+def _frame_label(code) -> str:
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler that can be toggled at runtime.
+    
+    A background thread walks `sys._current_frames()` every `interval`
+    seconds and counts each thread's stack. Stacks are folded root-first
+    with `;` separators and a trailing sample count, the input format of
+    flamegraph.pl, speedscope and similar tools. Overhead only exists
+    while a session is running.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Counter = Counter()
+        self._interval = DEFAULT_INTERVAL
+        self._started_at: Optional[float] = None
+        self._stopped_at: Optional[float] = None
+        self._deadline: Optional[float] = None
+        self._samples = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self, interval: float = DEFAULT_INTERVAL, duration: Optional[float] = None) -> Dict:
+        """
+        Start a new profiling session, discarding the previous stacks.
+        
+        Args:
+            interval: Seconds between samples
+            duration: Stop automatically after this many seconds (capped at MAX_DURATION)
+        
+        Returns:
+            Profiler status
+        
+        Raises:
+            ValueError: If the interval or duration is not positive
+            RuntimeError: If a session is already running
+        """
+        if interval <= 0 or (duration is not None and duration <= 0):
+            raise ValueError("interval and duration must be positive")
+        with self._lock:
+            if self.running:
+                raise RuntimeError("Profiler is already running")
+            self._stop.clear()
+            self._stacks = Counter()
+            self._samples = 0
+            self._interval = interval
+            self._started_at = time.time()
+            self._stopped_at = None
+            self._deadline = time.monotonic() + min(duration or MAX_DURATION, MAX_DURATION)
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self.status()
+    
+    def stop(self) -> Dict:
+        """Stop the running session; the collected stacks stay available."""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        return self.status()
+    
+    def status(self) -> Dict:
+        return {
+            'running': self.running,
+            'intervalMs': self._interval * 1000,
+            'startedAt': self._started_at,
+            'stoppedAt': self._stopped_at,
+            'samples': self._samples,
+            'stacks': len(self._stacks)
+        }
+    
+    def folded(self) -> str:
+        """Collected stacks in folded format, one `frame;frame;... count` per line."""
+        with self._lock:
+            stacks = self._stacks.copy()
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self._interval) and time.monotonic() < self._deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sample = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f'thread-{ident}'))
+                labels.reverse()
+                sample.append(';'.join(labels))
+            with self._lock:
+                self._stacks.update(sample)
+                self._samples += 1
+        self._stopped_at = time.time()
@@ -0,0 +1,291 @@
+"""
+Projection Engine
+Vectorized monthly and annual emission forecasts with confidence bands, seasonality and planned challenges.
+"""
+
+import os
+import threading
+from datetime import date
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lazy_imports import lazy_module
+from carbon_calculator import GLOBAL_AVERAGE_ANNUAL_KG, TREE_ANNUAL_KG
+from population_snapshot import PopulationRegistry
+
+pd = lazy_module('pandas')
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Days of each user's history the model is fitted on
+HISTORY_DAYS = 90
+
+# A trend and weekday pattern need two weeks of data; fewer days project the mean
+MIN_TREND_DAYS = 14
+
+# Residual spread assumed (as a fraction of the mean) when there are too few days to measure it
+FALLBACK_CV = 0.3
+
+# Per-day damping of the fitted trend: its effect levels off after a few months
+DEFAULT_TREND_DAMPING = 0.99
+
+# Population-wide monthly seasonality needs a snapshot covering a full year
+SEASONALITY_MIN_DAYS = 365
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 36
+DEFAULT_LEVEL = 0.8
+
+
+def _ordinals(dates: Sequence) -> np.ndarray:
+    """Day numbers (date.toordinal) for ISO dates, dates or day numbers, taken in UTC."""
+    if len(dates) and isinstance(dates[0], (int, np.integer)):
+        return np.asarray(dates, dtype=np.int64)
+    stamps = pd.to_datetime(pd.Series(dates), utc=True, format='ISO8601').dt.tz_localize(None)
+    return stamps.to_numpy().astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+
+
+def _month_grid(start: date, months: int) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Day numbers of `months` calendar months from `start`, each day's month index and the month labels."""
+    first = np.datetime64(start.replace(day=1), 'M')
+    bounds = (np.arange(months + 1) + first).astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+    days = np.arange(bounds[0], bounds[-1])
+    month = np.searchsorted(bounds, days, side='right') - 1
+    labels = [str(m) for m in np.arange(months) + first]
+    return days, month, labels
+
+
+def _calendar_month(days: np.ndarray) -> np.ndarray:
+    """Calendar month (0-11) of day numbers."""
+    return (days - EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12
+
+
+class ProjectionEngine:
+    """
+    Forecasts future daily emissions for many users at once.
+    
+    Each user's last HISTORY_DAYS days are fitted with a least-squares
+    level and trend plus a weekday pattern, all as masked (users, days)
+    matrices. Months are scaled by population-wide monthly factors when the
+    population snapshot covers a full year. The trend is damped so a
+    short-term slope does not compound over a year. Bands come from the
+    residual spread and the uncertainty of the fitted level and trend,
+    summed exactly per month and year. Planned challenges subtract their
+    daily saving on the days they run.
+    """
+    
+    def __init__(self, population: Optional[PopulationRegistry] = None, damping: Optional[float] = None):
+        if damping is None:
+            damping = float(os.getenv('PROJECTION_TREND_DAMPING', DEFAULT_TREND_DAMPING))
+        self.population = population
+        self.damping = min(max(damping, 0.0), 1.0)
+        self._seasonality: Optional[Tuple[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+    
+    def seasonal_factors(self) -> np.ndarray:
+        """
+        Multiplier per calendar month (January first) from the population snapshot.
+        
+        Each factor is the population's mean daily total in that month over
+        its overall mean; all 1.0 if the snapshot covers less than a year.
+        """
+        if self.population is None:
+            return np.ones(12)
+        snapshot = self.population.current()
+        cached = self._seasonality
+        if cached is not None and cached[0] == snapshot.version:
+            return cached[1]
+        
+        factors = np.ones(12)
+        if snapshot.rows and int(snapshot.day[-1]) - int(snapshot.day[0]) + 1 >= SEASONALITY_MIN_DAYS:
+            month = _calendar_month(np.asarray(snapshot.day, dtype=np.int64))
+            total = np.asarray(snapshot.columns['total'], dtype=np.float64)
+            counts = np.bincount(month, minlength=12)
+            sums = np.bincount(month, weights=total, minlength=12)
+            overall = total.mean()
+            if overall > 0:
+                factors = np.where(counts > 0, sums / np.maximum(counts, 1) / overall, 1.0)
+        with self._lock:
+            self._seasonality = (snapshot.version, factors)
+        return factors
+    
+    def project(self, user_ids: Sequence[str], dates: Sequence, totals: Sequence[float],
+                months: int = DEFAULT_MONTHS, level: float = DEFAULT_LEVEL,
+                challenges: Optional[List[Dict]] = None, start: Optional[str] = None,
+                target_annual: Optional[float] = None) -> List[Dict]:
+        """
+        Project monthly and annual emissions for every user in columnar history.
+        
+        Args:
+            user_ids: User id for each row
+            dates: ISO date (or day number) for each row
+            totals: Total daily kg CO₂ for each row
+            months: Number of calendar months to project
+            level: Confidence level of the bands, e.g. 0.8 for the 10th-90th percentile
+            challenges: Planned challenges, each with userId, startDate, optional
+                endDate (inclusive, open-ended if missing) and dailySaving in kg
+            start: First projected month as YYYY-MM; defaults to the month after
+                the latest recorded day
+            target_annual: Annual kg CO₂ target for offset planning; defaults to
+                the global average
+        
+        Returns:
+            List of dicts with userId, fitted model, months and annual totals,
+            in order of first appearance
+        
+        Raises:
+            ValueError: If column lengths differ or months, level or start are invalid
+        """
+        rows = len(user_ids)
+        for name, column in (('dates', dates), ('totals', totals)):
+            if len(column) != rows:
+                raise ValueError(f"'{name}' has {len(column)} entries, expected {rows}")
+        if not 1 <= months <= MAX_MONTHS:
+            raise ValueError(f"months must be between 1 and {MAX_MONTHS}")
+        if not 0 < level < 1:
+            raise ValueError("level must be between 0 and 1")
+        if rows == 0:
+            return []
+        
+        codes, users = pd.factorize(pd.Series(list(user_ids), dtype=object))
+        n_users = len(users)
+        days = _ordinals(dates)
+        values = np.asarray(totals, dtype=np.float64)
+        
+        # (users, HISTORY_DAYS) matrix ending at each user's last day; the last row for a day wins
+        last = np.full(n_users, np.iinfo(np.int64).min)
+        np.maximum.at(last, codes, days)
+        column = HISTORY_DAYS - 1 - (last[codes] - days)
+        keep = column >= 0
+        history = np.full((n_users, HISTORY_DAYS), np.nan)
+        history[codes[keep], column[keep]] = values[keep]
+        
+        seasonal = self.seasonal_factors()
+        history_days = last[:, None] - (HISTORY_DAYS - 1) + np.arange(HISTORY_DAYS)
+        observed = ~np.isnan(history)
+        z = np.where(observed, history / seasonal[_calendar_month(history_days)], 0.0)
+        
+        # Masked least squares of the deseasonalized values on the column index
+        x = np.arange(HISTORY_DAYS, dtype=np.float64)
+        n = observed.sum(axis=1)
+        x_mean = (observed * x).sum(axis=1) / n
+        mean = z.sum(axis=1) / n
+        dx = np.where(observed, x - x_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        trended = (n >= MIN_TREND_DAYS) & (sxx > 0)
+        slope = np.where(trended, (dx * z).sum(axis=1) / np.where(sxx > 0, sxx, 1.0), 0.0)
+        residual = np.where(observed, z - mean[:, None] - slope[:, None] * dx, 0.0)
+        
+        # Weekday pattern: mean residual per weekday, centred
+        weekday = history_days % 7
+        flat = np.arange(n_users)[:, None] * 7 + weekday
+        counts = np.bincount(flat[observed], minlength=n_users * 7).reshape(n_users, 7)
+        sums = np.bincount(flat[observed], weights=residual[observed], minlength=n_users * 7).reshape(n_users, 7)
+        weekly = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+        weekly = np.where(trended[:, None], weekly - weekly.mean(axis=1, keepdims=True), 0.0)
+        residual = np.where(observed, residual - np.take_along_axis(weekly, weekday, axis=1), 0.0)
+        
+        dof = n - np.where(trended, 8, 1)
+        sigma = np.where(dof > 0, np.sqrt((residual * residual).sum(axis=1) / np.maximum(dof, 1)),
+                         FALLBACK_CV * np.abs(mean))
+        
+        # Future grid: calendar months from `start`, with h days since each user's last day
+        if start is not None:
+            try:
+                first = date.fromisoformat(f'{start}-01')
+            except ValueError:
+                raise ValueError("start must be a month as YYYY-MM")
+        else:
+            latest = date.fromordinal(int(last.max()))
+            first = date(latest.year + latest.month // 12, latest.month % 12 + 1, 1)
+        grid, month, labels = _month_grid(first, months)
+        horizon = np.maximum(grid[None, :] - last[:, None], 0)
+        if self.damping < 1:
+            ahead = self.damping * (1 - self.damping ** horizon) / (1 - self.damping)
+        else:
+            ahead = horizon.astype(np.float64)
+        # Trend coefficient relative to the fitted mean's position
+        coefficient = (HISTORY_DAYS - 1 - x_mean)[:, None] + ahead
+        factor = seasonal[_calendar_month(grid)][None, :]
+        daily = np.maximum(factor * (mean[:, None] + slope[:, None] * coefficient
+                                     + np.take(weekly, grid % 7, axis=1)), 0.0)
+        
+        saving = self._challenge_savings(challenges, users, grid)
+        planned = np.maximum(daily - saving, 0.0)
+        
+        # Variance of a sum of projected days: level, trend (uncorrelated after centring) and daily noise
+        indicator = np.zeros((len(grid), months + 1))
+        indicator[np.arange(len(grid)), month] = 1.0
+        indicator[:, months] = 1.0
+        s_sum = factor @ indicator
+        trend_sum = np.where(trended[:, None], (factor * coefficient) @ indicator, 0.0)
+        noise = (factor * factor) @ indicator
+        variance = sigma[:, None] ** 2 * (s_sum ** 2 / n[:, None]
+                                          + trend_sum ** 2 / np.where(sxx > 0, sxx, np.inf)[:, None] + noise)
+        spread = NormalDist().inv_cdf((1 + level) / 2) * np.sqrt(variance)
+        projected = daily @ indicator
+        with_challenges = planned @ indicator
+        
+        target = GLOBAL_AVERAGE_ANNUAL_KG if target_annual is None else float(target_annual)
+        month_days = indicator.sum(axis=0).astype(int).tolist()
+        annualized = with_challenges[:, months] * 365 / month_days[months]
+        offset = np.maximum(annualized - target, 0.0)
+        level_now = mean + slope * (HISTORY_DAYS - 1 - x_mean)
+        
+        # Round and convert whole matrices at once; per-user work is only building dicts
+        keys = ('projected', 'lower', 'upper', 'withChallenges', 'challengeSavings')
+        tables = [np.round(a, 2).tolist() for a in (projected, np.maximum(projected - spread, 0.0),
+                                                    projected + spread, with_challenges,
+                                                    projected - with_challenges)]
+        last_days = [date.fromordinal(day).isoformat() for day in last.tolist()]
+        counts, level_now, slope = n.tolist(), np.round(level_now, 2).tolist(), np.round(slope, 4).tolist()
+        annual_kg = np.round(annualized, 2).tolist()
+        comparison = np.round((annualized / GLOBAL_AVERAGE_ANNUAL_KG - 1) * 100, 1).tolist()
+        trees = np.ceil(annualized / TREE_ANNUAL_KG).astype(int).tolist()
+        offset_kg = np.round(offset, 2).tolist()
+        offset_trees = np.ceil(offset / TREE_ANNUAL_KG).astype(int).tolist()
+        
+        results = []
+        for u, user_id in enumerate(users):
+            rows = list(zip(*(table[u] for table in tables)))
+            results.append({
+                'userId': user_id,
+                'lastDay': last_days[u],
+                'historyDays': counts[u],
+                'dailyLevel': level_now[u],
+                'dailyTrend': slope[u],
+                'months': [{'month': labels[k], 'days': month_days[k], **dict(zip(keys, rows[k]))}
+                           for k in range(months)],
+                'annual': {
+                    **dict(zip(keys, rows[months])),
+                    'days': month_days[months],
+                    'annualizedKg': annual_kg[u],
+                    'annualizedTons': round(annual_kg[u] / 1000, 2),
+                    'comparisonToAverage': comparison[u],
+                    'treesNeeded': trees[u],
+                    'targetKg': round(target, 2),
+                    'offsetNeededKg': offset_kg[u],
+                    'treesToOffset': offset_trees[u]
+                }
+            })
+        return results
+    
+    @staticmethod
+    def _challenge_savings(challenges: Optional[List[Dict]], users: Sequence[str], grid: np.ndarray) -> np.ndarray:
+        """(users, grid days) matrix of planned daily savings."""
+        saving = np.zeros((len(users), len(grid)))
+        if not challenges:
+            return saving
+        user_codes = {user_id: code for code, user_id in enumerate(users)}
+        for challenge in challenges:
+            code = user_codes.get(challenge.get('userId'))
+            if code is None:
+                continue
+            begin = int(_ordinals([challenge['startDate']])[0])
+            end = int(_ordinals([challenge['endDate']])[0]) if challenge.get('endDate') else int(grid[-1])
+            lo = np.searchsorted(grid, begin)
+            hi = np.searchsorted(grid, end, side='right')
+            saving[code, lo:hi] += float(challenge['dailySaving'])
+        return saving
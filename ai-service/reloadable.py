@@ -0,0 +1,74 @@
+"""
+Reloadable File
+Holds an object loaded from a local file and swaps it atomically when the file changes.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+
+class ReloadableFile(Generic[T]):
+    """
+    Loads a versioned object from a file once per process.
+    
+    The object is replaced atomically when the file changes, so workers pick
+    up a new version without restarting. File checks are rate-limited by
+    `check_interval` seconds (0 disables them) to keep `current()` cheap.
+    A file that fails to load (malformed or half-written) is logged and
+    skipped until it changes again; the previous object stays active.
+    """
+    
+    def __init__(self, path: str, loader: Callable[[str], T], check_interval: float):
+        self.path = path
+        self.loader = loader
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._value = None
+        self._mtime = None
+        self._failed_mtime = None
+        self._next_check = 0.0
+        self.reload()
+    
+    @property
+    def version(self) -> str:
+        return self._value.version
+    
+    def current(self) -> T:
+        """Return the active object, reloading it first if the file changed."""
+        if self.check_interval > 0 and time.monotonic() >= self._next_check:
+            self.refresh_if_changed()
+        return self._value
+    
+    def refresh_if_changed(self) -> bool:
+        """Reload if the file modification time changed; False if unchanged or the new file fails to load."""
+        self._next_check = time.monotonic() + self.check_interval
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime or mtime == self._failed_mtime:
+            return False
+        try:
+            self.reload()
+        except Exception as e:
+            self._failed_mtime = mtime
+            logger.error("Keeping version %s, failed to load %s: %s", self._value.version, self.path, e)
+            return False
+        return True
+    
+    def reload(self) -> T:
+        """Load the file and swap it in. The previous object stays active on error."""
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            value = self.loader(self.path)
+            self._value = value
+            self._mtime = mtime
+            self._next_check = time.monotonic() + self.check_interval
+            return value
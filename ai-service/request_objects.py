@@ -0,0 +1,369 @@
+"""
+Request Objects
+Compact __slots__ request objects validated straight from parsed JSON for the hot endpoints.
+"""
+
+from typing import Dict, List, Optional
+
+import orjson
+
+_TRUE = frozenset(('1', 'on', 't', 'true', 'y', 'yes'))
+_FALSE = frozenset(('0', 'off', 'f', 'false', 'n', 'no'))
+_MISSING = object()
+
+
+class ValidationError(ValueError):
+    """
+    Request body failed validation.
+    
+    `errors` uses the pydantic error layout (type, loc, msg, input) so the
+    endpoints can answer with the same 422 body as pydantic-backed routes.
+    """
+    
+    def __init__(self, errors: List[Dict]):
+        super().__init__(f"{len(errors)} validation error(s)")
+        self.errors = errors
+
+
+class _Fields:
+    """Reads typed fields out of one JSON object, collecting errors by location."""
+    
+    __slots__ = ('obj', 'loc', 'errors')
+    
+    def __init__(self, obj: Dict, loc: tuple, errors: List[Dict]):
+        self.obj = obj
+        self.loc = loc
+        self.errors = errors
+    
+    def _get(self, key: str, required: bool):
+        value = self.obj.get(key, _MISSING)
+        if value is _MISSING:
+            if required:
+                self.errors.append({'type': 'missing', 'loc': list(self.loc + (key,)),
+                                    'msg': 'Field required', 'input': self.obj})
+            return _MISSING
+        return value
+    
+    def _error(self, key: str, kind: str, msg: str, value) -> None:
+        self.errors.append({'type': kind, 'loc': list(self.loc + (key,)), 'msg': msg, 'input': value})
+    
+    def string(self, key: str, required: bool = True, default: Optional[str] = None) -> Optional[str]:
+        value = self._get(key, required)
+        if value is _MISSING or (value is None and not required):
+            return default
+        if type(value) is not str:
+            self._error(key, 'string_type', 'Input should be a valid string', value)
+            return default
+        return value
+    
+    def number(self, key: str, required: bool = True) -> Optional[float]:
+        value = self._get(key, required)
+        if value is _MISSING or (value is None and not required):
+            return None
+        kind = type(value)
+        if kind is float:
+            return value
+        if kind is int or kind is bool:
+            return float(value)
+        if kind is str and value == value.strip():
+            try:
+                return float(value)
+            except ValueError:
+                pass
+            self._error(key, 'float_parsing',
+                        'Input should be a valid number, unable to parse string as a number', value)
+            return None
+        self._error(key, 'float_type', 'Input should be a valid number', value)
+        return None
+    
+    def boolean(self, key: str) -> Optional[bool]:
+        value = self._get(key, True)
+        if value is _MISSING:
+            return None
+        if value is True or value is False:
+            return value
+        if type(value) in (int, float) and value in (0, 1):
+            return bool(value)
+        if type(value) is str and value.lower() in _TRUE:
+            return True
+        if type(value) is str and value.lower() in _FALSE:
+            return False
+        self._error(key, 'bool_parsing', 'Input should be a valid boolean, unable to interpret input', value)
+        return None
+    
+    def object(self, key: str, required: bool = True) -> Optional[Dict]:
+        value = self._get(key, required)
+        if value is _MISSING or (value is None and not required):
+            return None
+        if type(value) is not dict:
+            self._error(key, 'dict_type', 'Input should be a valid dictionary', value)
+            return None
+        return value
+    
+    def model(self, key: str) -> Optional[Dict]:
+        """A nested model field: the object to read its fields from."""
+        value = self._get(key, True)
+        if value is _MISSING:
+            return None
+        return _object_at(value, self.loc + (key,), self.errors)
+    
+    def array(self, key: str) -> Optional[list]:
+        value = self._get(key, True)
+        if value is _MISSING:
+            return None
+        if type(value) is not list:
+            self._error(key, 'list_type', 'Input should be a valid list', value)
+            return None
+        return value
+
+
+def _object_at(value, loc: tuple, errors: List[Dict]) -> Optional[Dict]:
+    if type(value) is not dict:
+        errors.append({'type': 'model_attributes_type', 'loc': list(loc),
+                       'msg': 'Input should be a valid dictionary or object to extract fields from',
+                       'input': value})
+        return None
+    return value
+
+
+class Lifestyle:
+    """
+    The lifestyle fields the calculator reads, in the shape of `CarbonRequest`.
+    
+    Shopping amounts are None when the request omits them.
+    """
+    
+    __slots__ = ('primary_mode', 'distance', 'electricity', 'gas', 'renewable', 'region',
+                 'diet', 'clothes', 'electronics')
+    
+    def __init__(self, primary_mode: str, distance: float, electricity: float, gas: float,
+                 renewable: bool, region: Optional[str], diet: str,
+                 clothes: Optional[float] = None, electronics: Optional[float] = None):
+        self.primary_mode = primary_mode
+        self.distance = distance
+        self.electricity = electricity
+        self.gas = gas
+        self.renewable = renewable
+        self.region = region
+        self.diet = diet
+        self.clothes = clothes
+        self.electronics = electronics
+    
+    def cache_key(self, version: str) -> tuple:
+        """Same key as `calculation_cache.profile_key` for the equivalent dicts."""
+        return (version, self.primary_mode, self.distance, self.electricity, self.gas,
+                self.renewable, self.region, self.diet, self.clothes, self.electronics)
+    
+    @classmethod
+    def parse(cls, obj, loc: tuple, errors: List[Dict]) -> Optional['Lifestyle']:
+        """Validate one `CarbonRequest`-shaped object, appending problems to `errors`."""
+        obj = _object_at(obj, loc, errors)
+        if obj is None:
+            return None
+        before = len(errors)
+        fields = _Fields(obj, loc, errors)
+        
+        # Fields are checked in declaration order, as pydantic reports them
+        mode = distance = electricity = gas = renewable = region = clothes = electronics = None
+        transportation = fields.model('transportation')
+        if transportation is not None:
+            t = _Fields(transportation, loc + ('transportation',), errors)
+            mode = t.string('primaryMode')
+            distance = t.number('distancePerDay')
+        energy = fields.model('energy')
+        if energy is not None:
+            e = _Fields(energy, loc + ('energy',), errors)
+            electricity = e.number('electricityUsage')
+            gas = e.number('gasUsage')
+            renewable = e.boolean('renewableEnergy')
+            region = e.string('region', required=False)
+        diet = fields.string('diet')
+        shopping = fields.object('shopping')
+        if shopping is not None:
+            s = _Fields(shopping, loc + ('shopping',), errors)
+            clothes = s.number('clothesPerMonth', required=False)
+            electronics = s.number('electronicsPerYear', required=False)
+        
+        if len(errors) > before:
+            return None
+        return cls(mode, distance, electricity, gas, renewable, region, diet, clothes, electronics)
+
+
+class Activity:
+    __slots__ = ('type', 'description', 'carbon_impact', 'timestamp')
+    
+    def __init__(self, type: str, description: str, carbon_impact: float, timestamp: str):
+        self.type = type
+        self.description = description
+        self.carbon_impact = carbon_impact
+        self.timestamp = timestamp
+
+
+class ProgressDay:
+    """
+    One `recentProgress` entry; `total` is `carbonData.total`.
+    
+    `saved` and `challenges` sum up the optional `challengesCompleted` list.
+    """
+    
+    __slots__ = ('date', 'total', 'activities', 'saved', 'challenges')
+    
+    def __init__(self, date: str, total: float, activities: List[Activity], saved: float = 0.0,
+                 challenges: int = 0):
+        self.date = date
+        self.total = total
+        self.activities = activities
+        self.saved = saved
+        self.challenges = challenges
+    
+    @classmethod
+    def parse(cls, obj, loc: tuple, errors: List[Dict], activities_required: bool = True) -> Optional['ProgressDay']:
+        obj = _object_at(obj, loc, errors)
+        if obj is None:
+            return None
+        before = len(errors)
+        fields = _Fields(obj, loc, errors)
+        date = fields.string('date')
+        carbon_data = fields.object('carbonData')
+        items = fields.array('activities') if activities_required or 'activities' in obj else None
+        completed = fields.array('challengesCompleted') if 'challengesCompleted' in obj else None
+        
+        total = None
+        if carbon_data is not None:
+            total = _Fields(carbon_data, loc + ('carbonData',), errors).number('total')
+        saved = 0.0
+        for i, item in enumerate(completed or ()):
+            item = _object_at(item, loc + ('challengesCompleted', i), errors)
+            if item is not None:
+                saved += _Fields(item, loc + ('challengesCompleted', i), errors).number(
+                    'carbonSaved', required=False) or 0.0
+        activities = []
+        for i, item in enumerate(items or ()):
+            item_loc = loc + ('activities', i)
+            item = _object_at(item, item_loc, errors)
+            if item is None:
+                continue
+            a = _Fields(item, item_loc, errors)
+            activities.append(Activity(a.string('type'), a.string('description'),
+                                       a.number('carbonImpact'), a.string('timestamp')))
+        
+        if len(errors) > before:
+            return None
+        return cls(date, total, activities, saved, len(completed or ()))
+
+
+class InsightsInput:
+    """
+    An `/insights` request: lifestyle, progress newest first, footprint, optional user id and locale.
+    
+    With `delta` set the request sent only its newest days (`latest`) and
+    the rest of the progress comes from the user's stored history.
+    """
+    
+    __slots__ = ('lifestyle', 'progress', 'carbon_footprint', 'user_id', 'delta', 'locale')
+    
+    def __init__(self, lifestyle: Lifestyle, progress: List[ProgressDay],
+                 carbon_footprint: Dict, user_id: Optional[str] = None, delta: bool = False,
+                 locale: Optional[str] = None):
+        self.lifestyle = lifestyle
+        self.progress = progress
+        self.carbon_footprint = carbon_footprint
+        self.user_id = user_id
+        self.delta = delta
+        self.locale = locale
+
+
+def _load(body: bytes):
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise ValidationError([{'type': 'json_invalid', 'loc': ['body', e.pos], 'msg': 'JSON decode error',
+                                'input': {}, 'ctx': {'error': e.msg}}])
+
+
+def _raise_if(errors: List[Dict]) -> None:
+    if errors:
+        raise ValidationError(errors)
+
+
+def parse_carbon_request(body: bytes) -> Lifestyle:
+    """
+    Parse and validate a `/calculate` body.
+    
+    Raises:
+        ValidationError: If the body is not valid JSON or fails validation
+    """
+    errors = []
+    lifestyle = Lifestyle.parse(_load(body), ('body',), errors)
+    _raise_if(errors)
+    return lifestyle
+
+
+def parse_batch_request(body: bytes) -> List[Lifestyle]:
+    """
+    Parse and validate a `/calculate/batch` body (`{"records": [...]}`).
+    
+    Raises:
+        ValidationError: If the body is not valid JSON or fails validation
+    """
+    errors = []
+    obj = _object_at(_load(body), ('body',), errors)
+    records = _Fields(obj, ('body',), errors).array('records') if obj is not None else None
+    lifestyles = [Lifestyle.parse(r, ('body', 'records', i), errors) for i, r in enumerate(records or ())]
+    _raise_if(errors)
+    return lifestyles
+
+
+def parse_insights_request(body: bytes) -> InsightsInput:
+    """
+    Parse and validate an `/insights` body.
+    
+    A body with `latest` instead of `recentProgress` is a delta request:
+    `userId` is required and activities may be left out.
+    
+    Raises:
+        ValidationError: If the body is not valid JSON or fails validation
+    """
+    errors = []
+    obj = _object_at(_load(body), ('body',), errors)
+    if obj is None:
+        raise ValidationError(errors)
+    fields = _Fields(obj, ('body',), errors)
+    
+    lifestyle = None
+    if 'lifestyle' in obj:
+        lifestyle = Lifestyle.parse(obj['lifestyle'], ('body', 'lifestyle'), errors)
+    else:
+        fields.model('lifestyle')
+    delta = 'recentProgress' not in obj and 'latest' in obj
+    key = 'latest' if delta else 'recentProgress'
+    progress_items = fields.array(key)
+    carbon_footprint = fields.object('carbonFootprint')
+    user_id = fields.string('userId', required=delta)
+    locale = fields.string('locale', required=False)
+    progress = [ProgressDay.parse(p, ('body', key, i), errors, activities_required=not delta)
+                for i, p in enumerate(progress_items or ())]
+    
+    _raise_if(errors)
+    return InsightsInput(lifestyle, progress, carbon_footprint, user_id, delta, locale)
+
+
+def parse_activity_batch(body: bytes) -> Dict[str, list]:
+    """
+    Parse an `/activities` body: `userIds`, `types`, `carbonImpacts` and
+    `timestamps` lists, one entry per event.
+    
+    Only the layout is checked here; lengths and values are checked when
+    the events are aggregated (`activity_store.aggregate_cells`), in bulk.
+    
+    Raises:
+        ValidationError: If the body is not valid JSON or a list is missing
+    """
+    errors = []
+    obj = _object_at(_load(body), ('body',), errors)
+    if obj is None:
+        raise ValidationError(errors)
+    fields = _Fields(obj, ('body',), errors)
+    columns = {name: fields.array(name) for name in ('userIds', 'types', 'carbonImpacts', 'timestamps')}
+    _raise_if(errors)
+    return columns
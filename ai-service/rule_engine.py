@@ -0,0 +1,286 @@
+"""
+Recommendation Rule Engine
+Compiles declarative recommendation rules into vectorized predicate and score matrices.
+"""
+
+import json
+import os
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+from insight_templates import Template, normalize_locale, resolve_locale
+from reloadable import ReloadableFile
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'recommendation_rules.json')
+
+COMPARISONS = ('>', '>=', '<', '<=', '==', '!=')
+
+# Output value replaced by the rule's saving, rounded to 2 decimals
+SAVING_PLACEHOLDER = '$saving'
+
+
+class CompiledRuleSet:
+    """
+    A rule set compiled into arrays so all rules are evaluated in one pass.
+    
+    Every clause becomes an open interval lo < x < hi over one feature column
+    (`>=`, `<=` and `==` use the adjacent float as bound, `!=` negates an
+    `==` interval); categorical clauses (`==`/`in` on strings) become 0/1
+    membership columns first. A clause-to-rule incidence matrix turns the (profiles x clauses) truth table
+    into fired rules with one matrix product, and savings are a single
+    (profiles x rules) multiply, so the Python-level work per evaluation does
+    not depend on the number of rules.
+    """
+    
+    def __init__(self, name: str, spec: Dict):
+        self.name = name
+        self.limit = spec.get('limit')
+        rules = spec['rules']
+        self.rule_ids = [rule['id'] for rule in rules]
+        
+        # Feature matrix layout: numeric features, categorical membership columns, constant one
+        self.numeric_features = []
+        self.categorical_columns = []
+        clauses = []
+        for r, rule in enumerate(rules):
+            for feature, condition in rule.get('when', {}).items():
+                for op, threshold in condition.items():
+                    clauses.append((r, feature, op, threshold))
+        
+        columns, ops, thresholds = [], [], []
+        for r, feature, op, threshold in clauses:
+            if op in ('in', 'not_in') or isinstance(threshold, str):
+                if op not in ('==', '!=', 'in', 'not_in'):
+                    raise ValueError(f"Rule '{self.rule_ids[r]}': operator '{op}' not supported for categories")
+                values = frozenset(threshold) if op in ('in', 'not_in') else frozenset((threshold,))
+                columns.append(('category', feature, values))
+                ops.append('==' if op in ('==', 'in') else '!=')
+                thresholds.append(1.0)
+            else:
+                if op not in COMPARISONS:
+                    raise ValueError(f"Rule '{self.rule_ids[r]}': unknown operator '{op}'")
+                columns.append(('number', feature, None))
+                ops.append(op)
+                thresholds.append(float(threshold))
+        
+        savings = []
+        for rule in rules:
+            saving = rule.get('saving', {'value': 0.0})
+            if 'feature' in saving:
+                savings.append((saving['feature'], float(saving.get('factor', 1.0))))
+            else:
+                savings.append((None, float(saving['value'])))
+        
+        for kind, feature, values in columns:
+            if kind == 'number' and feature not in self.numeric_features:
+                self.numeric_features.append(feature)
+            elif kind == 'category' and (feature, values) not in self.categorical_columns:
+                self.categorical_columns.append((feature, values))
+        for feature, _ in savings:
+            if feature is not None and feature not in self.numeric_features:
+                self.numeric_features.append(feature)
+        
+        # Compiled outputs per locale (None = the rules' own language); translations
+        # override output fields of their rule. Templates may reference numeric features too.
+        locales = sorted({normalize_locale(locale) for rule in rules for locale in rule.get('translations', {})})
+        outputs = {None: [rule['output'] for rule in rules]}
+        for locale in locales:
+            specs = []
+            for rule in rules:
+                spec = dict(rule['output'])
+                for tag, translation in rule.get('translations', {}).items():
+                    if normalize_locale(tag) == locale:
+                        spec.update(translation)
+                specs.append(spec)
+            outputs[locale] = specs
+        compiled = {locale: [self._compile_output(output) for output in specs] for locale, specs in outputs.items()}
+        
+        n_numeric = len(self.numeric_features)
+        one = n_numeric + len(self.categorical_columns)
+        index = {f: i for i, f in enumerate(self.numeric_features)}
+        for i, column in enumerate(self.categorical_columns):
+            index[column] = n_numeric + i
+        
+        self._clause_columns = np.array(
+            [index[feature] if kind == 'number' else index[(feature, values)] for kind, feature, values in columns],
+            dtype=np.intp
+        )
+        lower, upper, negate = [], [], []
+        for op, threshold in zip(ops, thresholds):
+            below = np.nextafter(threshold, -np.inf)
+            above = np.nextafter(threshold, np.inf)
+            lower.append({'>': threshold, '>=': below, '<': -np.inf, '<=': -np.inf}.get(op, below))
+            upper.append({'>': np.inf, '>=': np.inf, '<': threshold, '<=': above}.get(op, above))
+            negate.append(op == '!=')
+        self._lower = np.array(lower, dtype=np.float64)
+        self._upper = np.array(upper, dtype=np.float64)
+        self._negate = np.array(negate, dtype=bool) if any(negate) else None
+        
+        self._incidence = np.zeros((len(clauses), len(rules)), dtype=np.int32)
+        for c, (r, _, _, _) in enumerate(clauses):
+            self._incidence[c, r] = 1
+        self._required = self._incidence.sum(axis=0)
+        
+        self._saving_columns = np.array([one if f is None else index[f] for f, _ in savings], dtype=np.intp)
+        self._saving_factors = np.array([factor for _, factor in savings], dtype=np.float64)
+        self._width = one + 1
+        
+        # Template fields become row columns (-1 for the saving)
+        self.outputs = {
+            locale: [
+                [(key, kind, (value, tuple(-1 if f == 'saving' else index[f] for f in value.fields))
+                  if kind == 'template' else value) for key, kind, value in output]
+                for output in rule_outputs
+            ]
+            for locale, rule_outputs in compiled.items()
+        }
+    
+    def _compile_output(self, output: Dict) -> List[tuple]:
+        compiled = []
+        for key, value in output.items():
+            if value == SAVING_PLACEHOLDER:
+                compiled.append((key, 'saving', None))
+            elif isinstance(value, str) and '{' in value:
+                template = Template(value)
+                for f in template.fields:
+                    if f != 'saving' and f not in self.numeric_features:
+                        self.numeric_features.append(f)
+                compiled.append((key, 'template', template))
+            else:
+                compiled.append((key, 'static', value))
+        return compiled
+    
+    @property
+    def locales(self) -> List[str]:
+        """Locales with translated outputs."""
+        return [locale for locale in self.outputs if locale is not None]
+    
+    @property
+    def features(self) -> List[str]:
+        """Input columns the rule set reads."""
+        return self.numeric_features + [f for f, _ in self.categorical_columns if f not in self.numeric_features]
+    
+    def _matrix(self, columns: Dict[str, Sequence], n: int) -> np.ndarray:
+        X = np.empty((n, self._width), dtype=np.float64)
+        for i, feature in enumerate(self.numeric_features):
+            X[:, i] = np.asarray(columns[feature], dtype=np.float64)
+        offset = len(self.numeric_features)
+        for i, (feature, values) in enumerate(self.categorical_columns):
+            X[:, offset + i] = np.fromiter((v in values for v in columns[feature]), dtype=bool, count=n)
+        X[:, -1] = 1.0
+        return X
+    
+    def _row(self, profile: Dict) -> np.ndarray:
+        """Single-profile feature matrix built from Python scalars."""
+        row = [float(profile[f]) for f in self.numeric_features]
+        row.extend(float(profile[f] in values) for f, values in self.categorical_columns)
+        row.append(1.0)
+        return np.array([row])
+    
+    def evaluate(self, columns: Dict[str, Sequence], limit: Optional[int] = None,
+                 locale: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Evaluate all rules for a batch of profiles.
+        
+        Args:
+            columns: Feature name -> one value per profile (see `features`)
+            limit: Maximum outputs per profile (defaults to the rule set limit)
+            locale: Language of the outputs, e.g. "es" or "es-MX"; untranslated
+                locales get the rules' own outputs
+        
+        Returns:
+            Rendered outputs of the fired rules for each profile, highest
+            saving first (rule order breaks ties)
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        if n == 0 or not self.rule_ids:
+            return [[] for _ in range(n)]
+        return self._evaluate_matrix(self._matrix(columns, n), limit, locale)
+    
+    def evaluate_one(self, profile: Dict, limit: Optional[int] = None, locale: Optional[str] = None) -> List[Dict]:
+        """Evaluate all rules for a single profile dict of feature values."""
+        if not self.rule_ids:
+            return []
+        return self._evaluate_matrix(self._row(profile), limit, locale)[0]
+    
+    def _evaluate_matrix(self, X: np.ndarray, limit: Optional[int], locale: Optional[str] = None) -> List[List[Dict]]:
+        values = X[:, self._clause_columns]
+        truth = (values > self._lower) & (values < self._upper)
+        if self._negate is not None:
+            truth ^= self._negate
+        fired = truth.astype(np.int32) @ self._incidence == self._required
+        
+        saving = X[:, self._saving_columns] * self._saving_factors
+        score = np.where(fired, saving, -np.inf)
+        order = np.argsort(-score, axis=1, kind='stable')
+        limit = self.limit if limit is None else limit
+        if limit is not None:
+            order = order[:, :limit]
+        
+        fired_count = fired.sum(axis=1).tolist()
+        order_list = order.tolist()
+        rule_outputs = self.outputs[resolve_locale(locale, self.outputs)]
+        results = []
+        for i, count in enumerate(fired_count):
+            outputs = []
+            if count:
+                row = None
+                for r in order_list[i][:count]:
+                    value = float(saving[i, r])
+                    item = {}
+                    for key, kind, output in rule_outputs[r]:
+                        if kind == 'static':
+                            item[key] = output
+                        elif kind == 'saving':
+                            item[key] = round(value, 2)
+                        else:
+                            if row is None:
+                                row = X[i].tolist()
+                            template, fields = output
+                            item[key] = template.render_args(tuple([value if c < 0 else row[c] for c in fields]))
+                    outputs.append(item)
+            results.append(outputs)
+        
+        return results
+
+
+class RuleBook:
+    """One version of all compiled rule sets."""
+    
+    def __init__(self, version: str, rulesets: Dict[str, CompiledRuleSet]):
+        self.version = str(version)
+        self.rulesets = rulesets
+    
+    def __getitem__(self, name: str) -> CompiledRuleSet:
+        return self.rulesets[name]
+    
+    def describe(self) -> Dict:
+        return {
+            'version': self.version,
+            'rulesets': {name: rs.rule_ids for name, rs in self.rulesets.items()},
+            'locales': sorted({locale for rs in self.rulesets.values() for locale in rs.locales})
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RuleBook':
+        return cls(data['version'], {
+            name: CompiledRuleSet(name, spec) for name, spec in data['rulesets'].items()
+        })
+    
+    @classmethod
+    def load(cls, path: str = DEFAULT_RULES_PATH) -> 'RuleBook':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+class RuleRegistry(ReloadableFile[RuleBook]):
+    """Active rule book for a worker process, recompiled when the rules file changes."""
+    
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None):
+        if check_interval is None:
+            check_interval = float(os.getenv('RECOMMENDATION_RULES_CHECK_INTERVAL', 30))
+        super().__init__(
+            path or os.getenv('RECOMMENDATION_RULES_PATH', DEFAULT_RULES_PATH),
+            RuleBook.load,
+            check_interval
+        )
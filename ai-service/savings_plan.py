@@ -0,0 +1,168 @@
+"""
+Savings Plans
+Candidate lifestyle changes with effort scores, and Pareto fronts of savings versus effort.
+"""
+
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Lever -> (lifestyle section, emission category); diet is a top-level field
+LEVERS = {
+    'primaryMode': ('transportation', 'transportation'),
+    'distancePerDay': ('transportation', 'transportation'),
+    'electricityUsage': ('energy', 'energy'),
+    'gasUsage': ('energy', 'energy'),
+    'renewableEnergy': ('energy', 'energy'),
+    'diet': (None, 'diet'),
+    'clothesPerMonth': ('shopping', 'shopping'),
+    'electronicsPerYear': ('shopping', 'shopping')
+}
+
+# Effort (points, roughly 1 = an easy habit change) of switching to each transport mode
+MODE_EFFORT = {
+    'public_transport': 2.0,
+    'bicycle': 3.0,
+    'motorcycle': 3.0,
+    'car': 3.0,
+    'walking': 4.0,
+    'electric_car': 6.0
+}
+
+# Longest daily distance (km) a mode is offered for
+MODE_MAX_DISTANCE = {'walking': 5.0, 'bicycle': 20.0}
+
+# (fraction cut, effort) per reducible amount
+REDUCTIONS = {
+    'distancePerDay': ((0.1, 1.0), (0.2, 2.0), (0.3, 3.0), (0.5, 5.0)),
+    'electricityUsage': ((0.1, 1.0), (0.2, 2.0), (0.3, 3.5), (0.4, 5.0)),
+    'gasUsage': ((0.1, 1.0), (0.2, 2.0), (0.3, 3.5), (0.4, 5.0)),
+    'clothesPerMonth': ((0.25, 1.0), (0.5, 2.0), (0.75, 3.5)),
+    'electronicsPerYear': ((0.25, 1.0), (0.5, 2.0), (0.75, 3.5))
+}
+
+RENEWABLE_EFFORT = 2.0
+
+# Diets from most to least emitting; each step down the ladder costs DIET_STEP_EFFORT
+DIET_LADDER = ('high_meat', 'omnivore', 'pescatarian', 'vegetarian', 'vegan')
+DIET_STEP_EFFORT = 2.5
+
+# Default effort budget of a plan
+DEFAULT_MAX_EFFORT = 10.0
+
+# Emission differences below this (kg/day) count as ties
+EPSILON = 1e-9
+
+
+def lever_options(lever: str, baseline: Dict) -> List[Tuple[object, float]]:
+    """
+    Candidate values of one lever for a baseline lifestyle, as (value, effort)
+    pairs; the first is the current value at no effort.
+    """
+    section = LEVERS[lever][0]
+    current = baseline[lever] if section is None else baseline[section].get(lever)
+    
+    if lever == 'primaryMode':
+        current = current or 'car'
+        return [(current, 0.0)] + [(mode, effort) for mode, effort in MODE_EFFORT.items() if mode != current]
+    if lever == 'renewableEnergy':
+        return [(bool(current), 0.0)] + ([] if current else [(True, RENEWABLE_EFFORT)])
+    if lever == 'diet':
+        if current not in DIET_LADDER:
+            return [(current, 0.0)]
+        step = DIET_LADDER.index(current)
+        return [(diet, (i - step) * DIET_STEP_EFFORT) for i, diet in enumerate(DIET_LADDER) if i >= step]
+    
+    amount = float(current or 0)
+    options = [(current if current is not None else 0, 0.0)]
+    for cut, effort in REDUCTIONS[lever]:
+        value = round(amount * (1 - cut), 2)
+        if value < options[-1][0]:
+            options.append((value, effort))
+    return options
+
+
+def category_candidates(category: str, baseline: Dict,
+                        options: Dict[str, Sequence[Tuple[object, float]]]) -> Tuple[List[Dict[str, object]], np.ndarray]:
+    """
+    Every combination of the lever `options` belonging to one emission category.
+    
+    Returns:
+        (lever -> value for each candidate, effort of each candidate); the
+        first candidate changes nothing
+    """
+    names = [lever for lever in options if LEVERS[lever][1] == category]
+    current_mode = baseline['transportation'].get('primaryMode') or 'car'
+    current_distance = baseline['transportation'].get('distancePerDay', 0)
+    values, efforts = [], []
+    for combo in product(*(options[lever] for lever in names)):
+        setting = {lever: value for lever, (value, _) in zip(names, combo)}
+        mode = setting.get('primaryMode', current_mode)
+        distance = float(setting.get('distancePerDay', current_distance) or 0)
+        # Switching to an active mode is only offered for distances it can cover
+        if mode != current_mode and distance > MODE_MAX_DISTANCE.get(mode, np.inf):
+            continue
+        values.append(setting)
+        efforts.append(sum(effort for _, effort in combo))
+    return values, np.array(efforts, dtype=np.float64)
+
+
+def pareto_front(effort: np.ndarray, emissions: np.ndarray) -> np.ndarray:
+    """
+    Indices of the options no other option matches or beats on both effort
+    and emissions, lowest effort first.
+    """
+    order = np.lexsort((emissions, effort))
+    sorted_emissions = emissions[order]
+    best = np.minimum.accumulate(sorted_emissions)
+    keep = np.empty(len(order), dtype=bool)
+    keep[:1] = True
+    keep[1:] = sorted_emissions[1:] < best[:-1] - EPSILON
+    return order[keep]
+
+
+def combine_fronts(fronts: List[Tuple[np.ndarray, np.ndarray]],
+                   max_effort: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pareto front of plans picking one option per category.
+    
+    Efforts and emissions add up across categories, so a plan can only be
+    Pareto-optimal if each of its options is on its own category's front:
+    the fronts are merged one category at a time, keeping only the
+    combined front within the effort budget after each merge.
+    
+    Args:
+        fronts: (effort, emissions) of each category's options
+        max_effort: Effort budget of a plan
+    
+    Returns:
+        (effort, emissions, chosen option per category as an (n, categories)
+        index matrix) of the front, lowest effort first
+    """
+    effort = np.zeros(1)
+    emissions = np.zeros(1)
+    choices = np.zeros((1, 0), dtype=np.intp)
+    for option_effort, option_emissions in fronts:
+        within = np.flatnonzero(option_effort <= max_effort + EPSILON)
+        front = within[pareto_front(option_effort[within], option_emissions[within])]
+        
+        total_effort = (effort[:, None] + option_effort[front][None, :]).ravel()
+        total_emissions = (emissions[:, None] + option_emissions[front][None, :]).ravel()
+        plan, option = np.divmod(np.arange(len(total_effort)), len(front))
+        within = np.flatnonzero(total_effort <= max_effort + EPSILON)
+        keep = within[pareto_front(total_effort[within], total_emissions[within])]
+        
+        effort = total_effort[keep]
+        emissions = total_emissions[keep]
+        choices = np.column_stack((choices[plan[keep]], front[option[keep]]))
+    return effort, emissions, choices
+
+
+def spread(count: int, limit: Optional[int]) -> np.ndarray:
+    """`limit` indices spread evenly over `count` items, always keeping the last."""
+    if limit is None or count <= limit:
+        return np.arange(count)
+    if limit <= 0:
+        return np.arange(0)
+    return np.unique(np.round(np.linspace(count - 1, 0, limit)).astype(np.intp))
@@ -0,0 +1,131 @@
+"""
+Production Server
+Pre-fork multi-worker server that shares warm application state copy-on-write.
+"""
+
+import gc
+import glob
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import uvicorn
+
+RESPAWN_DELAY = 1.0
+
+
+def default_workers() -> int:
+    return max(1, int(os.getenv("WORKERS", os.cpu_count() or 1)))
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Create the listening socket once so every worker accepts from it."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, host: str, port: int):
+    """Serve `app` on the inherited socket until told to stop."""
+    config = uvicorn.Config(app, host=host, port=port, log_level="info")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket, host: str, port: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(app, sock, host, port)
+        except BaseException:
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    return pid
+
+
+def serve(app, host: str = "0.0.0.0", port: int = 8000, workers: int = 1):
+    """
+    Run `app` in `workers` forked processes sharing one listening socket.
+    
+    The caller imports the application first, so emission factor tables,
+    compiled rules and other module-level state are loaded once in the
+    parent. `gc.freeze()` moves them out of the collector's reach before
+    forking, which keeps the shared pages from being copied when a worker
+    runs a collection. Workers that die are replaced; SIGINT/SIGTERM stop
+    all of them gracefully.
+    
+    Args:
+        app: ASGI application, already imported and warmed
+        host: Interface to bind
+        port: Port to bind
+        workers: Number of worker processes
+    """
+    if workers <= 1 or not hasattr(os, 'fork'):
+        uvicorn.run(app, host=host, port=port)
+        return
+    
+    # Workers write metric snapshots here so /metrics can merge all of them
+    metrics_dir = os.getenv('METRICS_MULTIPROC_DIR')
+    owns_metrics_dir = not metrics_dir
+    if owns_metrics_dir:
+        metrics_dir = tempfile.mkdtemp(prefix='ecostep-metrics-')
+        os.environ['METRICS_MULTIPROC_DIR'] = metrics_dir
+    for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')):
+        os.remove(path)
+    
+    sock = bind_socket(host, port)
+    gc.collect()
+    gc.freeze()
+    
+    children: Dict[int, float] = {}
+    stopping = False
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    
+    print(f"Starting {workers} workers on {host}:{port} (parent pid {os.getpid()})", flush=True)
+    for _ in range(workers):
+        children[_spawn(app, sock, host, port)] = time.monotonic()
+    
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        
+        print(f"Worker {pid} exited with status {status}, restarting", flush=True)
+        if time.monotonic() - started < RESPAWN_DELAY:
+            time.sleep(RESPAWN_DELAY)
+        if not stopping:
+            children[_spawn(app, sock, host, port)] = time.monotonic()
+    
+    sock.close()
+    if owns_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
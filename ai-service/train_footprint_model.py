@@ -0,0 +1,256 @@
+"""
+Footprint Model Training
+Offline pipeline that learns per-user expected emissions and insight thresholds from progress history.
+
+Usage:
+    python train_footprint_model.py progress.csv
+    python train_footprint_model.py --history data/history -o data/models/footprint_model.npz
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timezone
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+
+from footprint_model import (DEFAULT_CHANGE_THRESHOLD, DEFAULT_MODEL_PATH, DEFAULT_VARIANCE_THRESHOLD, FEATURES,
+                             MIN_PREVIOUS_DAYS, PREVIOUS_DAYS, FootprintModel)
+from history_store import LOG_NAME, RECORD
+
+# Quantiles of a user's own history that define their thresholds: a week-over-week
+# change is notable above the 80th percentile of their absolute changes, and a week
+# is consistent below the 25th percentile of their weekly variances
+CHANGE_QUANTILE = 0.8
+VARIANCE_QUANTILE = 0.25
+
+# Pseudo-counts pulling users with little history towards the population values
+WEEKDAY_SHRINKAGE = 4
+SIGMA_SHRINKAGE = 14
+THRESHOLD_SHRINKAGE = 8
+
+# Thresholds never go below these, so tiny noise is not reported as a change
+MIN_CHANGE_THRESHOLD = 1.0
+MIN_VARIANCE_THRESHOLD = 0.05
+
+RIDGE_ALPHA = 1.0
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def load_csv(path: str) -> pd.DataFrame:
+    """Progress rows from a CSV export with userId, date and total columns."""
+    frame = pd.read_csv(sys.stdin if path == '-' else path, dtype={'userId': str},
+                        usecols=['userId', 'date', 'total'])
+    days = pd.to_datetime(frame['date'], utc=True, format='ISO8601').dt.tz_localize(None)
+    return pd.DataFrame({
+        'user': frame['userId'],
+        'day': days.to_numpy().astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL,
+        'total': frame['total'].astype(np.float64)
+    })
+
+
+def load_history(directory: str) -> pd.DataFrame:
+    """Progress rows from a HistoryStore log, in log order."""
+    rows = np.fromfile(os.path.join(directory, LOG_NAME), dtype=RECORD)
+    return pd.DataFrame({
+        'user': pd.Series(rows['user']).str.decode('utf-8'),
+        'day': rows['day'].astype(np.int64),
+        'total': rows['total']
+    })
+
+
+def _positions(frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Index of each row's first user row, and prefix sums of totals (length rows + 1)."""
+    user = frame['user'].to_numpy()
+    first = np.ones(len(frame), dtype=bool)
+    first[1:] = user[1:] != user[:-1]
+    start = np.maximum.accumulate(np.where(first, np.arange(len(frame)), 0))
+    sums = np.concatenate(([0.0], np.cumsum(frame['total'].to_numpy())))
+    return start, sums
+
+
+def _features(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Regression features for every day that has enough earlier days.
+    
+    Matches `FootprintModel.personalize`: the mean of the user's previous
+    PREVIOUS_DAYS entries (by position, not calendar), the entry before,
+    and the user's level, here the mean of all their earlier entries.
+    Rows must be sorted by user, then day.
+    """
+    start, sums = _positions(frame)
+    index = np.arange(len(frame))
+    earlier = index - start
+    window_start = np.maximum(index - PREVIOUS_DAYS, start)
+    total = frame['total'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        previous_mean = (sums[index] - sums[window_start]) / (index - window_start)
+        level = (sums[index] - sums[start]) / earlier
+    keep = earlier >= MIN_PREVIOUS_DAYS
+    rows = pd.DataFrame({
+        'user': frame['user'].to_numpy()[keep],
+        'day': frame['day'].to_numpy()[keep],
+        'total': total[keep],
+        'previousMean': previous_mean[keep],
+        'previousDay': total[np.maximum(index - 1, 0)][keep],
+        'level': level[keep]
+    })
+    weekday = rows['day'].to_numpy() % 7
+    for d in range(7):
+        rows[f'weekday{d}'] = (weekday == d).astype(np.float64)
+    return rows
+
+
+def _weekly_windows(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Absolute week-over-week change % and variance of every full 7-entry window.
+    
+    Same definitions as InsightsGenerator._analyze_trends: mean of the newest
+    3 days against the mean of the oldest 3 of the window.
+    """
+    start, sums = _positions(frame)
+    squares = np.concatenate(([0.0], np.cumsum(frame['total'].to_numpy() ** 2)))
+    index = np.arange(len(frame))
+    index = index[index - start >= 6]
+    newest = (sums[index + 1] - sums[index - 2]) / 3
+    oldest = (sums[index - 3] - sums[index - 6]) / 3
+    mean = (sums[index + 1] - sums[index - 6]) / 7
+    variance = np.maximum((squares[index + 1] - squares[index - 6]) / 7 - mean ** 2, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(oldest > 0, (oldest - newest) / oldest * 100, 0.0)
+    return pd.DataFrame({'user': frame['user'].to_numpy()[index], 'change': np.abs(change),
+                         'variance': variance})
+
+
+def _shrink(values: pd.Series, counts: pd.Series, prior: float, strength: float) -> pd.Series:
+    return (values * counts + prior * strength) / (counts + strength)
+
+
+def train(frame: pd.DataFrame, alpha: float = RIDGE_ALPHA, holdout: float = 0.0) -> FootprintModel:
+    """
+    Fit the footprint model on daily progress rows.
+    
+    Args:
+        frame: Columns user, day (day number) and total; the last row for a
+            (user, day) wins
+        alpha: Ridge regularization strength
+        holdout: Fraction of the latest days kept out of a first fit to
+            measure prediction error (the returned model is fitted on all rows)
+    
+    Returns:
+        Trained FootprintModel; `meta` holds training sizes and holdout errors
+    
+    Raises:
+        ValueError: If no user has enough days to train on
+    """
+    frame = frame.drop_duplicates(['user', 'day'], keep='last').sort_values(['user', 'day'], kind='stable')
+    frame = frame.reset_index(drop=True)
+    rows = _features(frame)
+    if rows.empty:
+        raise ValueError(f"No user has more than {MIN_PREVIOUS_DAYS} days of history")
+    features = list(FEATURES)
+    meta: Dict = {'rows': int(len(frame)), 'trainingRows': int(len(rows))}
+    
+    if holdout > 0:
+        cutoff = rows['day'].quantile(1 - holdout)
+        fit, test = rows[rows['day'] <= cutoff], rows[rows['day'] > cutoff]
+        if len(fit) and len(test):
+            model = Ridge(alpha=alpha, fit_intercept=False).fit(fit[features], fit['total'])
+            error = np.abs(model.predict(test[features]) - test['total'])
+            meta['holdoutRows'] = int(len(test))
+            meta['holdoutMae'] = round(float(error.mean()), 4)
+            meta['baselineMae'] = round(float(np.abs(test['previousMean'] - test['total']).mean()), 4)
+    
+    model = Ridge(alpha=alpha, fit_intercept=False).fit(rows[features], rows['total'])
+    coef = model.coef_.astype(np.float64)
+    residual = rows['total'].to_numpy() - rows[features].to_numpy() @ coef
+    
+    users = pd.Index(frame['user'].unique())
+    n_users = len(users)
+    codes = users.get_indexer(rows['user'])
+    weekday = rows['day'].to_numpy() % 7
+    level = (np.bincount(users.get_indexer(frame['user']), weights=frame['total'].to_numpy(), minlength=n_users)
+             / np.bincount(users.get_indexer(frame['user']), minlength=n_users))
+    
+    # Per-user weekday offsets of the residual, shrunk towards zero
+    cell = codes * 7 + weekday
+    offsets = (np.bincount(cell, weights=residual, minlength=n_users * 7)
+               / (np.bincount(cell, minlength=n_users * 7) + WEEKDAY_SHRINKAGE)).reshape(n_users, 7)
+    residual = residual - offsets[codes, weekday]
+    
+    # Residual spread per user, shrunk towards the population's spread relative to level
+    squares = np.bincount(codes, weights=residual ** 2, minlength=n_users)
+    counts = np.bincount(codes, minlength=n_users)
+    enough = (counts >= SIGMA_SHRINKAGE) & (level > 0)
+    if enough.any():
+        default_cv = float(np.median(np.sqrt(squares[enough] / counts[enough]) / level[enough]))
+    else:
+        default_cv = float(np.sqrt((residual ** 2).mean()) / max(level.mean(), 1e-9))
+    sigma = np.sqrt((squares + SIGMA_SHRINKAGE * (default_cv * level) ** 2) / (counts + SIGMA_SHRINKAGE))
+    
+    # Thresholds from each user's own weekly windows, shrunk towards the population quantiles
+    windows = _weekly_windows(frame)
+    if len(windows):
+        default_change = max(float(windows['change'].quantile(CHANGE_QUANTILE)), MIN_CHANGE_THRESHOLD)
+        default_variance = max(float(windows['variance'].quantile(VARIANCE_QUANTILE)), MIN_VARIANCE_THRESHOLD)
+        grouped = windows.groupby('user')
+        counts = grouped.size().reindex(users, fill_value=0)
+        change = grouped['change'].quantile(CHANGE_QUANTILE).reindex(users, fill_value=default_change)
+        variance = grouped['variance'].quantile(VARIANCE_QUANTILE).reindex(users, fill_value=default_variance)
+        change = _shrink(change, counts, default_change, THRESHOLD_SHRINKAGE).clip(lower=MIN_CHANGE_THRESHOLD)
+        variance = _shrink(variance, counts, default_variance, THRESHOLD_SHRINKAGE).clip(lower=MIN_VARIANCE_THRESHOLD)
+        meta['windows'] = int(len(windows))
+    else:
+        default_change, default_variance = DEFAULT_CHANGE_THRESHOLD, DEFAULT_VARIANCE_THRESHOLD
+        change = pd.Series(default_change, index=users)
+        variance = pd.Series(default_variance, index=users)
+    
+    trained_at = datetime.now(timezone.utc)
+    meta.update({'users': int(len(users)), 'trainedAt': trained_at.isoformat(timespec='seconds'),
+                 'features': features})
+    return FootprintModel(
+        trained_at.strftime('%Y%m%dT%H%M%SZ'),
+        coef=coef,
+        users=users.tolist(),
+        level=level,
+        sigma=sigma,
+        weekday=offsets,
+        change_threshold=change.to_numpy(),
+        variance_threshold=variance.to_numpy(),
+        default_cv=default_cv,
+        default_change=default_change,
+        default_variance=default_variance,
+        meta=meta
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Train the footprint model from a CSV export with userId, date and total "
+                    "columns, or from a progress history log.")
+    parser.add_argument('input', nargs='?', help="CSV file ('-' for stdin)")
+    parser.add_argument('--history', default=None, help="History store directory to read instead of a CSV")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Artifact path (default: FOOTPRINT_MODEL_PATH or data/models/footprint_model.npz)")
+    parser.add_argument('--alpha', type=float, default=RIDGE_ALPHA, help="Ridge regularization strength")
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help="Fraction of the latest days used to report prediction error")
+    args = parser.parse_args(argv)
+    if (args.input is None) == (args.history is None):
+        parser.error("give either a CSV file or --history")
+    
+    frame = load_history(args.history) if args.history else load_csv(args.input)
+    model = train(frame, alpha=args.alpha, holdout=args.holdout)
+    output = args.output or os.getenv('FOOTPRINT_MODEL_PATH', DEFAULT_MODEL_PATH)
+    model.save(output)
+    print(json.dumps({**model.stats(), 'path': output, 'bytes': os.path.getsize(output)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Trend Store
+Per-user incremental emission aggregates with O(1) updates per progress record.
+"""
+
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Union
+
+# Rolling windows (days) kept for every user
+WINDOWS = (7, 30, 90)
+
+# Each window is compared with the window before it, so the ring covers two of the longest
+RING_DAYS = 2 * max(WINDOWS)
+
+
+def day_number(value: Union[str, int, date, datetime]) -> int:
+    """Proleptic Gregorian day number for an ISO date string, date, datetime or day number."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class UserTrend:
+    """
+    Running aggregates for one user's daily emission totals.
+    
+    All-time mean and variance use Welford's algorithm. Daily totals for the
+    last RING_DAYS days live in a ring buffer with running sums for each
+    rolling window and the window before it, so recording a day costs O(1)
+    (amortized over the days elapsed since the previous record).
+    
+    A day holds one total; recording the same day again replaces it, which
+    makes re-sending recent history idempotent. Only days in the ring can be
+    replaced: a day older than RING_DAYS is added to the all-time statistics
+    each time it is recorded, which makes them approximate when such days
+    are re-sent.
+    """
+    
+    __slots__ = ('count', 'mean', 'm2', 'last_day', 'totals', 'present',
+                 'sums', 'squares', 'days', 'previous_sums', 'previous_days')
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.last_day = None
+        self.totals = array('d', bytes(8 * RING_DAYS))
+        self.present = bytearray(RING_DAYS)
+        n = len(WINDOWS)
+        self.sums = [0.0] * n
+        self.squares = [0.0] * n
+        self.days = [0] * n
+        self.previous_sums = [0.0] * n
+        self.previous_days = [0] * n
+    
+    def record(self, day: int, total: float) -> None:
+        """Record (or replace) the emission total for a day number."""
+        total = float(total)
+        if self.last_day is None:
+            self.last_day = day
+        elif day > self.last_day:
+            self._advance(day)
+        
+        offset = self.last_day - day
+        if offset >= RING_DAYS:
+            # Too old for the windows; still part of the all-time statistics
+            self._welford_add(total)
+            return
+        
+        slot = day % RING_DAYS
+        if self.present[slot]:
+            old = self.totals[slot]
+            self._welford_remove(old)
+            self._window_update(offset, old, -1)
+        
+        self.totals[slot] = total
+        self.present[slot] = 1
+        self._welford_add(total)
+        self._window_update(offset, total, 1)
+    
+    def _advance(self, day: int) -> None:
+        """Move the ring forward to `day`, expiring days that leave each window."""
+        if day - self.last_day >= RING_DAYS:
+            self.present = bytearray(RING_DAYS)
+            n = len(WINDOWS)
+            self.sums, self.squares, self.days = [0.0] * n, [0.0] * n, [0] * n
+            self.previous_sums, self.previous_days = [0.0] * n, [0] * n
+            self.last_day = day
+            return
+        
+        for current in range(self.last_day + 1, day + 1):
+            for i, window in enumerate(WINDOWS):
+                # Day leaving the current window moves into the previous one
+                slot = (current - window) % RING_DAYS
+                if self.present[slot]:
+                    value = self.totals[slot]
+                    self.sums[i] -= value
+                    self.squares[i] -= value * value
+                    self.days[i] -= 1
+                    self.previous_sums[i] += value
+                    self.previous_days[i] += 1
+                
+                # Day leaving the previous window drops out entirely
+                slot = (current - 2 * window) % RING_DAYS
+                if self.present[slot]:
+                    self.previous_sums[i] -= self.totals[slot]
+                    self.previous_days[i] -= 1
+            
+            # The slot for `current` held the day RING_DAYS ago, already expired above
+            self.present[current % RING_DAYS] = 0
+        
+        self.last_day = day
+    
+    def _window_update(self, offset: int, value: float, sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) a day's value `offset` days before last_day."""
+        for i, window in enumerate(WINDOWS):
+            if offset < window:
+                self.sums[i] += sign * value
+                self.squares[i] += sign * value * value
+                self.days[i] += sign
+            elif offset < 2 * window:
+                self.previous_sums[i] += sign * value
+                self.previous_days[i] += sign
+    
+    def _welford_add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+    
+    def _welford_remove(self, value: float) -> None:
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        mean = (self.count * self.mean - value) / (self.count - 1)
+        self.m2 -= (value - self.mean) * (value - mean)
+        self.mean = mean
+        self.count -= 1
+    
+    def snapshot(self) -> Dict:
+        """Aggregates for the all-time history and each rolling window."""
+        windows = {}
+        for i, window in enumerate(WINDOWS):
+            days = self.days[i]
+            mean = self.sums[i] / days if days else None
+            variance = max(self.squares[i] / days - mean * mean, 0.0) if days else None
+            previous_mean = self.previous_sums[i] / self.previous_days[i] if self.previous_days[i] else None
+            change_percent = None
+            if mean is not None and previous_mean:
+                change_percent = (previous_mean - mean) / previous_mean * 100
+            windows[window] = {
+                'days': days,
+                'total': self.sums[i],
+                'mean': mean,
+                'variance': variance,
+                'previousDays': self.previous_days[i],
+                'previousMean': previous_mean,
+                'changePercent': change_percent
+            }
+        
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'variance': self.m2 / self.count if self.count else 0.0,
+            'lastDay': date.fromordinal(self.last_day).isoformat() if self.last_day else None,
+            'windows': windows
+        }
+
+
+class TrendStore:
+    """Thread-safe map of user id to UserTrend, bounded by least-recent use."""
+    
+    def __init__(self, max_users: Optional[int] = None):
+        if max_users is None:
+            max_users = int(os.getenv('TREND_STORE_MAX_USERS', 100000))
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def record(self, user_id: str, day: Union[str, date, datetime], total: float) -> None:
+        """Record one day's total emissions for a user."""
+        self.record_many(user_id, [(day, total)])
+    
+    def record_many(self, user_id: str, records: Iterable) -> None:
+        """Record (day, total) pairs for a user in any order."""
+        parsed = sorted((day_number(day), total) for day, total in records)
+        with self._lock:
+            trend = self._users.get(user_id)
+            if trend is None:
+                trend = self._users[user_id] = UserTrend()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            for day, total in parsed:
+                trend.record(day, total)
+    
+    def record_progress(self, user_id: str, progress: Iterable[Dict]) -> None:
+        """Record progress documents shaped like InsightsRequest.recentProgress."""
+        self.record_many(user_id, [(p['date'], p['carbonData']['total']) for p in progress
+                                   if 'total' in p.get('carbonData', {})])
+    
+    def snapshot(self, user_id: str) -> Optional[Dict]:
+        """Aggregates for a user, or None if nothing has been recorded."""
+        with self._lock:
+            trend = self._users.get(user_id)
+            return trend.snapshot() if trend is not None else None
+    
+    def __len__(self) -> int:
+        return len(self._users)
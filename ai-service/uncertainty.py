@@ -0,0 +1,185 @@
+"""
+Emission Uncertainty
+Monte Carlo percentile bands of daily emissions from sampled emission factors.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from emission_factors import EmissionFactorTable
+
+DEFAULT_SAMPLES = 1000
+MAX_SAMPLES = 20000
+DEFAULT_SEED = 0
+
+# Reported percentiles of the sampled emissions (symmetric around the median)
+PERCENTILES = (5, 50, 95)
+BAND_KEYS = tuple(f'p{q}' for q in PERCENTILES)
+
+CATEGORIES = ('transportation', 'energy', 'diet', 'shopping')
+
+# Largest (users x samples) block evaluated at once, per category
+MAX_BLOCK_ELEMENTS = 1_000_000
+
+# Factor draws kept per process (one per table version, sample count and seed)
+DRAW_CACHE_SIZE = 8
+
+
+def default_samples() -> int:
+    return int(os.getenv('UNCERTAINTY_SAMPLES', DEFAULT_SAMPLES))
+
+
+def default_seed() -> int:
+    return int(os.getenv('UNCERTAINTY_SEED', DEFAULT_SEED))
+
+
+def sample_factors(table: EmissionFactorTable, samples: int, seed: int) -> Dict[str, np.ndarray]:
+    """
+    Draw `samples` versions of every emission factor.
+    
+    Each factor is lognormal with the table's point value as its median and
+    the table's relative uncertainty as its spread. One draw of a factor is
+    shared by every user, since factor uncertainty is common to all of them.
+    
+    Returns:
+        Categorical factors as (categories, samples) arrays and scalar
+        factors as (samples,) arrays
+    """
+    rng = np.random.default_rng(seed)
+    
+    def draw(point: np.ndarray, sigma: np.ndarray) -> np.ndarray:
+        point = np.asarray(point, dtype=np.float64)
+        return (point * np.exp(rng.standard_normal((samples,) + point.shape) * sigma)).T.copy()
+    
+    return {
+        'transport': draw(table.transport_factor_array, table.transport_sigma),
+        'electricity': draw(table.electricity_factor_array, table.electricity_sigma),
+        'gas': draw(table.gas_factor, table.gas_sigma),
+        'renewable': draw(table.renewable_factor, table.renewable_sigma),
+        'diet': draw(table.diet_factor_array, table.diet_sigma),
+        'clothing': draw(table.clothing_factor, table.clothing_sigma),
+        'electronics': draw(table.electronics_factor, table.electronics_sigma)
+    }
+
+
+def sampled_breakdown(columns: Dict[str, np.ndarray], draws: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """(users, samples) daily emissions per category, as `CarbonCalculator._breakdown_arrays` per draw."""
+    renewable = np.where(columns['renewable'][:, None], draws['renewable'], 1.0)
+    return {
+        'transportation': columns['distance'][:, None] * draws['transport'][columns['mode']],
+        'energy': (
+            columns['electricity'][:, None] * draws['electricity'][columns['region']] * renewable +
+            columns['gas'][:, None] * draws['gas']
+        ),
+        'diet': draws['diet'][columns['diet']],
+        'shopping': (
+            (columns['clothes'][:, None] * draws['clothing'] / 30) +
+            (columns['electronics'][:, None] * draws['electronics'] / 365)
+        )
+    }
+
+
+def percentiles(values: np.ndarray, q=PERCENTILES) -> np.ndarray:
+    """
+    `np.percentile(values, q, axis=-1)` (linear interpolation), moved to the last axis.
+    
+    One partition around every needed order statistic replaces a full sort.
+    """
+    n = values.shape[-1]
+    position = np.asarray(q, dtype=np.float64) / 100 * (n - 1)
+    low = np.floor(position).astype(np.intp)
+    high = np.minimum(low + 1, n - 1)
+    weight = position - low
+    ordered = np.partition(values, np.unique(np.concatenate((low, high))), axis=-1)
+    return ordered[..., low] * (1 - weight) + ordered[..., high] * weight
+
+
+class UncertaintyEstimator:
+    """
+    Percentile bands of the daily total and each breakdown category.
+    
+    Factor draws depend only on the table, sample count and seed, so they
+    are drawn once and reused across requests; a request then costs one
+    vectorized (users x samples) pass and a partition per user for energy,
+    shopping and the total. Transportation and diet scale a single factor,
+    so their bands are those of the factor's draws, computed with them.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._draws: 'OrderedDict[Tuple, Dict[str, np.ndarray]]' = OrderedDict()
+    
+    def draws(self, table: EmissionFactorTable, samples: int, seed: int) -> Dict[str, np.ndarray]:
+        key = (id(table), table.version, samples, seed)
+        with self._lock:
+            draws = self._draws.get(key)
+            if draws is not None:
+                self._draws.move_to_end(key)
+                return draws
+        draws = sample_factors(table, samples, seed)
+        draws['transport_bands'] = percentiles(draws['transport'])
+        draws['diet_bands'] = percentiles(draws['diet'])
+        with self._lock:
+            self._draws[key] = draws
+            while len(self._draws) > DRAW_CACHE_SIZE:
+                self._draws.popitem(last=False)
+        return draws
+    
+    def bands(self, table: EmissionFactorTable, columns: Dict[str, np.ndarray], samples: int,
+              seed: int) -> Dict[str, np.ndarray]:
+        """
+        Percentiles of each category and the total for encoded records.
+        
+        Args:
+            table: Emission factor table the records were encoded with
+            columns: Encoded records (see `CarbonCalculator._encode_records`)
+            samples: Monte Carlo samples
+            seed: Seed of the factor draws; equal seeds give equal bands
+        
+        Returns:
+            Category (and "daily") -> (len(PERCENTILES), users) array
+        
+        Raises:
+            ValueError: If `samples` is out of range
+        """
+        if not 1 <= samples <= MAX_SAMPLES:
+            raise ValueError(f"samples must be between 1 and {MAX_SAMPLES}")
+        draws = self.draws(table, samples, seed)
+        users = len(columns['mode'])
+        result = {}
+        
+        # Scaling keeps the order of the draws; a negative distance reverses it,
+        # which swaps the symmetric PERCENTILES
+        distance = columns['distance'][:, None]
+        transport = draws['transport_bands'][columns['mode']]
+        result['transportation'] = (distance * np.where(distance < 0, transport[:, ::-1], transport)).T
+        result['diet'] = draws['diet_bands'][columns['diet']].T
+        
+        summed = np.empty((3, users, len(PERCENTILES)))
+        block = max(1, MAX_BLOCK_ELEMENTS // samples)
+        for start in range(0, users, block):
+            part = {name: values[start:start + block] for name, values in columns.items()}
+            breakdown = sampled_breakdown(part, draws)
+            daily = breakdown['transportation'] + breakdown['energy'] + breakdown['diet'] + breakdown['shopping']
+            summed[:, start:start + block] = percentiles(np.stack((breakdown['energy'], breakdown['shopping'], daily)))
+        result['energy'], result['shopping'], result['daily'] = (values.T for values in summed)
+        return result
+    
+    def describe(self, table: EmissionFactorTable, columns: Dict[str, np.ndarray], samples: int,
+                 seed: int) -> List[Dict]:
+        """Per-record `uncertainty` response objects, values rounded to 2 decimals."""
+        bands = self.bands(table, columns, samples, seed)
+        rounded = {name: np.round(values, 2).T.tolist() for name, values in bands.items()}
+        results = []
+        for i in range(len(columns['mode'])):
+            results.append({
+                'samples': samples,
+                'seed': seed,
+                'daily': dict(zip(BAND_KEYS, rounded['daily'][i])),
+                'breakdown': {name: dict(zip(BAND_KEYS, rounded[name][i])) for name in CATEGORIES}
+            })
+        return results
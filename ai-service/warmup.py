@@ -0,0 +1,92 @@
+"""
+Startup Warm-up
+Runs one-off warm-up steps after start-up and reports when the service is ready.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = ('background', 'blocking', 'off')
+
+
+def warmup_mode() -> str:
+    mode = os.getenv('STARTUP_WARMUP', 'background').lower()
+    if mode not in MODES:
+        raise ValueError(f"STARTUP_WARMUP must be one of {', '.join(MODES)}, got {mode!r}")
+    return mode
+
+
+class Warmup:
+    """
+    Named warm-up steps, run once.
+    
+    Steps import lazily loaded dependencies, load data files and exercise
+    each request path once, so the first real requests do not pay for it.
+    A failing step is logged and recorded but does not block readiness:
+    the service still works cold, only slower.
+    """
+    
+    def __init__(self):
+        self.steps: Dict[str, Callable[[], object]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._durations: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._duration: Optional[float] = None
+    
+    def step(self, name: str) -> Callable:
+        """Decorator registering a warm-up step."""
+        def register(func: Callable[[], object]) -> Callable[[], object]:
+            self.steps[name] = func
+            return func
+        return register
+    
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+    
+    def run(self) -> Dict:
+        """Run all steps in the calling thread (once; later calls just report status)."""
+        with self._lock:
+            if not self.ready:
+                started = time.perf_counter()
+                for name, func in self.steps.items():
+                    step_started = time.perf_counter()
+                    try:
+                        func()
+                    except Exception as e:
+                        logger.warning("Warm-up step %s failed: %s", name, e)
+                        self._errors[name] = str(e)
+                    self._durations[name] = time.perf_counter() - step_started
+                self._duration = time.perf_counter() - started
+                self._ready.set()
+        return self.status()
+    
+    def start(self) -> None:
+        """Run the steps on a daemon thread, unless already running or done."""
+        with self._lock:
+            if self.ready or self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+            self._thread.start()
+    
+    def skip(self) -> None:
+        """Report ready without running any step."""
+        self._ready.set()
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+    
+    def status(self) -> Dict:
+        return {
+            'ready': self.ready,
+            'durationMs': round(self._duration * 1000, 2) if self._duration is not None else None,
+            'steps': {name: round(seconds * 1000, 2) for name, seconds in self._durations.items()},
+            'errors': dict(self._errors)
+        }
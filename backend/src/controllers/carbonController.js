@@ -2,6 +2,17 @@ const axios = require('axios');
 const User = require('../models/User');
 const Progress = require('../models/Progress');
 
+// Dashboard calls to the AI service: interactive priority, with a deadline
+// matching our timeout so it sheds work we would no longer wait for
+const AI_TIMEOUT_MS = 10000;
+const aiDashboardRequest = {
+  timeout: AI_TIMEOUT_MS,
+  headers: {
+    'X-Priority': 'interactive',
+    'X-Request-Deadline-Ms': String(AI_TIMEOUT_MS)
+  }
+};
+
 // @desc    Calculate carbon footprint
 // @route   POST /api/v1/carbon/calculate
 // @access  Private
@@ -22,7 +33,7 @@ exports.calculateFootprint = async (req, res) => {
       const aiResponse = await axios.post(
         `${process.env.AI_SERVICE_URL}/calculate`,
         lifestyleData,
-        { timeout: 10000 }
+        aiDashboardRequest
       );
 
       const carbonData = aiResponse.data;
@@ -181,10 +192,22 @@ exports.logActivity = async (req, res) => {
 
     await progress.save();
 
+    const activity = progress.activities[progress.activities.length - 1];
+
+    // Feed the AI service's activity insights without holding up the response
+    axios.post(`${process.env.AI_SERVICE_URL}/activities`, {
+      userIds: [String(req.user.id)],
+      types: [activity.type],
+      carbonImpacts: [activity.carbonImpact],
+      timestamps: [activity.timestamp]
+    }).catch((aiError) => {
+      console.error('Activity ingestion error:', aiError.message);
+    });
+
     res.status(201).json({
       success: true,
       message: 'Activity logged successfully',
-      activity: progress.activities[progress.activities.length - 1]
+      activity
     });
   } catch (error) {
     console.error('Log activity error:', error);
@@ -203,29 +226,60 @@ exports.getInsights = async (req, res) => {
   try {
     const user = await User.findById(req.user.id);
 
-    // Get recent progress
-    const recentProgress = await Progress.find({ userId: user._id })
-      .sort({ date: -1 })
-      .limit(7);
+    const toAiProgress = p => ({
+      date: p.date,
+      carbonData: p.carbonData,
+      challengesCompleted: p.challengesCompleted
+    });
+    const userId = user._id.toString();
+    const locale = user.preferences && user.preferences.language;
 
-    // Prepare data for AI service
-    const insightData = {
-      lifestyle: user.lifestyle,
-      recentProgress: recentProgress.map(p => ({
-        date: p.date,
-        carbonData: p.carbonData,
-        activities: p.activities
-      })),
-      carbonFootprint: user.carbonFootprint
-    };
+    // Send the last 7 days every time: the AI service skips days it already
+    // stored, and days without a dashboard load still reach its history
+    const latest = await Progress.find({ userId: user._id })
+      .sort({ date: -1 })
+      .limit(7)
+      .select('date carbonData challengesCompleted');
 
     try {
-      // Call AI service for personalized insights
-      const aiResponse = await axios.post(
-        `${process.env.AI_SERVICE_URL}/insights`,
-        insightData,
-        { timeout: 10000 }
-      );
+      let aiResponse;
+      try {
+        aiResponse = await axios.post(
+          `${process.env.AI_SERVICE_URL}/insights`,
+          {
+            lifestyle: user.lifestyle,
+            latest: latest.map(toAiProgress),
+            carbonFootprint: user.carbonFootprint,
+            userId,
+            locale
+          },
+          aiDashboardRequest
+        );
+      } catch (deltaError) {
+        if (!deltaError.response || deltaError.response.status !== 404) {
+          throw deltaError;
+        }
+
+        // No stored history for this user yet: send the last 7 days in full
+        const recentProgress = await Progress.find({ userId: user._id })
+          .sort({ date: -1 })
+          .limit(7);
+
+        aiResponse = await axios.post(
+          `${process.env.AI_SERVICE_URL}/insights`,
+          {
+            lifestyle: user.lifestyle,
+            recentProgress: recentProgress.map(p => ({
+              ...toAiProgress(p),
+              activities: p.activities
+            })),
+            carbonFootprint: user.carbonFootprint,
+            userId,
+            locale
+          },
+          aiDashboardRequest
+        );
+      }
 
       res.status(200).json({
         success: true,
@@ -236,7 +290,7 @@ exports.getInsights = async (req, res) => {
       console.error('AI service error:', aiError.message);
       
       // Return basic insights if AI service unavailable
-      const basicInsights = generateBasicInsights(user, recentProgress);
+      const basicInsights = generateBasicInsights(user, latest);
       
       res.status(200).json({
         success: true,
@@ -254,6 +308,90 @@ exports.getInsights = async (req, res) => {
   }
 };
 
+// @desc    Get monthly and annual emission projection
+// @route   GET /api/v1/carbon/projection
+// @access  Private
+exports.getProjection = async (req, res) => {
+  try {
+    const months = parseInt(req.query.months || '12');
+    const user = await User.findById(req.user.id)
+      .populate('activeChallenges.challengeId', 'duration carbonSaved');
+
+    const startDate = new Date();
+    startDate.setDate(startDate.getDate() - 90);
+    startDate.setHours(0, 0, 0, 0);
+
+    const history = await Progress.find({
+      userId: user._id,
+      date: { $gte: startDate }
+    })
+    .sort({ date: 1 })
+    .select('date carbonData');
+
+    // Active challenges save their estimated CO2 evenly over their duration
+    const userId = user._id.toString();
+    const challenges = user.activeChallenges
+      .filter(active => active.challengeId)
+      .map(active => {
+        const { duration, carbonSaved } = active.challengeId;
+        const endDate = new Date(active.startedAt);
+        endDate.setDate(endDate.getDate() + duration - 1);
+        return {
+          userId,
+          startDate: active.startedAt.toISOString(),
+          endDate: endDate.toISOString(),
+          dailySaving: carbonSaved / duration
+        };
+      });
+
+    try {
+      if (history.length === 0) {
+        throw new Error('No progress history to project');
+      }
+
+      const aiResponse = await axios.post(
+        `${process.env.AI_SERVICE_URL}/projection/batch`,
+        {
+          userIds: history.map(() => userId),
+          dates: history.map(p => p.date.toISOString()),
+          totals: history.map(p => p.carbonData.total),
+          months,
+          challenges
+        },
+        aiDashboardRequest
+      );
+
+      res.status(200).json({
+        success: true,
+        projection: aiResponse.data.projections[0]
+      });
+    } catch (aiError) {
+      console.error('AI service error:', aiError.message);
+
+      // Flat projection of the current daily footprint
+      const daily = user.carbonFootprint.daily || 0;
+
+      res.status(200).json({
+        success: true,
+        projection: {
+          dailyLevel: daily,
+          annual: {
+            projected: Math.round(daily * 365 * 100) / 100
+          }
+        },
+        note: 'AI service temporarily unavailable, showing a simple projection'
+      });
+    }
+  } catch (error) {
+    console.error('Get projection error:', error);
+    res.status(500).json({
+      success: false,
+      message: 'Error fetching projection',
+      error: error.message
+    });
+  }
+};
+
 // Helper function: Simple carbon footprint calculation
 function calculateSimpleFootprint(lifestyle) {
   const breakdown = {
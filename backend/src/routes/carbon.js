@@ -10,5 +10,6 @@ router.post('/calculate', carbonController.calculateFootprint);
 router.get('/history', carbonController.getHistory);
 router.post('/activity', carbonController.logActivity);
 router.get('/insights', carbonController.getInsights);
+router.get('/projection', carbonController.getProjection);
 
 module.exports = router;